@@ -5,10 +5,12 @@ from datetime import datetime, timedelta
 import requests
 from app import db
 from app.models.user import User
+from app.services.http_client import UpstreamClient
 import logging
 
 logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
+google_client = UpstreamClient('google', 'https://oauth2.googleapis.com', timeout=(3.05, 5))
 
 @auth_bp.route('/google', methods=['POST', 'OPTIONS'])
 @cross_origin()
@@ -28,8 +30,9 @@ def google_auth():
         logger.debug("Received token, verifying with Google...")
 
         # Verify token with Google
-        google_response = requests.get(
-            f'https://oauth2.googleapis.com/tokeninfo?id_token={token}'
+        google_response = google_client.get(
+            '/tokeninfo',
+            params={'id_token': token}
         )
 
         if not google_response.ok:
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta, UTC
 from dotenv import load_dotenv
 from urllib.parse import urlparse, urlunparse
@@ -49,6 +50,47 @@ class Config:
     # CoinGecko API configuration
     COINGECKO_API_KEY = os.getenv('COINGECKO_API_KEY')
     COINGECKO_API_URL = 'https://api.coingecko.com/api/v3'
+    COINGECKO_RATE_LIMIT_PER_MINUTE = 30  # Shared by all workers on a host
+    COINGECKO_RATE_LIMIT_BURST = 5
+    COINGECKO_RATE_LIMIT_TIMEOUT = 5.0  # Longest a request waits for a token in seconds
+    COINGECKO_RATE_LIMIT_FILE = os.getenv('COINGECKO_RATE_LIMIT_FILE')
+    COINGECKO_BACKGROUND_RESERVE = 2  # Tokens backfills leave in the bucket for quote refreshes
+    
+    # Price provider: 'coingecko', 'record' (CoinGecko, saving responses) or 'replay'
+    PRICE_PROVIDER = os.getenv('PRICE_PROVIDER', 'coingecko')
+    PRICE_RECORDINGS_DIR = os.getenv('PRICE_RECORDINGS_DIR')
+    PRICE_REPLAY_LATENCY_MS = float(os.getenv('PRICE_REPLAY_LATENCY_MS', '0'))
+    # Several comma-separated providers enable failover with hedged quotes ('replay' only when TESTING).
+    # 'record' wraps CoinGecko, the only live source, so 'coingecko,record' just retries it and never hedges
+    PRICE_PROVIDERS = os.getenv('PRICE_PROVIDERS', '')
+    PRICE_HEDGING = os.getenv('PRICE_HEDGING', 'true').lower() == 'true'
+    PRICE_HEDGE_DELAY_MS = 500       # Hedge delay until the primary's p95 latency is known
+    PRICE_HEDGE_MIN_DELAY_MS = 50
+    PRICE_HEDGE_MAX_DELAY_MS = 2000
+    PROVIDER_DEMOTE_AFTER = 3        # Consecutive failures before a provider is demoted
+    PROVIDER_DEMOTE_SECONDS = 60
+    
+    # Coin universe: a /coins/list-style JSON file, the provider's full coin list, or the built-in ten
+    COIN_REGISTRY_FILE = os.getenv('COIN_REGISTRY_FILE')
+    COIN_REGISTRY_FROM_API = os.getenv('COIN_REGISTRY_FROM_API', 'false').lower() == 'true'
+    SYMBOL_ALIASES = {}              # Extra alias -> symbol mappings for the symbol resolver
+    COINGECKO_MAX_IDS_LENGTH = 1800  # Longest ids= list per /simple/price request
+    PRICE_FETCH_CONCURRENCY = 4      # Chunks fetched in parallel, still within the rate limit
+    PRICE_COALESCE_WINDOW_MS = 10    # How long single-symbol lookups gather before one batched call
+    PRICE_COALESCE_MAX_BATCH = 100   # Flush early once this many coins are queued
+    
+    # Upstream HTTP client configuration
+    UPSTREAM_MAX_RETRIES = 2         # Retries on 429/5xx and connection errors
+    UPSTREAM_BACKOFF_FACTOR = 0.5    # Exponential backoff base in seconds
+    UPSTREAM_BREAKER_THRESHOLD = 5   # Consecutive failures before the breaker opens
+    UPSTREAM_BREAKER_RESET = 30      # Seconds before an open breaker allows a trial request
+    
+    # Redis shares price snapshots across workers and nodes; unset keeps caching in-process
+    REDIS_URL = os.getenv('REDIS_URL')
+    
+    # Memory-mapped price table shared by the workers on one host, e.g. /dev/shm/cryptomock-prices
+    # (suffixed with a hash of the coin list, so each universe gets its own file)
+    SHARED_PRICE_TABLE = os.getenv('SHARED_PRICE_TABLE')
     
     # CORS configuration
     CORS_ORIGINS = ["http://localhost:5173", "https://cryptomock.ie"]
@@ -61,6 +103,26 @@ class Config:
     # Price update configuration
     PRICE_UPDATE_INTERVAL = 300  # 5 minutes in seconds
     PRICE_CACHE_DURATION = 60    # 1 minute in seconds
+    TICK_BUFFER_CAPACITY = 2016  # Recent ticks kept in memory per symbol (a week of updates)
+    PRICE_DEDUP_EPSILON = 0.0        # Relative price move below which a tick isn't stored (0: skip exact repeats)
+    PRICE_HEARTBEAT_SECONDS = 3600   # Store every symbol at least this often, changed or not
+    # market_chart backfill of every supported coin, at startup and daily (see backfill.py)
+    BACKFILL_ENABLED = os.getenv('BACKFILL_ENABLED', 'false').lower() == 'true'
+    BACKFILL_DAYS = 90               # Longest range CoinGecko still returns hourly
+    BACKFILL_CONCURRENCY = 4         # Symbols fetched in parallel, within the rate limit
+    BACKFILL_LOCK_FILE = os.getenv('BACKFILL_LOCK_FILE')  # Host-wide run lock (default: in the temp dir)
+    EXPORT_MAX_DAYS = 31             # Longest range /api/market/export streams; use export.py beyond
+    # Oldest snapshot (seconds) served per endpoint while a background refresh runs
+    MARKET_MAX_STALENESS = {
+        'market': 300,
+        'portfolio': 300,
+        'trading': 60,
+        'chart': 3600
+    }
+    # Persistent market_chart cache shared by the workers on a host, read through by history backfills
+    HISTORY_CACHE_PATH = os.getenv('HISTORY_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'cryptomock-history.sqlite3'))
+    HISTORY_CACHE_MAX_ENTRIES = 500
+    HISTORY_CACHE_TTLS = {'daily': 3600, 'hourly': 300}  # Seconds per CoinGecko interval
     
     # Trading configuration
     TRADING_FEE_PERCENTAGE = 0.001  # 0.1%
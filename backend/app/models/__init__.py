@@ -2,6 +2,9 @@ from .user import User
 from .portfolio import Portfolio
 from .transaction import Transaction, TransactionType
 from .price_history import PriceHistory
+from .price_candle import PriceCandle
+from .backfill_checkpoint import BackfillCheckpoint
+from .price_archive import PriceArchive
 from .watchlist import WatchlistItem
 
 __all__ = [
@@ -10,5 +13,8 @@ __all__ = [
     'Transaction',
     'TransactionType',
     'PriceHistory',
+    'PriceCandle',
+    'BackfillCheckpoint',
+    'PriceArchive',
     'WatchlistItem'
 ]
\ No newline at end of file
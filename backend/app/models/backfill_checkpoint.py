@@ -0,0 +1,18 @@
+from app import db
+
+class BackfillCheckpoint(db.Model):
+    __tablename__ = 'backfill_checkpoints'
+
+    # One row per symbol, written once its history back to `start` is stored
+    crypto_symbol = db.Column(db.String(10), primary_key=True)
+    start = db.Column(db.DateTime, nullable=False)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    completed_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'crypto_symbol': self.crypto_symbol,
+            'start': self.start.isoformat() if self.start else None,
+            'rows': self.rows,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
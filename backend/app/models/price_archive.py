@@ -0,0 +1,22 @@
+from app import db
+
+class PriceArchive(db.Model):
+    __tablename__ = 'price_archive'
+
+    # One compressed block of ticks per symbol per UTC day (see services.tick_archive)
+    crypto_symbol = db.Column(db.String(10), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    first_tick = db.Column(db.DateTime, nullable=False)
+    last_tick = db.Column(db.DateTime, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    def to_dict(self):
+        return {
+            'crypto_symbol': self.crypto_symbol,
+            'day': self.day.isoformat() if self.day else None,
+            'count': self.count,
+            'first_tick': self.first_tick.isoformat() if self.first_tick else None,
+            'last_tick': self.last_tick.isoformat() if self.last_tick else None,
+            'size': len(self.data) if self.data else 0
+        }
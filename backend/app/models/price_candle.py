@@ -0,0 +1,31 @@
+from datetime import datetime
+from app import db
+
+class PriceCandle(db.Model):
+    __tablename__ = 'price_candles'
+
+    # (symbol, resolution, bucket) is both the upsert key and the range-scan index
+    crypto_symbol = db.Column(db.String(10), primary_key=True)
+    resolution = db.Column(db.String(4), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    volume_24h = db.Column(db.Float)  # Rolling 24h volume as of the candle's last tick, not volume traded in it
+    first_tick = db.Column(db.DateTime, nullable=False)
+    last_tick = db.Column(db.DateTime, nullable=False)
+    # When the candle was last written, set on every upsert; incremental exports resume after it
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'crypto_symbol': self.crypto_symbol,
+            'resolution': self.resolution,
+            'bucket': self.bucket.isoformat() if self.bucket else None,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume_24h': self.volume_24h
+        }
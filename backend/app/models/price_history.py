@@ -1,6 +1,8 @@
 from app import db
 from datetime import datetime
 from sqlalchemy import Index
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateTable
 from .base import TimestampMixin
 
 class PriceHistory(db.Model, TimestampMixin):
@@ -14,7 +16,14 @@ class PriceHistory(db.Model, TimestampMixin):
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     __table_args__ = (
-        Index('idx_crypto_timestamp', 'crypto_symbol', 'timestamp'),
+        # One tick per symbol and time, which ingest and backfills rely on to skip duplicates with
+        # ON CONFLICT DO NOTHING; also covers (timestamp, price_usd) range reads per symbol with an
+        # index-only scan on PostgreSQL. Includes the partition key, as unique indexes there must
+        Index('idx_crypto_timestamp', 'crypto_symbol', 'timestamp', unique=True, postgresql_include=['price_usd']),
+        # Block-range index: a few pages for append-only, time-ordered rows (plain B-tree elsewhere)
+        Index('idx_price_history_timestamp_brin', 'timestamp', postgresql_using='brin'),
+        # Daily range partitions on PostgreSQL, managed by services.partitions
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
 
     def to_dict(self):
@@ -25,4 +34,12 @@ class PriceHistory(db.Model, TimestampMixin):
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'volume_24h': self.volume_24h,
             'market_cap': self.market_cap
-        }
\ No newline at end of file
+        }
+
+@compiles(CreateTable, 'postgresql')
+def _create_table(create, compiler, **kw):
+    """A partitioned table's primary key must include its partition key"""
+    ddl = compiler.visit_create_table(create, **kw)
+    if create.element.name == PriceHistory.__tablename__:
+        ddl = ddl.replace('PRIMARY KEY (id)', 'PRIMARY KEY (id, timestamp)')
+    return ddl
@@ -1,17 +1,94 @@
-from flask import Blueprint, jsonify
-from app.services import price_service, price_updater
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required
+from app.services import price_service, price_updater, history_store, tick_buffers, tick_archive
+from app.services.price_service import UPSTREAM_ERRORS
+from app.services.response_cache import ResponseCache, SerializedResponse, serialize
+from app.services.candles import pick_resolution
+from app.services.downsample import SeriesCache, downsample, lttb_indices
+from app.services.export import ExportUnavailable, HistoryExport, parse_cursor
 import logging
 
 logger = logging.getLogger(__name__)
 market_bp = Blueprint('market', __name__, url_prefix='/api/market')
 
+# Encoded bodies for polled endpoints, one per snapshot/history version
+response_cache = ResponseCache()
+
+# Points a history chart asks for when it names no resolution
+DEFAULT_HISTORY_POINTS = 150
+
+# History series (downsampled when asked) per range and stored-data version
+series_cache = SeriesCache()
+
+# Seconds a history request answered 202 should wait before retrying
+HISTORY_RETRY_AFTER = 5
+
+# Sparkline points returned by the window endpoint unless asked otherwise
+DEFAULT_SPARKLINE_POINTS = 50
+
+def _serialized_response(serialized: SerializedResponse):
+    """Send pre-encoded JSON, gzipped when accepted, or 304 when the client's ETag matches"""
+    gzipped = 'gzip' in request.accept_encodings
+    # Each encoding is its own representation, so it gets its own strong ETag
+    etag = f"{serialized.etag}-gz" if gzipped else serialized.etag
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    elif gzipped:
+        response = current_app.response_class(serialized.gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(serialized.body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Let browsers keep the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _parse_time(name: str):
+    """Read an ISO 8601 or unix-seconds query parameter as a naive UTC datetime"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        if value.replace('.', '', 1).isdigit():
+            return datetime.utcfromtimestamp(float(value))
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' time: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 @market_bp.route('/prices', methods=['GET'])
 def get_prices():
-    """Get current prices for all supported cryptocurrencies"""
+    """Get current prices for all supported cryptocurrencies, or those listed in ?symbols="""
     try:
-        # Force a fresh fetch from CoinGecko
-        prices = price_service.get_all_prices()  # This will now always get fresh prices
-        return jsonify(prices)
+        # Served from the shared snapshot; expired snapshots are revalidated in the background
+        max_staleness = price_service.max_staleness['market']
+        symbols = request.args.get('symbols')
+        if symbols:
+            prices = price_service.get_prices([s for s in symbols.split(',') if s], max_staleness=max_staleness)
+            for symbol, quote in prices.items():
+                quote.update(price_updater.get_freshness(symbol))
+            return jsonify(prices)
+
+        # The full body only changes with the snapshot and when it turns stale
+        snapshot = price_service.get_snapshot(max_staleness=max_staleness)
+        stale = snapshot.age() >= price_service.cache.ttl
+
+        def build():
+            prices = snapshot.to_dict()
+            for symbol, quote in prices.items():
+                quote.update(price_updater.get_freshness(symbol))
+            return prices
+
+        return _serialized_response(response_cache.get(('prices', snapshot.version, stale), build))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except UPSTREAM_ERRORS as e:
+        logger.error(f"Prices unavailable: {str(e)}")
+        return jsonify({'error': 'Price data temporarily unavailable'}), 503
     except Exception as e:
         logger.error(f"Error fetching prices: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -20,46 +97,81 @@ def get_prices():
 def get_price(symbol):
     """Get current price for a specific cryptocurrency"""
     try:
-        # Convert symbol to uppercase for consistency
-        symbol = symbol.upper()
-        # Handle common names
-        symbol_map = {
-            'BITCOIN': 'BTC',
-            'ETHEREUM': 'ETH',
-        }
-        symbol = symbol_map.get(symbol, symbol)
-        
-        price, change_24h = price_service.get_price(symbol)
+        # Accept tickers, CoinGecko ids, names and aliases
+        symbol = price_service.resolve_symbol(symbol)
+
+        price, change_24h = price_service.get_price(
+            symbol,
+            max_staleness=price_service.max_staleness['market']
+        )
         return jsonify({
             'symbol': symbol,
             'price': price,
-            'change_24h': change_24h
+            'change_24h': change_24h,
+            **price_updater.get_freshness(symbol)
         })
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    except UPSTREAM_ERRORS as e:
+        logger.error(f"Price for {symbol} unavailable: {str(e)}")
+        return jsonify({'error': 'Price data temporarily unavailable'}), 503
     except Exception as e:
         logger.error(f"Error fetching price for {symbol}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @market_bp.route('/history/<symbol>', methods=['GET'])
 def get_price_history(symbol):
-    """Get historical prices for a cryptocurrency"""
+    """
+    Get historical prices for a cryptocurrency from the price_history table.
+
+    Query parameters: from/to (ISO 8601 or unix seconds, default the last 7
+    days), resolution (raw, 1m, 5m, 15m, 1h, 4h or 1d), points (without a
+    resolution, the coarsest candle resolution giving at least this many
+    points is used; default 150), max_points (downsample with LTTB to at most
+    this many points, e.g. the chart's pixel width) and since, which returns
+    only points after that time so charts can append. A range with nothing
+    stored yet is answered 202 with Retry-After while it is backfilled.
+    """
     try:
-        # Convert symbol to uppercase and validate
-        symbol = symbol.upper()
-        if symbol not in price_service.supported_coins:
-            return jsonify({'error': f'Unsupported cryptocurrency: {symbol}'}), 400
-
-        # Fetch historical prices with 7 days of data
-        history = price_service.get_historical_prices(symbol, days=7)
-        
-        if not history:
+        # Resolve to a canonical symbol before any upstream or database work
+        symbol = price_service.resolve_symbol(symbol)
+        since = _parse_time('since')
+        # Default to the end of the current minute: no stored tick is later, and every request
+        # within the minute resolves to the same range and cache key
+        end = _parse_time('to') or datetime.utcnow().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        start = _parse_time('from') or end - timedelta(days=7)
+        resolution = request.args.get('resolution') or pick_resolution(
+            start, end, request.args.get('points', DEFAULT_HISTORY_POINTS, type=int)
+        )
+
+        max_points = request.args.get('max_points', type=int)
+        if max_points is not None and max_points < 3:
+            raise ValueError("'max_points' must be at least 3")
+
+        # A series only changes when a newer tick is stored (by any worker) or this worker
+        # backfills older ones, so it is computed once per distinct range and data version
+        key = ('history', symbol, start, end, resolution, since, max_points,
+               history_store.latest_tick(symbol), history_store.version)
+        history = series_cache.get(key)
+        if history is None:
+            history = history_store.get_history(symbol, start, end, resolution=resolution, since=since)
+            if max_points:
+                history = downsample(history, max_points)
+            if history:
+                series_cache.put(key, history)
+
+        if not history and since is None:
+            if history_store.backfill_pending(symbol):
+                # First load of a new coin or fresh database: the range is still being fetched
+                response = jsonify({'error': 'Price history is being loaded, retry shortly'})
+                response.headers['Retry-After'] = str(HISTORY_RETRY_AFTER)
+                return response, 202
             return jsonify({'error': 'No price history available'}), 404
 
-        return jsonify({
-            'symbol': symbol,
-            'history': history
-        })
+        payload = lambda: {'symbol': symbol, 'resolution': resolution, 'history': history}
+        if history:
+            return _serialized_response(response_cache.get(key, payload))
+        return _serialized_response(serialize(payload()))
     except ValueError as e:
         logger.error(f"Value error getting history for {symbol}: {str(e)}")
         return jsonify({'error': str(e)}), 400
@@ -67,6 +179,88 @@ def get_price_history(symbol):
         logger.error(f"Error getting history for {symbol}: {str(e)}")
         return jsonify({'error': 'Failed to fetch price history'}), 500
     
+@market_bp.route('/window/<symbol>', methods=['GET'])
+def get_price_window(symbol):
+    """
+    Stats and a sparkline for a recent window, served from the in-memory tick buffers.
+
+    Query parameters: hours (window length, default 24) and points
+    (sparkline length, default 50).
+    """
+    try:
+        symbol = price_service.resolve_symbol(symbol)
+        hours = request.args.get('hours', 24, type=float)
+        points = request.args.get('points', DEFAULT_SPARKLINE_POINTS, type=int)
+        if hours <= 0 or points < 3:
+            raise ValueError("'hours' must be positive and 'points' at least 3")
+
+        start = datetime.utcnow() - timedelta(hours=hours)
+        stats = tick_buffers.get_window_stats(symbol, start)
+        if stats is None:
+            return jsonify({'error': 'No recent prices available'}), 404
+        timestamps, prices, _ = tick_buffers.get_range(symbol, start)
+        indices = lttb_indices(timestamps, prices, points)
+        sparkline = [
+            {'timestamp': datetime.utcfromtimestamp(timestamps[i]).isoformat(), 'price': float(prices[i])}
+            for i in indices
+        ]
+
+        stats['from'] = datetime.utcfromtimestamp(stats['from']).isoformat()
+        stats['to'] = datetime.utcfromtimestamp(stats['to']).isoformat()
+        return jsonify(dict(stats, symbol=symbol, hours=hours, sparkline=sparkline))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting price window for {symbol}: {str(e)}")
+        return jsonify({'error': 'Failed to compute price window'}), 500
+
+@market_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_history():
+    """
+    Stream stored price history as a Parquet or Arrow IPC file.
+
+    Query parameters: dataset (prices or candles), format (parquet or
+    arrow), symbols (comma-separated, default all), from/to (at most
+    EXPORT_MAX_DAYS apart, default the last EXPORT_MAX_DAYS days), and after,
+    which exports only rows written after a previous export's last cursor
+    (the largest id for prices, updated_at for candles). Larger dumps go
+    through the export CLI instead of a web worker.
+    """
+    try:
+        dataset = request.args.get('dataset', 'prices')
+        max_days = current_app.config.get('EXPORT_MAX_DAYS', 31)
+        end = _parse_time('to') or datetime.utcnow()
+        start = _parse_time('from') or end - timedelta(days=max_days)
+        if end - start > timedelta(days=max_days):
+            raise ValueError(f"Exports over HTTP are limited to {max_days} days")
+        symbols = request.args.get('symbols')
+        after = request.args.get('after')
+        export = HistoryExport(
+            dataset=dataset,
+            format=request.args.get('format', 'parquet'),
+            symbols=[price_service.resolve_symbol(s) for s in symbols.split(',') if s] if symbols else None,
+            start=start,
+            end=end,
+            after=parse_cursor(dataset, after) if after else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ExportUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+
+    extension = 'parquet' if export.format == 'parquet' else 'arrows'
+    response = current_app.response_class(stream_with_context(export.stream()), mimetype=export.mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={export.dataset}.{extension}'
+    return response
+
+@market_bp.route('/search', methods=['GET'])
+def search_coins():
+    """Find supported coins by ticker, id or name prefix, with fuzzy matching for typos"""
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify(price_service.search_coins(query, limit))
+
 @market_bp.route('/test', methods=['GET'])
 def test_price_service():
     """Test the price service is working"""
@@ -87,6 +281,14 @@ def test_price_service():
             'message': str(e)
         }), 500
 
+@market_bp.route('/stats', methods=['GET'])
+def get_price_service_stats():
+    """Get cache and upstream counters for this worker"""
+    return jsonify(dict(price_service.get_stats(), responses=response_cache.get_stats(),
+                        ingest=price_updater.get_ingest_stats(), history=history_store.get_stats(),
+                        series=series_cache.get_stats(), ticks=tick_buffers.get_stats(),
+                        archive=tick_archive.get_stats()))
+
 @market_bp.route('/prices/latest', methods=['GET'])
 def get_latest_prices():
     """Get latest prices from database"""
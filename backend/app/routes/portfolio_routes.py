@@ -3,10 +3,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.user import User
 from app.models.portfolio import Portfolio
-from app.services.price_service import PriceService
+from app.services import price_service
 
 portfolio_bp = Blueprint('portfolio', __name__, url_prefix='/api/portfolio')
-price_service = PriceService()
 
 @portfolio_bp.route('/balance', methods=['GET'])
 @jwt_required()
@@ -19,7 +18,7 @@ def get_balance():
             return jsonify({'error': 'User not found'}), 404
             
         # Get current prices for all cryptocurrencies
-        current_prices = price_service.get_all_prices()
+        current_prices = price_service.get_all_prices(max_staleness=price_service.max_staleness['portfolio'])
         
         # Calculate crypto balance using current market prices
         crypto_balance = 0
@@ -47,7 +46,7 @@ def get_holdings():
         holdings = Portfolio.query.filter_by(user_id=current_user_id).all()
         
         # Get current prices for all cryptocurrencies
-        current_prices = price_service.get_all_prices()
+        current_prices = price_service.get_all_prices(max_staleness=price_service.max_staleness['portfolio'])
         
         holdings_data = []
         for holding in holdings:
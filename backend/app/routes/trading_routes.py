@@ -34,7 +34,7 @@ def buy_crypto():
 
         # Get user and parse data
         user_id = get_jwt_identity()
-        symbol = data['symbol'].upper()
+        symbol = price_service.resolve_symbol(data['symbol'])
         amount = float(data['amount'])
 
         # Execute trade through service
@@ -59,7 +59,7 @@ def sell_crypto():
 
         # Get user and parse data
         user_id = get_jwt_identity()
-        symbol = data['symbol'].upper()
+        symbol = price_service.resolve_symbol(data['symbol'])
         amount = float(data['amount'])
 
         # Execute trade through service
@@ -3,6 +3,11 @@ from .price_service import PriceService
 from .trading_service import TradingService
 from .price_updater import PriceUpdater
 from .scheduler import SchedulerService
+from .history_store import HistoryStore, tick_index_is_unique
+from .partitions import PartitionManager
+from .tick_buffer import TickBuffers
+from .tick_archive import TickArchive
+from .backfill import BackfillJob
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -10,7 +15,12 @@ logger = logging.getLogger(__name__)
 # Create service instances
 price_service = PriceService()
 trading_service = TradingService(price_service)
-price_updater = PriceUpdater(price_service)
+price_partitions = PartitionManager('price_history')
+tick_buffers = TickBuffers()
+tick_archive = TickArchive()
+price_updater = PriceUpdater(price_service, price_partitions, tick_buffers, tick_archive)
+history_store = HistoryStore(price_service, price_partitions, tick_archive)
+backfill_job = BackfillJob(price_service, history_store)
 scheduler = SchedulerService()
 
 def init_app(app):
@@ -21,9 +31,21 @@ def init_app(app):
         
         # Then initialize trading service
         trading_service.init_app(app)
+        price_updater.init_app(app)
+        
+        # Ingest and backfills insert ON CONFLICT against the unique tick index,
+        # which create_all doesn't add to tables created before it existed
+        with app.app_context():
+            if not tick_index_is_unique():
+                raise RuntimeError("price_history.idx_crypto_timestamp is not unique; "
+                                   "run migrate_db.py to remove duplicate ticks and rebuild it")
+        
+        # Each symbol's recent ticks are loaded on first use
+        tick_buffers.capacity = app.config.get('TICK_BUFFER_CAPACITY', tick_buffers.capacity)
         
         # Initialize scheduler last
-        scheduler.init_app(app, price_updater)
+        backfill_job.init_app(app)
+        scheduler.init_app(app, price_updater, backfill_job)
         
         logger.info("All services initialized successfully")
     except Exception as e:
@@ -34,6 +56,10 @@ __all__ = [
     'price_service',
     'trading_service',
     'price_updater',
+    'history_store',
+    'tick_buffers',
+    'tick_archive',
+    'backfill_job',
     'scheduler',
     'init_app'
 ]
\ No newline at end of file
@@ -0,0 +1,162 @@
+# app/services/backfill.py
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+from app import db
+from app.models.backfill_checkpoint import BackfillCheckpoint
+from .rate_limiter import RateLimitExceeded
+
+try:
+    import fcntl
+except ImportError:  # Windows: only runs within one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Fetches retried when the shared CoinGecko budget has no token in time
+RATE_LIMIT_RETRIES = 5
+
+class BackfillJob:
+    """
+    Backfill N days of market_chart history for every supported coin.
+
+    Symbols are fetched concurrently on a small thread pool; every request
+    still takes a token from the provider's shared rate limiter as a
+    background request, which leaves the quote refreshes their reserve, so
+    the pool only overlaps waiting on the network. Results are stored from
+    the calling thread, one bulk insert and commit per symbol, followed by a
+    checkpoint row. A rerun skips checkpointed symbols, so an interrupted run
+    resumes where it stopped and newly added coins are picked up by the next
+    scheduled run. Only one run at a time per host: every worker schedules
+    the job, and the ones finding the lock file taken skip it.
+    """
+
+    def __init__(self, price_service, history_store, days: int = 90, concurrency: int = 4,
+                 lock_file: Optional[str] = None):
+        self.price_service = price_service
+        self.history_store = history_store
+        self.days = days
+        self.concurrency = concurrency
+        self.lock_file = lock_file or os.path.join(tempfile.gettempdir(), 'cryptomock-backfill.lock')
+        self._running = threading.Lock()
+        self.stats = {'runs': 0, 'symbols': 0, 'rows': 0, 'skipped': 0, 'errors': 0, 'last_run': None}
+
+    def init_app(self, app):
+        self.days = app.config.get('BACKFILL_DAYS', self.days)
+        self.concurrency = app.config.get('BACKFILL_CONCURRENCY', self.concurrency)
+        self.lock_file = app.config.get('BACKFILL_LOCK_FILE') or self.lock_file
+
+    def pending(self, start: datetime, symbols: Iterable[str]) -> list:
+        """Symbols without a checkpoint reaching back to start"""
+        done = {
+            checkpoint.crypto_symbol
+            for checkpoint in BackfillCheckpoint.query.filter(BackfillCheckpoint.start <= start)
+        }
+        return [symbol for symbol in symbols if symbol not in done]
+
+    def run(self, days: Optional[int] = None, symbols: Optional[Iterable[str]] = None,
+            restart: bool = False) -> Dict:
+        """
+        Backfill days of history for symbols (default: all supported coins).
+
+        restart ignores existing checkpoints. Returns per-run counters; a run
+        already in progress in any process on this host makes this call
+        return immediately.
+        """
+        if not self._running.acquire(blocking=False):
+            logger.info("Backfill already running, skipping")
+            return {'symbols': 0, 'rows': 0, 'skipped': 0, 'errors': 0}
+        try:
+            fd = self._lock_host()
+            if fd is None:
+                logger.info("Backfill running in another process, skipping")
+                return {'symbols': 0, 'rows': 0, 'skipped': 0, 'errors': 0}
+            try:
+                return self._run(days or self.days, symbols, restart)
+            finally:
+                if fd >= 0:
+                    os.close(fd)  # Releases the flock
+        finally:
+            self._running.release()
+
+    def _lock_host(self) -> Optional[int]:
+        """Take the host-wide lock without waiting: its fd (-1 without flock), or None when it is held"""
+        if fcntl is None:
+            return -1
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _run(self, days: int, symbols: Optional[Iterable[str]], restart: bool) -> Dict:
+        start = datetime.utcnow() - timedelta(days=days)
+        symbols = [self.price_service.resolve_symbol(symbol) for symbol in symbols] if symbols \
+            else list(self.price_service.supported_coins)
+        todo = symbols if restart else self.pending(start, symbols)
+        result = {'symbols': 0, 'rows': 0, 'skipped': len(symbols) - len(todo), 'errors': 0}
+        logger.info(f"Backfilling {days} days for {len(todo)} symbols ({result['skipped']} already done)")
+
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency),
+                                thread_name_prefix='backfill') as executor:
+            futures = {executor.submit(self._fetch, symbol, start): symbol for symbol in todo}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    rows = self._store(symbol, future.result(), start)
+                except Exception as e:
+                    result['errors'] += 1
+                    logger.warning(f"Could not backfill {symbol}: {str(e)}")
+                    db.session.rollback()
+                    continue
+                result['symbols'] += 1
+                result['rows'] += rows
+
+        self.stats['runs'] += 1
+        self.stats['last_run'] = datetime.utcnow().isoformat()
+        for key in ('symbols', 'rows', 'skipped', 'errors'):
+            self.stats[key] += result[key]
+        logger.info(f"Backfill stored {result['rows']} rows for {result['symbols']} symbols"
+                    f" ({result['errors']} failed)")
+        return result
+
+    def _fetch(self, symbol: str, start: datetime):
+        """Fetch on a pool thread, retrying while the shared rate budget is exhausted"""
+        for attempt in range(RATE_LIMIT_RETRIES):
+            try:
+                return self.history_store.fetch_history(symbol, start)
+            except RateLimitExceeded:
+                if attempt == RATE_LIMIT_RETRIES - 1:
+                    raise
+                time.sleep(1.0 + attempt)
+
+    def _store(self, symbol: str, points, start: datetime) -> int:
+        """Insert the points older than the stored ticks, then checkpoint the symbol"""
+        earliest = self.history_store.earliest_tick(symbol)
+        rows = self.history_store.store_history(symbol, points, start, earliest or datetime.utcnow())
+        checkpoint = db.session.get(BackfillCheckpoint, symbol) or BackfillCheckpoint(crypto_symbol=symbol)
+        checkpoint.start = start
+        checkpoint.rows = rows
+        checkpoint.completed_at = datetime.utcnow()
+        db.session.add(checkpoint)
+        db.session.commit()
+        return rows
+
+    def run_in_app(self, app):
+        """Scheduler entry point: run with the Flask app context the jobs lack"""
+        with app.app_context():
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Error during history backfill: {str(e)}")
+                db.session.rollback()
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, running=self._running.locked())
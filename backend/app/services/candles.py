@@ -0,0 +1,206 @@
+# app/services/candles.py
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case, func
+from app import db
+from app.models.price_candle import PriceCandle
+from app.models.price_history import PriceHistory
+
+logger = logging.getLogger(__name__)
+
+# Bucket width in seconds for each maintained candle resolution, finest first
+CANDLE_RESOLUTIONS = {
+    '1m': 60,
+    '5m': 300,
+    '1h': 3600,
+    '1d': 86400
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+# Ticks read per batch when rebuilding candles from price_history
+REBUILD_BATCH_SIZE = 5000
+
+def bucket_start(timestamp: datetime, width: int) -> datetime:
+    """Start of the width-second bucket holding timestamp"""
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % width)
+
+def pick_resolution(start: datetime, end: datetime, points: int) -> str:
+    """Coarsest candle resolution that still gives at least points buckets over [start, end]"""
+    span = (end - start).total_seconds()
+    chosen = next(iter(CANDLE_RESOLUTIONS))
+    for resolution, width in CANDLE_RESOLUTIONS.items():
+        if span / width >= points:
+            chosen = resolution
+    return chosen
+
+def aggregate(ticks: Iterable[Tuple[str, datetime, float, Optional[float]]]) -> List[Dict]:
+    """
+    Fold (symbol, timestamp, price, volume_24h) ticks into one candle row per (symbol, resolution, bucket).
+
+    Quotes only carry the rolling 24h volume, which can't be split into
+    per-bucket volume, so each candle keeps the 24h volume as of its close.
+    """
+    candles = {}
+    for symbol, timestamp, price, volume in ticks:
+        if price is None:
+            continue
+        for resolution, width in CANDLE_RESOLUTIONS.items():
+            key = (symbol, resolution, bucket_start(timestamp, width))
+            candle = candles.get(key)
+            if candle is None:
+                candles[key] = {
+                    'crypto_symbol': symbol, 'resolution': resolution, 'bucket': key[2],
+                    'open': price, 'high': price, 'low': price, 'close': price, 'volume_24h': volume,
+                    'first_tick': timestamp, 'last_tick': timestamp
+                }
+                continue
+            candle['high'] = max(candle['high'], price)
+            candle['low'] = min(candle['low'], price)
+            if timestamp < candle['first_tick']:
+                candle['open'], candle['first_tick'] = price, timestamp
+            if timestamp >= candle['last_tick']:
+                candle['close'], candle['last_tick'], candle['volume_24h'] = price, timestamp, volume
+    return list(candles.values())
+
+def upsert_candles(ticks: Iterable[Tuple[str, datetime, float, Optional[float]]]) -> int:
+    """
+    Merge ticks into their candles at every resolution without committing.
+
+    PostgreSQL and SQLite merge in one INSERT ... ON CONFLICT DO UPDATE: high
+    and low widen, open and close move only for earlier or later ticks, so
+    replaying ticks or feeding them out of order gives the same candles.
+    Other backends fall back to read-modify-write. Every touched candle gets a
+    new updated_at. Returns candles touched.
+    """
+    rows = aggregate(ticks)
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    for row in rows:
+        row['updated_at'] = now
+
+    dialect = db.session.get_bind(mapper=PriceCandle).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        greatest, least = func.greatest, func.least
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        greatest, least = func.max, func.min
+    else:
+        _merge_candles(rows)
+        return len(rows)
+
+    statement = insert(PriceCandle)
+    new = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=['crypto_symbol', 'resolution', 'bucket'],
+        set_={
+            'open': case((new.first_tick < PriceCandle.first_tick, new.open), else_=PriceCandle.open),
+            'close': case((new.last_tick >= PriceCandle.last_tick, new.close), else_=PriceCandle.close),
+            'volume_24h': case((new.last_tick >= PriceCandle.last_tick, new.volume_24h),
+                               else_=PriceCandle.volume_24h),
+            'high': greatest(PriceCandle.high, new.high),
+            'low': least(PriceCandle.low, new.low),
+            'first_tick': least(PriceCandle.first_tick, new.first_tick),
+            'last_tick': greatest(PriceCandle.last_tick, new.last_tick),
+            'updated_at': new.updated_at
+        }
+    )
+    db.session.execute(statement, rows)
+    return len(rows)
+
+def _merge_candles(rows: List[Dict]):
+    """Portable upsert for backends without ON CONFLICT"""
+    for row in rows:
+        candle = db.session.get(PriceCandle, (row['crypto_symbol'], row['resolution'], row['bucket']))
+        if candle is None:
+            db.session.add(PriceCandle(**row))
+            continue
+        candle.high = max(candle.high, row['high'])
+        candle.low = min(candle.low, row['low'])
+        candle.updated_at = row['updated_at']
+        if row['first_tick'] < candle.first_tick:
+            candle.open, candle.first_tick = row['open'], row['first_tick']
+        if row['last_tick'] >= candle.last_tick:
+            candle.close, candle.last_tick, candle.volume_24h = row['close'], row['last_tick'], row['volume_24h']
+
+def rebuild_candles(symbol: str, start: datetime, end: datetime) -> int:
+    """Rebuild candles for [start, end) from stored ticks, in batches; returns ticks read"""
+    query = db.session.query(
+        PriceHistory.crypto_symbol, PriceHistory.timestamp, PriceHistory.price_usd, PriceHistory.volume_24h
+    ).filter(
+        PriceHistory.crypto_symbol == symbol,
+        PriceHistory.timestamp >= start,
+        PriceHistory.timestamp < end
+    ).order_by(PriceHistory.timestamp)
+
+    count = 0
+    batch = []
+    for tick in query.yield_per(REBUILD_BATCH_SIZE):
+        batch.append(tuple(tick))
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            upsert_candles(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        upsert_candles(batch)
+        count += len(batch)
+    db.session.commit()
+    if count:
+        logger.info(f"Rebuilt {symbol} candles from {count} ticks")
+    return count
+
+def get_candles(symbol: str, resolution: str, start: datetime, end: datetime,
+                fill_gaps: bool = True) -> List[Dict]:
+    """
+    Candles for symbol between start and end, oldest first.
+
+    With fill_gaps, empty buckets after the first known close repeat that
+    close as a flat candle with no 24h volume, so charts get an evenly spaced series.
+    """
+    width = CANDLE_RESOLUTIONS[resolution]
+    first_bucket = bucket_start(start, width)
+    rows = db.session.query(
+        PriceCandle.bucket, PriceCandle.open, PriceCandle.high, PriceCandle.low,
+        PriceCandle.close, PriceCandle.volume_24h
+    ).filter(
+        PriceCandle.crypto_symbol == symbol,
+        PriceCandle.resolution == resolution,
+        PriceCandle.bucket >= first_bucket,
+        PriceCandle.bucket <= end
+    ).order_by(PriceCandle.bucket).all()
+
+    candles = [
+        {'timestamp': bucket.isoformat(), 'price': close, 'open': open_, 'high': high, 'low': low,
+         'close': close, 'volume_24h': volume}
+        for bucket, open_, high, low, close, volume in rows
+    ]
+    if not fill_gaps:
+        return candles
+
+    previous = db.session.query(PriceCandle.close).filter(
+        PriceCandle.crypto_symbol == symbol,
+        PriceCandle.resolution == resolution,
+        PriceCandle.bucket < first_bucket
+    ).order_by(PriceCandle.bucket.desc()).limit(1).scalar()
+    return _fill_gaps(candles, rows, first_bucket, bucket_start(end, width), width, previous)
+
+def _fill_gaps(candles: List[Dict], rows, first_bucket: datetime, last_bucket: datetime,
+               width: int, previous: Optional[float]) -> List[Dict]:
+    by_bucket = {row[0]: candle for row, candle in zip(rows, candles)}
+    step = timedelta(seconds=width)
+    filled = []
+    bucket = first_bucket
+    while bucket <= last_bucket:
+        candle = by_bucket.get(bucket)
+        if candle is not None:
+            previous = candle['close']
+            filled.append(candle)
+        elif previous is not None:
+            filled.append({'timestamp': bucket.isoformat(), 'price': previous, 'open': previous,
+                           'high': previous, 'low': previous, 'close': previous, 'volume_24h': None})
+        bucket += step
+    return filled
@@ -0,0 +1,109 @@
+# app/services/coalescer.py
+import logging
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Requests per batch, up to the largest batch CoinGecko accepts in one URL
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+class BatchCoalescer:
+    """
+    Merges concurrent lookups for single keys into batched upstream calls.
+
+    The first caller to arrive while no batch is pending becomes the leader: it
+    waits up to window seconds (or until max_batch keys are queued), then takes
+    the queued keys and calls fetch_batch for them, max_batch keys per call.
+    Leadership is handed off as the keys are taken, so keys queued while the
+    leader fetches elect the next leader instead of keeping this one busy.
+    Every other caller just waits on the futures for its keys. Keys requested
+    again while queued share the queued future. Keys missing from the batch
+    result resolve to None.
+    """
+
+    def __init__(self, fetch_batch: Callable[[List[Hashable]], Dict], window: float = 0.01,
+                 max_batch: int = 100):
+        self.fetch_batch = fetch_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Future] = {}
+        self._leader = False
+        self._full = threading.Event()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_times = Histogram()
+        self.stats = {'requests': 0, 'shared': 0, 'batches': 0, 'errors': 0}
+
+    def get_many(self, keys: Iterable[Hashable], timeout: Optional[float] = None) -> Dict:
+        """Look up keys through the next batch; raises the batch's error if it failed"""
+        started = time.monotonic()
+        futures = {}
+        with self._lock:
+            for key in keys:
+                if key in futures:
+                    continue
+                self.stats['requests'] += 1
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = Future()
+                else:
+                    self.stats['shared'] += 1
+                futures[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._full.set()
+            leader = not self._leader and bool(self._pending)
+            if leader:
+                self._leader = True
+
+        if leader:
+            self._run_batches()
+
+        done, not_done = wait(futures.values(), timeout=timeout)
+        if not_done:
+            raise TimeoutError(f"Timed out waiting for {len(not_done)} batched lookups")
+        self.wait_times.observe(time.monotonic() - started)
+        return {key: future.result() for key, future in futures.items() if future.result() is not None}
+
+    def get(self, key: Hashable, timeout: Optional[float] = None):
+        """Look up a single key; None when the batch returned nothing for it"""
+        return self.get_many([key], timeout=timeout).get(key)
+
+    def _run_batches(self):
+        """Leader: collect for one window, then flush only the keys queued in it"""
+        self._full.wait(self.window)
+        with self._lock:
+            self._full.clear()
+            queued, self._pending = self._pending, {}
+            self._leader = False
+
+        keys = list(queued)
+        for i in range(0, len(keys), self.max_batch):
+            self._flush({key: queued[key] for key in keys[i:i + self.max_batch]})
+
+    def _flush(self, batch: Dict[Hashable, Future]):
+        keys = list(batch)
+        self.stats['batches'] += 1
+        self.batch_sizes.observe(len(batch))
+        try:
+            results = self.fetch_batch(keys)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Batched lookup of {len(keys)} keys failed: {str(e)}")
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        for key, future in batch.items():
+            future.set_result(results.get(key))
+
+    def get_stats(self) -> Dict:
+        return dict(
+            self.stats,
+            window=self.window,
+            max_batch=self.max_batch,
+            batch_size=self.batch_sizes.summary(),
+            wait_time=self.wait_times.summary()
+        )
@@ -0,0 +1,104 @@
+# app/services/coin_registry.py
+import json
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Portfolio, Transaction and PriceHistory store symbols in String(10) columns
+MAX_SYMBOL_LENGTH = 10
+
+DEFAULT_COINS = {
+    'BTC': ('bitcoin', 'Bitcoin'),
+    'ETH': ('ethereum', 'Ethereum'),
+    'USDT': ('tether', 'Tether'),
+    'BNB': ('binancecoin', 'BNB'),
+    'USDC': ('usd-coin', 'USDC'),
+    'XRP': ('ripple', 'XRP'),
+    'ADA': ('cardano', 'Cardano'),
+    'DOGE': ('dogecoin', 'Dogecoin'),
+    'SOL': ('solana', 'Solana'),
+    'TRX': ('tron', 'TRON')
+}
+
+class Coin(NamedTuple):
+    symbol: str
+    coin_id: str
+    name: str
+
+class CoinRegistry:
+    """
+    Supported coins indexed by symbol, provider id and name.
+
+    Lookups are dict hits, so validating a symbol costs the same for ten coins
+    as for ten thousand. When several coins share a ticker the first one wins,
+    which lets a curated file or the defaults take priority over /coins/list.
+    """
+
+    def __init__(self, coins: Iterable[Coin]):
+        self.by_symbol: Dict[str, Coin] = {}
+        self.by_id: Dict[str, Coin] = {}
+        self.by_name: Dict[str, Coin] = {}
+        for coin in coins:
+            symbol = coin.symbol.upper()
+            if not symbol or len(symbol) > MAX_SYMBOL_LENGTH or symbol in self.by_symbol or coin.coin_id in self.by_id:
+                continue
+            coin = Coin(symbol, coin.coin_id, coin.name)
+            self.by_symbol[symbol] = coin
+            self.by_id[coin.coin_id] = coin
+            self.by_name.setdefault(coin.name.lower(), coin)
+        # symbol -> provider id, in the shape PriceService.supported_coins has always had
+        self.symbol_to_id: Dict[str, str] = {symbol: coin.coin_id for symbol, coin in self.by_symbol.items()}
+
+    def __len__(self):
+        return len(self.by_symbol)
+
+    def __contains__(self, symbol):
+        return symbol in self.by_symbol
+
+    @classmethod
+    def default(cls) -> 'CoinRegistry':
+        """The ten coins CryptoMock has always supported"""
+        return cls(Coin(symbol, coin_id, name) for symbol, (coin_id, name) in DEFAULT_COINS.items())
+
+    @classmethod
+    def from_file(cls, path: str) -> 'CoinRegistry':
+        """Load a JSON list of {"symbol", "id", "name"} objects (the /coins/list format)"""
+        with open(path) as f:
+            return cls.from_coins_list(json.load(f))
+
+    @classmethod
+    def from_coins_list(cls, entries: List[Dict], priority: Optional['CoinRegistry'] = None) -> 'CoinRegistry':
+        """Build a registry from /coins/list entries, letting coins in priority claim their tickers first"""
+        coins = list(priority.by_symbol.values()) if priority else []
+        coins.extend(
+            Coin(entry['symbol'], entry['id'], entry.get('name') or entry['id'])
+            for entry in entries if entry.get('symbol') and entry.get('id')
+        )
+        return cls(coins)
+
+    def get(self, symbol: str) -> Optional[Coin]:
+        return self.by_symbol.get(symbol.upper())
+
+def chunk_ids(coin_ids: List[str], max_length: int = 1800) -> List[List[str]]:
+    """
+    Split coin ids into groups whose comma-joined, URL-encoded form stays under max_length.
+
+    Commas are counted as '%2C' since that is how requests encodes them in the
+    query string.
+    """
+    chunks = []
+    current = []
+    length = 0
+    for coin_id in coin_ids:
+        added = len(coin_id) + (3 if current else 0)
+        if current and length + added > max_length:
+            chunks.append(current)
+            current = []
+            added = len(coin_id)
+            length = 0
+        current.append(coin_id)
+        length += added
+    if current:
+        chunks.append(current)
+    return chunks
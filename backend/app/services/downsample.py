@@ -0,0 +1,81 @@
+# app/services/downsample.py
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps out of (x, y).
+
+    The first and last points are always kept. The interior is split into
+    max_points - 2 buckets and each bucket keeps the point forming the largest
+    triangle with the previously kept point and the next bucket's average.
+    Bucket averages are computed for the whole series at once; only the
+    argmax, which depends on the previous choice, walks bucket by bucket.
+    """
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1][:max(max_points, 0)], dtype=np.int64)
+
+    # Starts of max_points - 2 interior buckets over points 1..n-2, then the last point as its own bucket
+    starts = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    counts = np.diff(np.append(starts, n))
+    avg_x = np.add.reduceat(x, starts) / counts
+    avg_y = np.add.reduceat(y, starts) / counts
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = starts[bucket], starts[bucket + 1]
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        areas = np.abs(
+            (x[previous] - avg_x[bucket + 1]) * (bucket_y - y[previous])
+            - (x[previous] - bucket_x) * (avg_y[bucket + 1] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+def downsample(points: List[Dict], max_points: int) -> List[Dict]:
+    """Reduce chart points ({'timestamp': iso, 'price': ...}) to at most max_points with LTTB"""
+    if max_points >= len(points):
+        return points
+    x = np.array([point['timestamp'] for point in points], dtype='datetime64[ms]').astype(np.float64)
+    y = np.array([point['price'] for point in points], dtype=np.float64)
+    return [points[index] for index in lttb_indices(x, y, max_points)]
+
+class SeriesCache:
+    """Small LRU of computed chart series, keyed by request and data version"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, List[Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key: Hashable) -> Optional[List[Dict]]:
+        with self._lock:
+            series = self._entries.get(key)
+            if series is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return series
+
+    def put(self, key: Hashable, series: List[Dict]):
+        with self._lock:
+            self._entries[key] = series
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, entries=len(self._entries))
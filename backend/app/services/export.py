@@ -0,0 +1,202 @@
+# app/services/export.py
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Union
+from sqlalchemy import select
+from app import db
+from app.models.price_candle import PriceCandle
+from app.models.price_history import PriceHistory
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: exports are unavailable without pyarrow
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor and written as one row group / record batch
+EXPORT_BATCH_SIZE = 10000
+
+FORMATS = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Exported columns per dataset; `cursor` is the column resumed exports continue after. It must
+# grow with every write, so rows backfilled into an already exported time range are still picked up
+DATASETS = {
+    'prices': {
+        'columns': [PriceHistory.id, PriceHistory.crypto_symbol, PriceHistory.timestamp, PriceHistory.price_usd,
+                    PriceHistory.volume_24h, PriceHistory.market_cap],
+        'time': PriceHistory.timestamp,
+        'cursor': PriceHistory.id,
+        # Walks idx_crypto_timestamp in order, so no sort is needed
+        'order': [PriceHistory.crypto_symbol, PriceHistory.timestamp]
+    },
+    'candles': {
+        'columns': [PriceCandle.crypto_symbol, PriceCandle.resolution, PriceCandle.bucket, PriceCandle.open,
+                    PriceCandle.high, PriceCandle.low, PriceCandle.close, PriceCandle.volume_24h,
+                    PriceCandle.last_tick, PriceCandle.updated_at],
+        'time': PriceCandle.bucket,
+        # Candles keep changing until their bucket closes, and backfills rewrite old ones
+        'cursor': PriceCandle.updated_at,
+        'order': [PriceCandle.crypto_symbol, PriceCandle.resolution, PriceCandle.bucket]
+    }
+}
+
+class ExportUnavailable(Exception):
+    """Raised when pyarrow is not installed"""
+    pass
+
+Cursor = Union[int, datetime]
+
+def parse_cursor(dataset: str, value: str) -> Cursor:
+    """Read a cursor written by format_cursor: a row id for prices, an update time for candles"""
+    if dataset not in DATASETS:
+        raise ValueError(f"Unsupported dataset: {dataset}")
+    try:
+        if DATASETS[dataset]['cursor'].type.python_type is int:
+            return int(value)
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid cursor for {dataset}: {value}")
+
+def format_cursor(cursor: Cursor) -> str:
+    return cursor.isoformat() if isinstance(cursor, datetime) else str(cursor)
+
+class _ChunkSink:
+    """Write-only file collecting encoded bytes until the caller drains them"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class HistoryExport:
+    """
+    Stream price history or candles as Parquet or Arrow IPC.
+
+    Rows are read through a server-side cursor EXPORT_BATCH_SIZE at a time
+    and each batch is written as its own Parquet row group or Arrow record
+    batch, then handed to the caller as bytes, so memory stays bounded by one
+    batch however large the range. `after` exports only rows written after
+    a previous export's last_cursor (prices by id, candles by updated_at),
+    for incremental dumps that also pick up backfilled older rows.
+    """
+
+    def __init__(self, dataset: str = 'prices', format: str = 'parquet', symbols: Optional[List[str]] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 after: Optional[Cursor] = None, batch_size: int = EXPORT_BATCH_SIZE):
+        if pa is None:
+            raise ExportUnavailable("Exports need pyarrow installed")
+        if dataset not in DATASETS:
+            raise ValueError(f"Unsupported dataset: {dataset}")
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported format: {format}")
+        self.dataset = dataset
+        self.format = format
+        self.symbols = symbols
+        self.start = start
+        self.end = end
+        self.after = after
+        self.batch_size = batch_size
+        self.rows = 0
+        self.last_cursor: Optional[Cursor] = None
+
+    @property
+    def mimetype(self) -> str:
+        return FORMATS[self.format]
+
+    def schema(self) -> 'pa.Schema':
+        fields = []
+        for column in DATASETS[self.dataset]['columns']:
+            python_type = column.type.python_type
+            if python_type is datetime:
+                fields.append(pa.field(column.key, pa.timestamp('ms'), nullable=column.expression.nullable))
+            elif python_type is int:
+                fields.append(pa.field(column.key, pa.int64(), nullable=column.expression.nullable))
+            elif python_type is float:
+                fields.append(pa.field(column.key, pa.float64(), nullable=column.expression.nullable))
+            else:
+                fields.append(pa.field(column.key, pa.string(), nullable=column.expression.nullable))
+        return pa.schema(fields)
+
+    def query(self):
+        spec = DATASETS[self.dataset]
+        model = spec['columns'][0].class_
+        statement = select(*spec['columns']).order_by(*spec['order'])
+        if self.symbols:
+            statement = statement.where(model.crypto_symbol.in_(self.symbols))
+        if self.start is not None:
+            statement = statement.where(spec['time'] >= self.start)
+        if self.end is not None:
+            statement = statement.where(spec['time'] < self.end)
+        if self.after is not None:
+            statement = statement.where(spec['cursor'] > self.after)
+        # yield_per streams from a server-side cursor on PostgreSQL instead of buffering the result
+        return statement.execution_options(yield_per=self.batch_size)
+
+    def batches(self) -> Iterator['pa.RecordBatch']:
+        schema = self.schema()
+        cursor_index = [column.key for column in DATASETS[self.dataset]['columns']].index(
+            DATASETS[self.dataset]['cursor'].key
+        )
+        for rows in db.session.execute(self.query()).partitions():
+            self.rows += len(rows)
+            newest = max(row[cursor_index] for row in rows)
+            if self.last_cursor is None or newest > self.last_cursor:
+                self.last_cursor = newest
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema
+            )
+
+    def stream(self) -> Iterator[bytes]:
+        """Encoded file contents, one chunk per batch; last_cursor is set once exhausted"""
+        sink = _ChunkSink()
+        schema = self.schema()
+        if self.format == 'parquet':
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='zstd')
+        else:
+            writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema)
+        try:
+            for batch in self.batches():
+                if self.format == 'parquet':
+                    writer.write_batch(batch, row_group_size=self.batch_size)
+                else:
+                    writer.write_batch(batch)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        finally:
+            writer.close()
+        yield sink.drain()
+        logger.info(f"Exported {self.rows} {self.dataset} rows as {self.format}")
+
+    def write_to(self, path: str) -> Dict:
+        """Export to a file; returns rows written and the cursor to resume after"""
+        with open(path, 'wb') as f:
+            for chunk in self.stream():
+                f.write(chunk)
+        return {'rows': self.rows, 'last_cursor': self.last_cursor}
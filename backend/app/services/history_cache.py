@@ -0,0 +1,123 @@
+# app/services/history_cache.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached market_chart response stays fresh, by CoinGecko interval
+DEFAULT_HISTORY_TTLS = {
+    'daily': 3600,
+    'hourly': 300,
+    None: 60  # Automatic granularity (5-minutely for short ranges)
+}
+
+class HistoryCache:
+    """
+    Persistent cache for market_chart history, keyed by (coin, days, interval).
+
+    Entries live in a SQLite file in WAL mode, so every worker on the host shares
+    them and they survive worker restarts. Each process keeps one connection per
+    thread. The least recently used entries are evicted once max_entries is
+    exceeded.
+    """
+
+    def __init__(self, path: str, max_entries: int = 500, ttls: Optional[Dict] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_HISTORY_TTLS)
+        self.ttls.update(ttls or {})
+        self._local = threading.local()
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'writes': 0, 'evictions': 0}
+
+        connection = self._connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS history_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' payload TEXT NOT NULL,'
+            ' fetched_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS idx_history_cache_accessed ON history_cache (accessed_at)')
+        connection.commit()
+
+    @classmethod
+    def open(cls, path: Optional[str], **kwargs) -> Optional['HistoryCache']:
+        """Open the cache at path, returning None when it is not configured or cannot be created"""
+        if not path:
+            return None
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            return cls(path, **kwargs)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"History cache unavailable: {str(e)}")
+            return None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def make_key(coin_id: str, days, interval: Optional[str]) -> str:
+        return f"{coin_id}:{days}:{interval or 'auto'}"
+
+    def ttl_for(self, interval: Optional[str]) -> float:
+        return self.ttls.get(interval, self.ttls[None])
+
+    def get(self, coin_id: str, days, interval: Optional[str]) -> Optional[Tuple[List[Dict], float]]:
+        """Return the cached (history, fetched_at) regardless of age, or None"""
+        key = self.make_key(coin_id, days, interval)
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT payload, fetched_at FROM history_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            connection.execute('UPDATE history_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            connection.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading history cache: {str(e)}")
+            return None
+        self.stats['hits'] += 1
+        return json.loads(row[0]), row[1]
+
+    def is_fresh(self, fetched_at: float, interval: Optional[str]) -> bool:
+        return time.time() - fetched_at < self.ttl_for(interval)
+
+    def put(self, coin_id: str, days, interval: Optional[str], history: List[Dict]):
+        """Store history and evict the least recently used entries beyond max_entries"""
+        key = self.make_key(coin_id, days, interval)
+        now = time.time()
+        try:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO history_cache (key, payload, fetched_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(history), now, now)
+            )
+            evicted = connection.execute(
+                'DELETE FROM history_cache WHERE key IN ('
+                ' SELECT key FROM history_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+            connection.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing history cache: {str(e)}")
+            return
+        self.stats['writes'] += 1
+        self.stats['evictions'] += max(evicted, 0)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, path=self.path, max_entries=self.max_entries)
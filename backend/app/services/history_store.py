@@ -0,0 +1,347 @@
+# app/services/history_store.py
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy import func, insert, inspect, text
+from app import db
+from app.models.price_candle import PriceCandle
+from app.models.price_history import PriceHistory
+from .candles import CANDLE_RESOLUTIONS, bucket_start, get_candles, rebuild_candles, upsert_candles
+
+logger = logging.getLogger(__name__)
+
+# Bucket width in seconds for each supported chart resolution; None returns raw ticks
+RESOLUTIONS = {
+    None: None,
+    'raw': None,
+    '1m': 60,
+    '5m': 300,
+    '15m': 900,
+    '1h': 3600,
+    '4h': 14400,
+    '1d': 86400
+}
+
+# Stored history starting this close to the requested start counts as covering it
+BACKFILL_TOLERANCE = timedelta(hours=2)
+
+# Ticks further apart than this many upstream point spacings (and the tolerance) leave a gap
+GAP_FACTOR = 2
+
+# Don't ask the upstream again for the same symbol's older range within this many seconds
+BACKFILL_RETRY_SECONDS = 3600
+
+# Seconds a request with nothing stored for its range waits for that range's backfill
+FIRST_BACKFILL_WAIT = 10
+
+def insert_ticks(rows: List[Dict]):
+    """
+    Insert price_history rows without committing.
+
+    PostgreSQL and SQLite skip rows whose (crypto_symbol, timestamp) is
+    already stored with ON CONFLICT DO NOTHING, so overlapping backfills and
+    re-ingested snapshots never duplicate ticks. Other backends do a plain
+    insert, which the unique index rejects on a duplicate.
+    """
+    dialect = db.session.get_bind(mapper=PriceHistory).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        db.session.execute(insert(PriceHistory), rows)
+        return
+    statement = dialect_insert(PriceHistory).on_conflict_do_nothing(index_elements=['crypto_symbol', 'timestamp'])
+    db.session.execute(statement, rows)
+
+def tick_index_is_unique() -> bool:
+    """
+    Whether price_history has the unique idx_crypto_timestamp insert_ticks relies on.
+
+    create_all never alters an existing index, so a database created before
+    ticks were deduplicated keeps a plain one and every ON CONFLICT insert
+    fails. A table that doesn't exist yet counts as unique.
+    """
+    inspector = inspect(db.engine)
+    if not inspector.has_table(PriceHistory.__tablename__):
+        return True
+    return any(index['name'] == 'idx_crypto_timestamp' and index['unique']
+               for index in inspector.get_indexes(PriceHistory.__tablename__))
+
+def rebuild_tick_index() -> int:
+    """Delete duplicate ticks, keeping the first stored, and recreate idx_crypto_timestamp as unique; returns rows deleted"""
+    index = next(index for index in PriceHistory.__table__.indexes if index.name == 'idx_crypto_timestamp')
+    with db.engine.begin() as connection:
+        deleted = connection.execute(text(
+            'DELETE FROM price_history WHERE EXISTS (SELECT 1 FROM price_history earlier'
+            ' WHERE earlier.crypto_symbol = price_history.crypto_symbol'
+            ' AND earlier."timestamp" = price_history."timestamp" AND earlier.id < price_history.id)'
+        )).rowcount
+        connection.execute(text('DROP INDEX IF EXISTS idx_crypto_timestamp'))
+        index.create(connection)
+    logger.info(f"Rebuilt idx_crypto_timestamp as unique after deleting {deleted} duplicate ticks")
+    return deleted
+
+def upstream_spacing(start: datetime) -> timedelta:
+    """Spacing of the points the provider returns for history reaching back to start"""
+    age = datetime.utcnow() - start
+    if age <= timedelta(days=1):
+        return timedelta(minutes=5)
+    if age <= timedelta(days=90):
+        return timedelta(hours=1)
+    return timedelta(days=1)
+
+class HistoryStore:
+    """
+    Price history served from the price_history table.
+
+    Resolutions with maintained candles (1m, 5m, 1h, 1d) are read from
+    price_candles with gaps filled; others bucket the raw ticks, selecting only
+    (timestamp, price_usd), which the covering idx_crypto_timestamp index
+    answers without touching the table. Gaps in the stored ticks for a
+    requested range (an older range, or downtime in the middle) are backfilled
+    from the price provider on a background thread and persisted, so the
+    request is answered from what is stored and later reads never leave the
+    database; only a request with nothing stored for its range (a new coin or
+    a fresh database) waits for its backfill. Raw ticks past retention are read
+    from the compressed tick archive.
+    """
+
+    def __init__(self, price_service, partitions=None, archive=None):
+        self.price_service = price_service
+        self.partitions = partitions
+        self.archive = archive
+        self.version = 0  # Bumped whenever backfilled rows are stored, for caches of history reads
+        self._backfilled = {}  # symbol -> (earliest start attempted, attempted at)
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history-backfill')
+        self.stats = {'queries': 0, 'points': 0, 'backfills': 0, 'backfilled_rows': 0, 'backfill_errors': 0,
+                      'backfills_queued': 0}
+
+    def get_history(self, symbol: str, start: datetime, end: Optional[datetime] = None,
+                    resolution: Optional[str] = None, since: Optional[datetime] = None) -> List[Dict]:
+        """
+        Points for symbol between start and end (naive UTC), oldest first.
+
+        since returns only points strictly after it, for charts that append;
+        for candle resolutions the bucket holding since is returned again as
+        it may have changed. Raw ticks are bucketed keeping the last price.
+        """
+        symbol = self.price_service.resolve_symbol(symbol)
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unsupported resolution: {resolution}")
+        end = end or datetime.utcnow()
+        if start >= end:
+            raise ValueError("'from' must be before 'to'")
+
+        if since is None:
+            if resolution in CANDLE_RESOLUTIONS:
+                # Roll up stored ticks first so backfilled candles don't mask them
+                self._ensure_candles(symbol, resolution, start)
+            pending = self._ensure_backfilled(symbol, start, end)
+            if pending is not None and not self.has_ticks(symbol, start, end):
+                # End this session's read first: storing the backfill may create partitions
+                db.session.commit()
+                wait([pending], timeout=FIRST_BACKFILL_WAIT)
+
+        if resolution in CANDLE_RESOLUTIONS:
+            width = CANDLE_RESOLUTIONS[resolution]
+            if since is not None:
+                start = max(start, bucket_start(since, width))
+            points = get_candles(symbol, resolution, start, end)
+            self.stats['queries'] += 1
+            self.stats['points'] += len(points)
+            return points
+
+        query = db.session.query(PriceHistory.timestamp, PriceHistory.price_usd).filter(
+            PriceHistory.crypto_symbol == symbol,
+            PriceHistory.timestamp >= start,
+            PriceHistory.timestamp <= end
+        )
+        if since is not None:
+            query = query.filter(PriceHistory.timestamp > since)
+        rows = query.order_by(PriceHistory.timestamp).all()
+        if self.archive is not None:
+            archived = self.archive.get_ticks(symbol, start, end, since)
+            if archived:
+                # Rows still in the table win over archived copies of the same ticks
+                cutoff = rows[0][0] if rows else None
+                rows = [tick for tick in archived if cutoff is None or tick[0] < cutoff] + rows
+
+        points = self._bucket(rows, RESOLUTIONS[resolution])
+        self.stats['queries'] += 1
+        self.stats['points'] += len(points)
+        return points
+
+    @staticmethod
+    def _bucket(rows, width: Optional[int]) -> List[Dict]:
+        """Format rows as chart points, keeping the last tick in each width-second bucket"""
+        if not width:
+            return [{'timestamp': timestamp.isoformat(), 'price': price} for timestamp, price in rows]
+        buckets = {}
+        for timestamp, price in rows:
+            epoch = (timestamp - datetime(1970, 1, 1)).total_seconds()
+            buckets[int(epoch // width) * width] = price
+        return [
+            {'timestamp': datetime.utcfromtimestamp(bucket).isoformat(), 'price': price}
+            for bucket, price in buckets.items()
+        ]
+
+    def _ensure_candles(self, symbol: str, resolution: str, start: datetime):
+        """
+        Roll up stored ticks older than the symbol's earliest candle.
+
+        Ingest maintains candles from then on, so this only covers ticks kept
+        before rollups existed; it runs once per older start.
+        """
+        earliest = db.session.query(func.min(PriceCandle.bucket)).filter(
+            PriceCandle.crypto_symbol == symbol,
+            PriceCandle.resolution == resolution
+        ).scalar()
+        if earliest is not None and earliest <= start + BACKFILL_TOLERANCE:
+            return
+        try:
+            rebuild_candles(symbol, start, earliest or datetime.utcnow())
+        except Exception as e:
+            logger.warning(f"Could not rebuild {symbol} candles: {str(e)}")
+            db.session.rollback()
+
+    def _ensure_backfilled(self, symbol: str, start: datetime, end: datetime) -> Optional[Future]:
+        """
+        Queue a background backfill of the gaps in [start, end], at most once per symbol per retry period.
+
+        Returns the symbol's unfinished backfill, whether queued now or earlier, or None.
+        """
+        with self._lock:
+            pending = self._pending.get(symbol)
+            if pending is not None and not pending.done():
+                return pending
+            attempted = self._backfilled.get(symbol)
+            if attempted and attempted[0] <= start and time.time() - attempted[1] < BACKFILL_RETRY_SECONDS:
+                return None
+            self._backfilled[symbol] = (start, time.time())
+            self.stats['backfills_queued'] += 1
+            self._pending[symbol] = self._executor.submit(
+                self._backfill_in_app, current_app._get_current_object(), symbol, start, end
+            )
+            return self._pending[symbol]
+
+    def backfill_pending(self, symbol: str) -> bool:
+        """Whether a backfill for symbol is queued or running"""
+        with self._lock:
+            pending = self._pending.get(symbol)
+            return pending is not None and not pending.done()
+
+    def _backfill_in_app(self, app, symbol: str, start: datetime, end: datetime):
+        """Backfill thread entry point: run with the Flask app context it lacks"""
+        with app.app_context():
+            try:
+                self.backfill_gaps(symbol, start, end)
+            except Exception as e:
+                self.stats['backfill_errors'] += 1
+                logger.warning(f"Could not backfill {symbol} history: {str(e)}")
+                db.session.rollback()
+
+    def wait_for_backfills(self, timeout: Optional[float] = None):
+        """Block until the queued backfills have finished"""
+        with self._lock:
+            pending = list(self._pending.values())
+        wait(pending, timeout=timeout)
+
+    def find_gaps(self, symbol: str, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        """
+        Spans of [start, end] without a stored or archived tick.
+
+        A gap is a stretch longer than GAP_FACTOR times the spacing the
+        provider would return for the range (and at least BACKFILL_TOLERANCE),
+        so backfilled hourly or daily points don't count as gaps themselves.
+        """
+        max_gap = max(GAP_FACTOR * upstream_spacing(start), BACKFILL_TOLERANCE)
+        timestamps = [timestamp for (timestamp,) in db.session.query(PriceHistory.timestamp).filter(
+            PriceHistory.crypto_symbol == symbol,
+            PriceHistory.timestamp >= start,
+            PriceHistory.timestamp <= end
+        ).order_by(PriceHistory.timestamp)]
+        if self.archive is not None:
+            archived = [timestamp for timestamp, _ in self.archive.get_ticks(symbol, start, end)]
+            if archived:
+                timestamps = sorted(set(timestamps).union(archived))
+
+        gaps = []
+        previous = start
+        for timestamp in timestamps + [end]:
+            if timestamp - previous > max_gap:
+                gaps.append((previous, timestamp))
+            previous = timestamp
+        return gaps
+
+    def backfill_gaps(self, symbol: str, start: datetime, end: datetime) -> int:
+        """Fetch the history covering every gap in [start, end] once and store it; returns rows written"""
+        gaps = self.find_gaps(symbol, start, end)
+        if not gaps:
+            return 0
+        points = self.fetch_history(symbol, gaps[0][0])
+        return sum(self.store_history(symbol, points, gap_start, gap_end) for gap_start, gap_end in gaps)
+
+    def backfill(self, symbol: str, start: datetime, end: datetime) -> int:
+        """Fetch [start, end) from the price provider and store it; returns rows written"""
+        return self.store_history(symbol, self.fetch_history(symbol, start), start, end)
+
+    def fetch_history(self, symbol: str, start: datetime) -> List[Tuple[float, float]]:
+        """(timestamp ms, price) points from start until now, as a background request; touches no database"""
+        days = max(1, math.ceil((datetime.utcnow() - start).total_seconds() / 86400))
+        # Automatic granularity: 5-minutely up to a day, hourly up to 90 days, daily beyond.
+        # Goes through the host's history cache, and only spends rate budget the quote refreshes leave spare
+        return self.price_service.get_history(symbol, days, None, background=True)
+
+    def store_history(self, symbol: str, points: List[Tuple[float, float]], start: datetime, end: datetime) -> int:
+        """Bulk-insert the points within [start, end) with their candles and commit; returns rows sent"""
+        rows = []
+        for timestamp_ms, price in points:
+            timestamp = datetime.utcfromtimestamp(timestamp_ms / 1000)
+            if start <= timestamp < end:
+                rows.append({'crypto_symbol': symbol, 'price_usd': price, 'timestamp': timestamp})
+        if rows:
+            if self.partitions is not None:
+                self.partitions.ensure_partitions(rows[0]['timestamp'], rows[-1]['timestamp'])
+            insert_ticks(rows)
+            upsert_candles((symbol, row['timestamp'], row['price_usd'], None) for row in rows)
+            db.session.commit()
+            self.version += 1
+
+        self.stats['backfills'] += 1
+        self.stats['backfilled_rows'] += len(rows)
+        logger.info(f"Backfilled {len(rows)} {symbol} price rows from {start.isoformat()} to {end.isoformat()}")
+        return len(rows)
+
+    def has_ticks(self, symbol: str, start: datetime, end: datetime) -> bool:
+        """Whether any tick for symbol in [start, end] is stored or archived"""
+        stored = db.session.query(PriceHistory.timestamp).filter(
+            PriceHistory.crypto_symbol == symbol,
+            PriceHistory.timestamp >= start,
+            PriceHistory.timestamp <= end
+        ).first()
+        if stored is not None:
+            return True
+        return self.archive is not None and bool(self.archive.get_ticks(symbol, start, end))
+
+    def latest_tick(self, symbol: str) -> Optional[datetime]:
+        """Timestamp of the newest stored tick for symbol, one probe of idx_crypto_timestamp"""
+        return db.session.query(func.max(PriceHistory.timestamp)).filter(
+            PriceHistory.crypto_symbol == symbol
+        ).scalar()
+
+    def earliest_tick(self, symbol: str) -> Optional[datetime]:
+        """Timestamp of the oldest stored tick for symbol"""
+        return db.session.query(func.min(PriceHistory.timestamp)).filter(
+            PriceHistory.crypto_symbol == symbol
+        ).scalar()
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
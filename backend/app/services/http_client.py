@@ -0,0 +1,151 @@
+# app/services/http_client.py
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (500, 502, 503, 504)
+# Responses counted against the circuit breaker; 429 is returned at once, not retried
+FAILURE_STATUSES = (429,) + RETRY_STATUSES
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+    pass
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold failures in a row the breaker opens and rejects
+    calls for reset_timeout seconds. It then lets a single trial call through
+    (half-open); success closes it again, failure re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def allow(self) -> bool:
+        """Check whether a call may go through"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let one trial request through
+                self.state = self.HALF_OPEN
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.stats['opened'] += 1
+                    logger.warning(f"Circuit breaker opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, state=self.state, failures=self.failures)
+
+class UpstreamClient:
+    """
+    Shared HTTP client for one upstream API.
+
+    Wraps a keep-alive requests.Session with a bounded connection pool,
+    connect/read timeouts per endpoint, exponential-backoff retries on 5xx
+    responses and a circuit breaker. A 429 is never retried or slept on here,
+    whatever its Retry-After says: it is returned at once and counts against
+    the breaker, and callers pace themselves with the rate limiter. Requests
+    made while the breaker is open raise CircuitOpenError so callers can fall
+    back to cached data.
+    """
+
+    def __init__(self, name: str, base_url: str = '',
+                 timeout: Tuple[float, float] = (3.05, 10),
+                 endpoint_timeouts: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_retries: int = 2, backoff_factor: float = 0.5, pool_size: int = 10,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.endpoint_timeouts = dict(endpoint_timeouts or {})
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = Histogram()
+        self.stats = {'requests': 0, 'errors': 0, 'retries': 0}
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        _clients[name] = self
+
+    def get(self, path: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """GET base_url + path, using the timeouts configured for endpoint"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        kwargs.setdefault('timeout', self.endpoint_timeouts.get(endpoint, self.timeout))
+        self.stats['requests'] += 1
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.RequestException:
+            self.stats['errors'] += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None:
+            self.stats['retries'] += len(retries.history)
+
+        if response.status_code in FAILURE_STATUSES:
+            self.stats['errors'] += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get_stats(self) -> Dict:
+        """Request, retry, latency and breaker counters for this process"""
+        return dict(self.stats, latency=self.latency.summary(), breaker=self.breaker.get_stats())
+
+# Every UpstreamClient registers itself here so its counters can be reported
+_clients: Dict[str, UpstreamClient] = {}
+
+def get_client_stats() -> Dict:
+    """Counters for every upstream client created in this process"""
+    return {name: client.get_stats() for name, client in _clients.items()}
@@ -0,0 +1,163 @@
+# app/services/partitions.py
+import logging
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Rows deleted per statement when retention falls back to DELETE
+DELETE_BATCH_SIZE = 5000
+# Longest a partition DDL waits for its ACCESS EXCLUSIVE lock on the parent table
+DDL_LOCK_TIMEOUT_MS = 2000
+
+class PartitionManager:
+    """
+    Daily range partitions for an append-only table on PostgreSQL.
+
+    Each day lives in <table>_pYYYYMMDD; a <table>_default partition catches
+    rows outside every created range so inserts never fail. Retention drops
+    whole day partitions, which is instant and leaves no bloat. On other
+    backends, or a PostgreSQL table created before partitioning, retention
+    falls back to deleting in small batches so no statement holds locks for long.
+    """
+
+    def __init__(self, table: str = 'price_history', days_ahead: int = 7):
+        self.table = table
+        self.days_ahead = days_ahead
+        self._partitioned: Optional[bool] = None
+        self._known = set()
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'dropped': 0, 'deleted_rows': 0, 'errors': 0}
+        self._pattern = re.compile(rf'^{re.escape(table)}_p(\d{{8}})$')
+
+    def is_partitioned(self) -> bool:
+        """Check once whether the table is a native PostgreSQL partitioned table"""
+        if self._partitioned is None:
+            if db.engine.dialect.name != 'postgresql':
+                self._partitioned = False
+            else:
+                with db.engine.connect() as connection:
+                    self._partitioned = bool(connection.execute(text(
+                        'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid'
+                        ' WHERE c.relname = :table'
+                    ), {'table': self.table}).scalar())
+        return self._partitioned
+
+    def partition_name(self, day: date) -> str:
+        return f"{self.table}_p{day:%Y%m%d}"
+
+    def ensure_partitions(self, start: datetime, end: datetime) -> int:
+        """
+        Create the day partitions covering [start, end] plus the default partition; returns partitions created.
+
+        CREATE TABLE ... PARTITION OF needs an ACCESS EXCLUSIVE lock on the
+        parent, which would wait forever on the AccessShareLock a read earlier
+        in the calling session holds. So when anything has to be created the
+        session's transaction is committed first, and each statement runs on
+        its own connection under DDL_LOCK_TIMEOUT_MS so a long read elsewhere
+        delays it instead of queueing every other reader behind it.
+        """
+        if not self.is_partitioned():
+            return 0
+        days = []
+        day = start.date()
+        while day <= end.date():
+            if day not in self._known:
+                days.append(day)
+            day += timedelta(days=1)
+        if not days and 'default' in self._known:
+            return 0
+
+        created = 0
+        db.session.commit()
+        with self._lock:
+            statements = [] if 'default' in self._known else [
+                ('default', f'CREATE TABLE IF NOT EXISTS {self.table}_default PARTITION OF {self.table} DEFAULT')
+            ]
+            statements += [
+                (day, f"CREATE TABLE IF NOT EXISTS {self.partition_name(day)} PARTITION OF {self.table}"
+                      f" FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')")
+                for day in days
+            ]
+            for key, statement in statements:
+                try:
+                    self._execute_ddl(statement)
+                except Exception as e:
+                    # The default partition already holds rows for this day, or the lock wait
+                    # timed out; rows stay in the default partition and are trimmed by
+                    # retention, so don't retry on every insert
+                    self.stats['errors'] += 1
+                    logger.warning(f"Could not create partition {key}: {str(e)}")
+                else:
+                    created += 1
+                self._known.add(key)
+        self.stats['created'] += created
+        return created
+
+    def _execute_ddl(self, statement: str) -> None:
+        """Run one DDL statement in its own transaction with a bounded lock wait"""
+        with db.engine.begin() as connection:
+            connection.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT_MS}ms'"))
+            connection.execute(text(statement))
+
+    def ensure_future(self) -> int:
+        """Create partitions from today through days_ahead days from now"""
+        now = datetime.utcnow()
+        return self.ensure_partitions(now, now + timedelta(days=self.days_ahead))
+
+    def list_partitions(self) -> Dict[date, str]:
+        """Day partitions currently attached to the table"""
+        with db.engine.connect() as connection:
+            names = connection.execute(text(
+                'SELECT c.relname FROM pg_inherits i'
+                ' JOIN pg_class c ON c.oid = i.inhrelid'
+                ' JOIN pg_class p ON p.oid = i.inhparent'
+                ' WHERE p.relname = :table'
+            ), {'table': self.table}).scalars().all()
+        partitions = {}
+        for name in names:
+            match = self._pattern.match(name)
+            if match:
+                partitions[datetime.strptime(match.group(1), '%Y%m%d').date()] = name
+        return partitions
+
+    def drop_before(self, cutoff: datetime) -> int:
+        """Drop every day partition entirely older than cutoff and trim the default partition"""
+        dropped: List[str] = []
+        # DROP TABLE on a partition locks the parent like CREATE does; see ensure_partitions
+        db.session.commit()
+        for day, name in sorted(self.list_partitions().items()):
+            if day + timedelta(days=1) > cutoff.date():
+                break
+            self._execute_ddl(f'DROP TABLE IF EXISTS {name}')
+            self._known.discard(day)
+            dropped.append(name)
+        self.stats['dropped'] += len(dropped)
+        if dropped:
+            logger.info(f"Dropped {len(dropped)} {self.table} partitions: {', '.join(dropped)}")
+        self.delete_before(cutoff, table=f'{self.table}_default')
+        return len(dropped)
+
+    def delete_before(self, cutoff: datetime, table: Optional[str] = None) -> int:
+        """Delete rows older than cutoff in DELETE_BATCH_SIZE batches, committing between them"""
+        table = table or self.table
+        statement = text(
+            f'DELETE FROM {table} WHERE id IN'
+            f' (SELECT id FROM {table} WHERE "timestamp" < :cutoff LIMIT :limit)'
+        )
+        deleted = 0
+        while True:
+            with db.engine.begin() as connection:
+                count = connection.execute(statement, {'cutoff': cutoff, 'limit': DELETE_BATCH_SIZE}).rowcount
+            deleted += max(count, 0)
+            if count < DELETE_BATCH_SIZE:
+                break
+        self.stats['deleted_rows'] += deleted
+        return deleted
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, table=self.table, partitioned=self._partitioned)
@@ -0,0 +1,136 @@
+# app/services/price_cache.py
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from types import MappingProxyType
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class PriceSnapshot:
+    """Immutable set of quotes fetched from the upstream at one point in time"""
+    __slots__ = ('prices', 'fetched_at', 'version')
+
+    def __init__(self, prices: Dict, fetched_at: Optional[float] = None, version: int = 0):
+        frozen = {symbol: MappingProxyType(dict(quote)) for symbol, quote in prices.items()}
+        object.__setattr__(self, 'prices', MappingProxyType(frozen))
+        object.__setattr__(self, 'fetched_at', fetched_at if fetched_at is not None else time.time())
+        object.__setattr__(self, 'version', version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PriceSnapshot is immutable")
+
+    def __contains__(self, symbol):
+        return symbol in self.prices
+
+    def __len__(self):
+        return len(self.prices)
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Seconds elapsed since the snapshot was fetched"""
+        return (now if now is not None else time.time()) - self.fetched_at
+
+    def to_dict(self) -> Dict:
+        """Return a mutable copy of the quotes in the legacy get_all_prices format"""
+        return {symbol: dict(quote) for symbol, quote in self.prices.items()}
+
+class SnapshotCache:
+    """
+    TTL cache holding the latest PriceSnapshot.
+
+    Readers pick up the current snapshot with a single attribute read and never
+    take a lock. When the snapshot has expired, concurrent callers share one
+    in-flight load (single-flight): the first caller runs the loader and the
+    others wait on its result instead of hitting the upstream themselves.
+
+    A loader returns either a prices dict, stamped with the current time, or a
+    (prices, fetched_at) tuple for data fetched elsewhere.
+    """
+
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._snapshot = None
+        self._expired_before = 0.0
+        self._inflight = None
+        self._lock = threading.Lock()
+        self._versions = itertools.count(1)
+        self.stats = {
+            'hits': 0, 'misses': 0, 'stale_served': 0,
+            'loads': 0, 'load_errors': 0, 'shared_loads': 0
+        }
+        self._listeners = []
+
+    @property
+    def snapshot(self) -> Optional[PriceSnapshot]:
+        """Latest snapshot regardless of its age"""
+        return self._snapshot
+
+    def is_fresh(self, snapshot: Optional[PriceSnapshot], max_age: Optional[float] = None) -> bool:
+        """Check whether a snapshot is younger than max_age (defaults to the TTL)"""
+        if snapshot is None or snapshot.fetched_at < self._expired_before:
+            return False
+        return snapshot.age() < (self.ttl if max_age is None else max_age)
+
+    def get(self, loader: Callable[[], Dict], max_age: Optional[float] = None) -> PriceSnapshot:
+        """Return a snapshot no older than max_age, loading it through loader if needed"""
+        snapshot = self._snapshot
+        if self.is_fresh(snapshot, max_age):
+            self.stats['hits'] += 1
+            return snapshot
+        self.stats['misses'] += 1
+        return self._load(loader, max_age)
+
+    def add_listener(self, listener: Callable[[PriceSnapshot], None]):
+        """Call listener with every newly published snapshot"""
+        self._listeners.append(listener)
+
+    def publish(self, prices: Dict, fetched_at: Optional[float] = None) -> PriceSnapshot:
+        """Swap in a new snapshot built from prices"""
+        snapshot = PriceSnapshot(prices, fetched_at=fetched_at, version=next(self._versions))
+        self._snapshot = snapshot
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"Error in snapshot listener: {str(e)}")
+        return snapshot
+
+    def invalidate(self):
+        """Drop the current snapshot so the next read reloads it"""
+        self._snapshot = None
+
+    def expire(self, before: Optional[float] = None):
+        """Treat snapshots fetched before `before` as expired but keep them as a fallback"""
+        self._expired_before = max(self._expired_before, before if before is not None else time.time())
+
+    def _load(self, loader: Callable[[], Dict], max_age: Optional[float]) -> PriceSnapshot:
+        with self._lock:
+            # Another caller may have finished a load while we waited for the lock
+            snapshot = self._snapshot
+            if self.is_fresh(snapshot, max_age):
+                return snapshot
+            flight = self._inflight
+            leader = flight is None
+            if leader:
+                flight = self._inflight = Future()
+
+        if not leader:
+            self.stats['shared_loads'] += 1
+            return flight.result()
+
+        try:
+            self.stats['loads'] += 1
+            result = loader()
+            snapshot = self.publish(*result) if isinstance(result, tuple) else self.publish(result)
+            flight.set_result(snapshot)
+            return snapshot
+        except Exception as e:
+            self.stats['load_errors'] += 1
+            logger.error(f"Error loading price snapshot: {str(e)}")
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight = None
@@ -0,0 +1,498 @@
+# app/services/price_providers.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+from .http_client import UpstreamClient, CircuitBreaker
+from .metrics import Histogram
+from .rate_limiter import RateLimitExceeded, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
+
+# (connect, read) timeouts in seconds per CoinGecko endpoint
+COINGECKO_TIMEOUTS = {
+    'simple_price': (3.05, 5),
+    'market_chart': (3.05, 10),
+    'coins_list': (3.05, 30)
+}
+
+class PriceProvider:
+    """
+    Source of market data for PriceService.
+
+    Quotes are keyed by provider coin id and use the fields
+    price, change_24h, market_cap and volume_24h. History is a list of
+    (timestamp_ms, price) pairs. Coin listings use the /coins/list shape:
+    dicts with id, symbol and name.
+    """
+    name = 'base'
+
+    @property
+    def upstream(self) -> str:
+        """The source the provider's data comes from; providers sharing one share its rate limit and outages"""
+        return self.name
+
+    def get_prices(self, coin_ids: List[str], fail_fast: bool = False) -> Dict[str, Dict]:
+        """Get quotes for several coins in one request"""
+        raise NotImplementedError
+
+    def get_price(self, coin_id: str, fail_fast: bool = False) -> Dict:
+        """Get the quote for a single coin"""
+        quote = self.get_prices([coin_id], fail_fast=fail_fast).get(coin_id)
+        if quote is None:
+            raise ValueError(f"No price data available for {coin_id}")
+        return quote
+
+    def get_history(self, coin_id: str, days, interval: Optional[str] = 'daily',
+                    background: bool = False) -> List[Tuple[float, float]]:
+        """Get (timestamp_ms, price) points for a coin; background requests yield the rate budget to others"""
+        raise NotImplementedError
+
+    def list_coins(self) -> List[Dict]:
+        """Get every coin the provider can quote"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        """Provider-specific counters"""
+        return {}
+
+class CoinGeckoProvider(PriceProvider):
+    """Live CoinGecko API, rate limited through a host-wide token bucket"""
+    name = 'coingecko'
+
+    def __init__(self, base_url: str = COINGECKO_API_URL, api_key: Optional[str] = None,
+                 http: Optional[UpstreamClient] = None, rate_limiter: Optional[TokenBucket] = None,
+                 rate_limit_timeout: float = 5.0, background_reserve: float = 0.0):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.http = http or UpstreamClient('coingecko', base_url, endpoint_timeouts=COINGECKO_TIMEOUTS)
+        self.rate_limiter = rate_limiter or TokenBucket(rate=1.0, capacity=1)
+        self.rate_limit_timeout = rate_limit_timeout  # Longest a caller waits for a token in seconds
+        # Tokens background requests (backfills) leave in the bucket for quote refreshes
+        self.background_reserve = background_reserve
+
+    @classmethod
+    def from_config(cls, config) -> 'CoinGeckoProvider':
+        """Build the provider from Flask configuration"""
+        base_url = config.get('COINGECKO_API_URL', COINGECKO_API_URL)
+        return cls(
+            base_url=base_url,
+            api_key=config.get('COINGECKO_API_KEY'),
+            # One request budget shared by every worker on the host
+            rate_limiter=TokenBucket(
+                rate=config.get('COINGECKO_RATE_LIMIT_PER_MINUTE', 30) / 60.0,
+                capacity=config.get('COINGECKO_RATE_LIMIT_BURST', 5),
+                state_file=config.get('COINGECKO_RATE_LIMIT_FILE')
+            ),
+            rate_limit_timeout=config.get('COINGECKO_RATE_LIMIT_TIMEOUT', 5.0),
+            background_reserve=config.get('COINGECKO_BACKGROUND_RESERVE', 2),
+            http=UpstreamClient(
+                'coingecko',
+                base_url,
+                endpoint_timeouts=COINGECKO_TIMEOUTS,
+                max_retries=config.get('UPSTREAM_MAX_RETRIES', 2),
+                backoff_factor=config.get('UPSTREAM_BACKOFF_FACTOR', 0.5),
+                breaker=CircuitBreaker(
+                    failure_threshold=config.get('UPSTREAM_BREAKER_THRESHOLD', 5),
+                    reset_timeout=config.get('UPSTREAM_BREAKER_RESET', 30)
+                )
+            )
+        )
+
+    def _get_headers(self) -> Dict:
+        """Get headers for API requests"""
+        headers = {
+            'Accept': 'application/json',
+        }
+        if self.api_key:
+            headers['x-cg-demo-api-key'] = self.api_key
+        return headers
+
+    def _rate_limit(self, fail_fast: bool = False, background: bool = False):
+        """Take a token from the shared request budget, waiting up to rate_limit_timeout"""
+        reserve = self.background_reserve if background else 0.0
+        if fail_fast:
+            acquired = self.rate_limiter.try_acquire(reserve=reserve)
+        else:
+            acquired = self.rate_limiter.acquire(timeout=self.rate_limit_timeout, reserve=reserve)
+        if not acquired:
+            raise RateLimitExceeded("CoinGecko request budget exhausted")
+
+    def get_prices(self, coin_ids: List[str], fail_fast: bool = False) -> Dict[str, Dict]:
+        self._rate_limit(fail_fast=fail_fast)
+        response = self.http.get(
+            '/simple/price',
+            endpoint='simple_price',
+            headers=self._get_headers(),
+            params={
+                'ids': ','.join(coin_ids),
+                'vs_currencies': 'usd',
+                'include_24hr_change': 'true',
+                'include_market_cap': 'true',
+                'include_24hr_vol': 'true'
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        return {
+            coin_id: {
+                'price': quote['usd'],
+                'change_24h': quote.get('usd_24h_change', 0.0),
+                'market_cap': quote.get('usd_market_cap'),
+                'volume_24h': quote.get('usd_24h_vol')
+            }
+            for coin_id, quote in data.items() if 'usd' in quote
+        }
+
+    def get_history(self, coin_id: str, days, interval: Optional[str] = 'daily',
+                    background: bool = False) -> List[Tuple[float, float]]:
+        params = {
+            'vs_currency': 'usd',
+            'days': str(days)
+        }
+        if interval:
+            params['interval'] = interval
+
+        self._rate_limit(background=background)
+        response = self.http.get(
+            f'/coins/{coin_id}/market_chart',
+            endpoint='market_chart',
+            headers=self._get_headers(),
+            params=params
+        )
+
+        # Check if request was successful
+        if response.status_code != 200:
+            logger.error(f"CoinGecko API error: {response.status_code} - {response.text}")
+            raise Exception(f"Failed to fetch price history from CoinGecko (Status: {response.status_code})")
+
+        data = response.json()
+        if 'prices' not in data:
+            logger.error(f"Unexpected response format: {data}")
+            raise Exception("Invalid response format from CoinGecko")
+
+        return [(timestamp, float(price)) for timestamp, price in data['prices']]
+
+    def list_coins(self) -> List[Dict]:
+        self._rate_limit()
+        response = self.http.get('/coins/list', endpoint='coins_list', headers=self._get_headers())
+        response.raise_for_status()
+        return response.json()
+
+def _recording_path(directory: str, method: str, args: Dict) -> str:
+    key = json.dumps(args, sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(directory, f"{method}-{digest}.jsonl")
+
+class RecordingProvider(PriceProvider):
+    """
+    Wraps another provider and appends every response it returns to disk.
+
+    Each (method, arguments) pair gets its own JSON-lines file in directory, one
+    line per response, which ReplayProvider serves back in order.
+    """
+    name = 'record'
+
+    def __init__(self, inner: PriceProvider, directory: str):
+        self.inner = inner
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def upstream(self) -> str:
+        return self.inner.upstream
+
+    def _record(self, method: str, args: Dict, result):
+        line = json.dumps({'args': args, 'result': result, 'recorded_at': time.time()})
+        with self._lock:
+            with open(_recording_path(self.directory, method, args), 'a') as f:
+                f.write(line + '\n')
+
+    def get_prices(self, coin_ids: List[str], fail_fast: bool = False) -> Dict[str, Dict]:
+        result = self.inner.get_prices(coin_ids, fail_fast=fail_fast)
+        self._record('prices', {'coin_ids': sorted(coin_ids)}, result)
+        return result
+
+    def get_history(self, coin_id: str, days, interval: Optional[str] = 'daily',
+                    background: bool = False) -> List[Tuple[float, float]]:
+        result = self.inner.get_history(coin_id, days, interval, background=background)
+        self._record('history', {'coin_id': coin_id, 'days': str(days), 'interval': interval}, result)
+        return result
+
+    def list_coins(self) -> List[Dict]:
+        result = self.inner.list_coins()
+        self._record('coins', {}, result)
+        return result
+
+    def get_stats(self) -> Dict:
+        return {'directory': self.directory, 'inner': self.inner.get_stats()}
+
+class ReplayProvider(PriceProvider):
+    """
+    Serves responses captured by RecordingProvider without touching the network.
+
+    Responses for the same request are returned in recorded order and then wrap
+    around, so repeated runs see identical data. Every call sleeps for latency
+    seconds to stand in for the upstream round trip.
+    """
+    name = 'replay'
+
+    def __init__(self, directory: str, latency: float = 0.0):
+        self.directory = directory
+        self.latency = latency
+        self._recordings = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'misses': 0}
+
+    def _replay(self, method: str, args: Dict):
+        path = _recording_path(self.directory, method, args)
+        with self._lock:
+            self.stats['calls'] += 1
+            if path not in self._recordings:
+                try:
+                    with open(path) as f:
+                        self._recordings[path] = [json.loads(line)['result'] for line in f if line.strip()]
+                except FileNotFoundError:
+                    self._recordings[path] = []
+            responses = self._recordings[path]
+            if not responses:
+                self.stats['misses'] += 1
+                raise LookupError(f"No recording for {method} {args}")
+            position = self._positions.get(path, 0)
+            self._positions[path] = position + 1
+            result = responses[position % len(responses)]
+        if self.latency:
+            time.sleep(self.latency)
+        return result
+
+    def get_prices(self, coin_ids: List[str], fail_fast: bool = False) -> Dict[str, Dict]:
+        return self._replay('prices', {'coin_ids': sorted(coin_ids)})
+
+    def get_history(self, coin_id: str, days, interval: Optional[str] = 'daily',
+                    background: bool = False) -> List[Tuple[float, float]]:
+        return [tuple(point) for point in self._replay('history', {'coin_id': coin_id, 'days': str(days), 'interval': interval})]
+
+    def list_coins(self) -> List[Dict]:
+        return self._replay('coins', {})
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, directory=self.directory, latency=self.latency)
+
+class ProviderHealth:
+    """
+    Success score and latency for one provider behind FailoverProvider.
+
+    The score is an exponentially weighted success rate. After demote_after
+    consecutive failures the provider is demoted for demote_for seconds and
+    is only tried once every healthy provider has failed.
+    """
+
+    def __init__(self, provider: PriceProvider, alpha: float = 0.2, demote_after: int = 3,
+                 demote_for: float = 60):
+        self.provider = provider
+        self.alpha = alpha
+        self.demote_after = demote_after
+        self.demote_for = demote_for
+        self.score = 1.0
+        self.consecutive_failures = 0
+        self.demoted_until = 0.0
+        self.latency = Histogram()
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'failures': 0, 'wins': 0, 'demotions': 0}
+
+    def is_demoted(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.monotonic()) < self.demoted_until
+
+    def record_success(self, elapsed: float):
+        self.latency.observe(elapsed)
+        with self._lock:
+            self.stats['calls'] += 1
+            self.score += self.alpha * (1.0 - self.score)
+            self.consecutive_failures = 0
+            self.demoted_until = 0.0
+
+    def record_failure(self):
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['failures'] += 1
+            self.score -= self.alpha * self.score
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.demote_after and not self.is_demoted():
+                self.stats['demotions'] += 1
+                self.demoted_until = time.monotonic() + self.demote_for
+                logger.warning(f"Demoted price provider {self.provider.name} for {self.demote_for}s")
+
+    def hedge_delay(self, default: float, minimum: float, maximum: float) -> float:
+        """The provider's p95 latency, clamped to [minimum, maximum]; default until it has been measured"""
+        p95 = self.latency.percentile(95)
+        if p95 is None:
+            return default
+        return min(max(p95, minimum), maximum)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, name=self.provider.name, score=round(self.score, 3),
+                    demoted=self.is_demoted(), latency=self.latency.summary())
+
+class FailoverProvider(PriceProvider):
+    """
+    Several providers tried in order of health, with hedged quote requests.
+
+    Quotes go to the best-scoring healthy provider first. If it has not
+    answered within its own p95 latency the next provider is asked as well and
+    whichever answers first wins; the slower call finishes in the background
+    and still counts towards its provider's health. Failures fall through to
+    the next provider. A spent rate-limit budget moves on without counting
+    against the provider's health. History and coin lists fail over without
+    hedging.
+
+    Only a provider with another upstream is used as a hedge, and hedging is
+    off when every provider shares one (e.g. 'coingecko,record'): a second
+    call to the same API only spends its rate limit twice. Failover between
+    such providers is no more than a retry of the same upstream.
+    """
+    name = 'failover'
+
+    def __init__(self, providers: Sequence[PriceProvider], hedge: bool = True, hedge_delay: float = 0.5,
+                 min_hedge_delay: float = 0.05, max_hedge_delay: float = 2.0, **health_kwargs):
+        if not providers:
+            raise ValueError("FailoverProvider needs at least one provider")
+        self.health = [ProviderHealth(provider, **health_kwargs) for provider in providers]
+        upstreams = {provider.upstream for provider in providers}
+        if len(upstreams) < 2:
+            logger.warning(f"Every failover price provider reads from {upstreams.pop()}: "
+                           f"failover only retries it and quotes are not hedged")
+            hedge = False
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(providers), thread_name_prefix='price-hedge')
+        self.stats = {'hedged': 0, 'failovers': 0}
+
+    def _ranked(self) -> List[ProviderHealth]:
+        """Healthy providers by score (configured order breaks ties), then demoted ones"""
+        now = time.monotonic()
+        healthy = [health for health in self.health if not health.is_demoted(now)]
+        demoted = [health for health in self.health if health.is_demoted(now)]
+        return sorted(healthy, key=lambda health: -health.score) + demoted
+
+    def _call(self, health: ProviderHealth, method: str, *args):
+        start = time.perf_counter()
+        try:
+            result = getattr(health.provider, method)(*args)
+        except RateLimitExceeded:
+            raise
+        except Exception:
+            health.record_failure()
+            raise
+        health.record_success(time.perf_counter() - start)
+        return result
+
+    def _failover(self, method: str, *args):
+        errors = []
+        for health in self._ranked():
+            try:
+                result = self._call(health, method, *args)
+            except Exception as e:
+                errors.append(e)
+                self.stats['failovers'] += 1
+                logger.warning(f"{health.provider.name} {method} failed: {str(e)}")
+                continue
+            health.stats['wins'] += 1
+            return result
+        raise errors[0]
+
+    def get_prices(self, coin_ids: List[str], fail_fast: bool = False) -> Dict[str, Dict]:
+        ranked = self._ranked()
+        if not self.hedge or len(ranked) == 1:
+            return self._failover('get_prices', coin_ids, fail_fast)
+
+        primary, rest = ranked[0], ranked[1:]
+        pending = {self._executor.submit(self._call, primary, 'get_prices', coin_ids, fail_fast): primary}
+        done, _ = wait(pending, timeout=primary.hedge_delay(self.hedge_delay, self.min_hedge_delay,
+                                                             self.max_hedge_delay))
+        # Hedge with the best provider on another upstream; the same one would only be asked twice
+        secondary = next((health for health in rest if health.provider.upstream != primary.provider.upstream), None)
+        if not done and secondary is not None:
+            # Primary is slower than usual: ask the next provider too
+            self.stats['hedged'] += 1
+            rest.remove(secondary)
+            pending[self._executor.submit(self._call, secondary, 'get_prices', coin_ids, fail_fast)] = secondary
+
+        errors = []
+        while True:
+            if not done:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                health = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    logger.warning(f"{health.provider.name} get_prices failed: {str(e)}")
+                    continue
+                health.stats['wins'] += 1
+                return result
+            done = set()
+            if not pending:
+                if not rest:
+                    raise errors[0]
+                self.stats['failovers'] += 1
+                health = rest.pop(0)
+                pending[self._executor.submit(self._call, health, 'get_prices', coin_ids, fail_fast)] = health
+
+    def get_history(self, coin_id: str, days, interval: Optional[str] = 'daily',
+                    background: bool = False) -> List[Tuple[float, float]]:
+        return self._failover('get_history', coin_id, days, interval, background)
+
+    def list_coins(self) -> List[Dict]:
+        return self._failover('list_coins')
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, providers=[health.get_stats() for health in self.health])
+
+def _build_provider(name: str, config, coingecko: CoinGeckoProvider) -> PriceProvider:
+    directory = config.get('PRICE_RECORDINGS_DIR')
+    if name == 'coingecko':
+        return coingecko
+    if not directory:
+        raise ValueError(f"PRICE_RECORDINGS_DIR is required for the '{name}' price provider")
+    if name == 'record':
+        return RecordingProvider(coingecko, directory)
+    if name == 'replay':
+        return ReplayProvider(directory, latency=config.get('PRICE_REPLAY_LATENCY_MS', 0) / 1000.0)
+    raise ValueError(f"Unknown price provider: {name}")
+
+def create_provider(config, coingecko: CoinGeckoProvider) -> PriceProvider:
+    """
+    Pick the provider named by PRICE_PROVIDER ('coingecko', 'record' or 'replay').
+
+    When PRICE_PROVIDERS lists several names they are combined into a
+    FailoverProvider, the first name being the initial primary. Replay can
+    only be a failover target when TESTING: recorded prices quietly taking
+    over from a live provider would fill real trades at stale prices.
+    """
+    names = [name.strip() for name in (config.get('PRICE_PROVIDERS') or '').split(',') if name.strip()]
+    if len(names) < 2:
+        return _build_provider(names[0] if names else (config.get('PRICE_PROVIDER') or 'coingecko'),
+                               config, coingecko)
+    if 'replay' in names and not config.get('TESTING'):
+        raise ValueError("The 'replay' price provider can only be combined with others when TESTING")
+    return FailoverProvider(
+        [_build_provider(name, config, coingecko) for name in names],
+        hedge=config.get('PRICE_HEDGING', True),
+        hedge_delay=config.get('PRICE_HEDGE_DELAY_MS', 500) / 1000.0,
+        min_hedge_delay=config.get('PRICE_HEDGE_MIN_DELAY_MS', 50) / 1000.0,
+        max_hedge_delay=config.get('PRICE_HEDGE_MAX_DELAY_MS', 2000) / 1000.0,
+        demote_after=config.get('PROVIDER_DEMOTE_AFTER', 3),
+        demote_for=config.get('PROVIDER_DEMOTE_SECONDS', 60)
+    )
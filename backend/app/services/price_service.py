@@ -1,199 +1,377 @@
 # app/services/price_service.py
 import requests
-from flask import current_app
 import logging
-from functools import lru_cache
-from typing import Dict, Optional, List, Tuple
+import threading
 import time
-from datetime import datetime  # Add this import
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, List, Tuple
+from .price_cache import PriceSnapshot, SnapshotCache
+from .rate_limiter import RateLimitExceeded
+from .http_client import get_client_stats
+from .price_providers import CoinGeckoProvider, create_provider
+from .snapshot_store import RedisSnapshotStore
+from .shared_price_table import SharedPriceTable
+from .history_cache import HistoryCache
+from .coin_registry import CoinRegistry, chunk_ids
+from .symbol_resolver import SymbolResolver
+from .coalescer import BatchCoalescer
 
 logger = logging.getLogger(__name__)
 
+# Failures that are answered with the cached snapshot when one exists
+UPSTREAM_ERRORS = (RateLimitExceeded, requests.exceptions.RequestException)
+
+# Oldest snapshot (seconds) each kind of endpoint may be served while a refresh runs
+DEFAULT_MAX_STALENESS = {
+    'market': 300,
+    'portfolio': 300,
+    'trading': 60,
+    'chart': 3600
+}
+
 class PriceService:
     def __init__(self):
-        self.base_url = "https://api.coingecko.com/api/v3"
-        self.supported_coins = {
-            'BTC': 'bitcoin',
-            'ETH': 'ethereum',
-            'USDT': 'tether',
-            'BNB': 'binancecoin',
-            'USDC': 'usd-coin',
-            'XRP': 'ripple',
-            'ADA': 'cardano',
-            'DOGE': 'dogecoin',
-            'SOL': 'solana',
-            'TRX': 'tron'
-        }
-        self.last_request_time = 0
-        self.rate_limit_delay = 1.0  # Minimum delay between requests in seconds
+        self.registry = CoinRegistry.default()
+        self.supported_coins = self.registry.symbol_to_id
+        self.resolver = SymbolResolver(self.registry)
+        self.max_ids_length = 1800  # Longest comma-joined ids list per /simple/price request
+        self.fetch_concurrency = 4
+        self._chunk_offset = 0  # Chunk the next refresh starts from after a partial one
+        # Quotes for symbols the snapshot lacks are batched into shared /simple/price calls
+        self.coalescer = BatchCoalescer(self._fetch_batch, window=0.01, max_batch=100)
+        self.coingecko = CoinGeckoProvider()
+        self.provider = self.coingecko
         self.app = None
-        self._api_key = None
+        self.cache = SnapshotCache(ttl=60)
+        self.max_staleness = dict(DEFAULT_MAX_STALENESS)
+        self._background_refresh = threading.Lock()
+        self.shared_store = None
+        self.shared_table = None
+        self.history_cache = None
 
     def init_app(self, app):
         """Initialize with Flask app"""
         self.app = app
-        # Get API key from config if available
-        self._api_key = app.config.get('COINGECKO_API_KEY')
+        self.cache.ttl = app.config.get('PRICE_CACHE_DURATION', self.cache.ttl)
+        self.max_staleness.update(app.config.get('MARKET_MAX_STALENESS', {}))
+        # CoinGecko client (API key, rate limit, HTTP pool) and the provider quotes come from
+        self.coingecko = CoinGeckoProvider.from_config(app.config)
+        self.provider = create_provider(app.config, self.coingecko)
+        self.registry = self._load_registry(app.config)
+        self.supported_coins = self.registry.symbol_to_id
+        self.resolver = SymbolResolver(self.registry, app.config.get('SYMBOL_ALIASES'))
+        self.max_ids_length = app.config.get('COINGECKO_MAX_IDS_LENGTH', self.max_ids_length)
+        self.fetch_concurrency = app.config.get('PRICE_FETCH_CONCURRENCY', self.fetch_concurrency)
+        self.coalescer.window = app.config.get('PRICE_COALESCE_WINDOW_MS', 10) / 1000.0
+        self.coalescer.max_batch = app.config.get('PRICE_COALESCE_MAX_BATCH', self.coalescer.max_batch)
+        # Share snapshots across workers and nodes when Redis is configured
+        self.shared_store = RedisSnapshotStore.from_url(app.config.get('REDIS_URL'))
+        if self.shared_store:
+            self.shared_store.subscribe(self.cache.expire)
+            logger.info("PriceService sharing snapshots through Redis")
+        # Share snapshots between workers on this host through a memory-mapped table
+        self.shared_table = SharedPriceTable.open(app.config.get('SHARED_PRICE_TABLE'), self.supported_coins)
+        self.history_cache = HistoryCache.open(
+            app.config.get('HISTORY_CACHE_PATH'),
+            max_entries=app.config.get('HISTORY_CACHE_MAX_ENTRIES', 500),
+            ttls=app.config.get('HISTORY_CACHE_TTLS')
+        )
         logger.info("PriceService initialized successfully")
 
-    @property
-    def api_key(self):
-        """Get API key from current application config"""
-        if self._api_key:
-            return self._api_key
-        if self.app:
-            return self.app.config.get('COINGECKO_API_KEY')
-        return current_app.config.get('COINGECKO_API_KEY')
-
-    def _get_headers(self) -> Dict:
-        """Get headers for API requests"""
-        headers = {
-            'Accept': 'application/json',
-        }
-        if self.api_key:
-            headers['x-cg-demo-api-key'] = self.api_key
-        return headers
-
-    def _rate_limit(self):
-        """Implement rate limiting"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        if time_since_last_request < self.rate_limit_delay:
-            time.sleep(self.rate_limit_delay - time_since_last_request)
-        self.last_request_time = time.time()
-
-    def get_all_prices(self) -> Dict:
+    def _load_registry(self, config) -> CoinRegistry:
+        """Load the coin universe from COIN_REGISTRY_FILE or the provider's coin list, else the defaults"""
+        default = CoinRegistry.default()
+        try:
+            if config.get('COIN_REGISTRY_FILE'):
+                registry = CoinRegistry.from_file(config['COIN_REGISTRY_FILE'])
+            elif config.get('COIN_REGISTRY_FROM_API'):
+                registry = CoinRegistry.from_coins_list(self.provider.list_coins(), priority=default)
+            else:
+                return default
+        except Exception as e:
+            logger.error(f"Error loading coin registry, using defaults: {str(e)}")
+            return default
+        logger.info(f"Loaded {len(registry)} coins into the registry")
+        return registry
+
+    def get_snapshot(self, max_age: Optional[float] = None, fail_fast: bool = True,
+                     max_staleness: Optional[float] = None) -> PriceSnapshot:
+        """
+        Get the cached price snapshot, refreshing it once it is older than max_age.
+
+        With fail_fast, a refresh that finds the request budget exhausted serves
+        the previous snapshot instead of waiting for a token. Upstream failures,
+        including an open circuit breaker, also fall back to the previous snapshot.
+
+        With max_staleness, an expired snapshot no older than max_staleness is
+        returned at once while a background thread refreshes it
+        (stale-while-revalidate), and older snapshots are never served.
+        """
+        cached = self.cache.snapshot
+        if max_staleness is not None and cached is not None and not self.cache.is_fresh(cached, max_age):
+            if cached.age() <= max_staleness:
+                self.cache.stats['stale_served'] += 1
+                self.refresh_in_background()
+                return cached
+
+        fail_fast = fail_fast and cached is not None
+        try:
+            return self.cache.get(lambda: self._load_prices(fail_fast=fail_fast), max_age=max_age)
+        except UPSTREAM_ERRORS as e:
+            if cached is None or (max_staleness is not None and cached.age() > max_staleness):
+                raise
+            logger.warning(f"Serving cached prices after upstream failure: {str(e)}")
+            return cached
+
+    def refresh_in_background(self):
+        """Start refreshing the snapshot on a daemon thread unless a refresh is already running"""
+        if not self._background_refresh.acquire(blocking=False):
+            return
+
+        def refresh():
+            try:
+                self.cache.get(self._load_prices)
+            except Exception as e:
+                logger.error(f"Background price refresh failed: {str(e)}")
+            finally:
+                self._background_refresh.release()
+
+        threading.Thread(target=refresh, name='price-refresh', daemon=True).start()
+
+    def get_all_prices(self, max_age: Optional[float] = None, max_staleness: Optional[float] = None) -> Dict:
         """Get prices for all supported cryptocurrencies"""
+        return self.get_snapshot(max_age=max_age, max_staleness=max_staleness).to_dict()
+
+    def _load_prices(self, fail_fast: bool = False) -> Tuple[Dict, float]:
+        """
+        Load (prices, fetched_at) for the snapshot cache.
+
+        The host-wide shared table is read first. When it is missing or older than
+        the TTL the prices come from Redis or CoinGecko and are written back to it.
+        """
+        table = self.shared_table
+        if table is not None:
+            local = table.read_snapshot()
+            if local and time.time() - local[1] < self.cache.ttl:
+                return local
+
+        prices, fetched_at = self._load_shared_prices(fail_fast=fail_fast)
+        if table is not None:
+            table.write(prices, fetched_at)
+        return prices, fetched_at
+
+    def _load_shared_prices(self, fail_fast: bool = False) -> Tuple[Dict, float]:
+        """
+        Load (prices, fetched_at) through the Redis store when one is configured.
+
+        A snapshot younger than the TTL is taken from Redis and only the worker
+        holding the refresh lock calls CoinGecko; the others keep serving the
+        shared snapshot until its replacement is published.
+        """
+        store = self.shared_store
+        if store is None:
+            return self._fetch_all_prices(fail_fast=fail_fast)
+
+        shared = store.read()
+        if shared and time.time() - shared[1] < self.cache.ttl:
+            return shared
+        if not store.acquire_refresh_lock():
+            if shared:
+                return shared
+            # Nothing shared yet; fetch ourselves rather than wait for the refresher
+            return self._fetch_all_prices(fail_fast=fail_fast)
+
+        try:
+            prices, fetched_at = self._fetch_all_prices(fail_fast=fail_fast)
+            store.write(prices, fetched_at)
+            return prices, fetched_at
+        finally:
+            store.release_refresh_lock()
+
+    def _fetch_all_prices(self, fail_fast: bool = False) -> Tuple[Dict, float]:
+        """
+        Fetch (prices, fetched_at) for all supported cryptocurrencies from the price provider.
+
+        Each quote carries its own as_of: fetched_at for quotes fetched now, and
+        the original fetch time for quotes kept from the cached snapshot when
+        the request budget skipped their chunk.
+        """
         try:
-            # Get comma-separated list of coin IDs
-            coin_ids = ','.join(self.supported_coins.values())
-            
-            # Rate limiting
-            self._rate_limit()
-            
-            # Make API request
-            response = requests.get(
-                f"{self.base_url}/simple/price",
-                headers=self._get_headers(),
-                params={
-                    'ids': coin_ids,
-                    'vs_currencies': 'usd',
-                    'include_24hr_change': 'true',
-                    'include_market_cap': 'true',
-                    'include_24hr_vol': 'true'
-                }
-            )
-            
-            response.raise_for_status()
-            data = response.json()
-            
+            # Keep every request URL a safe length; chunks are fetched concurrently,
+            # each taking its own token from the rate limiter
+            chunks = chunk_ids(list(self.supported_coins.values()), self.max_ids_length)
+            previous = None
+            if len(chunks) == 1:
+                data = self.provider.get_prices(chunks[0], fail_fast=fail_fast)
+            else:
+                data, previous = self._fetch_chunks(chunks, fail_fast)
+
             # Convert response to our format
+            fetched_at = time.time()
             result = {}
             for symbol, coin_id in self.supported_coins.items():
                 if coin_id in data:
-                    result[symbol] = {
-                        'price': data[coin_id]['usd'],
-                        'change_24h': data[coin_id].get('usd_24h_change', 0.0),
-                        'market_cap': data[coin_id].get('usd_market_cap'),
-                        'volume_24h': data[coin_id].get('usd_24h_vol')
-                    }
-            
-            return result
-            
+                    result[symbol] = dict(data[coin_id], as_of=fetched_at)
+                elif previous is not None and symbol in previous:
+                    quote = previous.prices[symbol]
+                    result[symbol] = dict(quote, as_of=quote.get('as_of', previous.fetched_at))
+
+            return result, fetched_at
+
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching prices from CoinGecko: {str(e)}")
+            logger.error(f"Error fetching prices from {self.provider.name}: {str(e)}")
             raise
         except Exception as e:
             logger.error(f"Error getting all prices: {str(e)}")
             raise
 
-    def get_price(self, symbol: str) -> Tuple[float, float]:
+    def _fetch_chunks(self, chunks: List[List[str]], fail_fast: bool) -> Tuple[Dict, Optional[PriceSnapshot]]:
+        """
+        Fetch chunks concurrently, returning (quotes by coin id, snapshot to fill gaps from).
+
+        When the request budget runs out part way (more chunks than the burst
+        allows with fail_fast), the chunks that got a token are kept and the
+        rest keep their quotes from the cached snapshot; the next refresh
+        starts at the first chunk left out, so every chunk gets its turn.
+        Only a refresh where no chunk got a token raises RateLimitExceeded.
+        """
+        offset = self._chunk_offset % len(chunks)
+        chunks = chunks[offset:] + chunks[:offset]
+        data = {}
+        skipped = []
+        with ThreadPoolExecutor(max_workers=min(self.fetch_concurrency, len(chunks))) as pool:
+            futures = [pool.submit(self.provider.get_prices, chunk, fail_fast=fail_fast) for chunk in chunks]
+            for index, future in enumerate(futures):
+                try:
+                    data.update(future.result())
+                except RateLimitExceeded as e:
+                    skipped.append(index)
+                    error = e
+        if not skipped:
+            self._chunk_offset = 0
+            return data, None
+        if not data:
+            raise error
+        self._chunk_offset = offset + skipped[0]
+        logger.warning(f"Request budget covered {len(chunks) - len(skipped)} of {len(chunks)} price chunks;"
+                       f" keeping cached quotes for the rest")
+        return data, self.cache.snapshot
+
+    def get_prices(self, symbols: List[str], max_age: Optional[float] = None,
+                   max_staleness: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Get quotes for several cryptocurrencies from one bulk snapshot.
+
+        Symbols missing from the snapshot are quoted through the coalescer, so
+        concurrent requests for them share one upstream call; any still missing
+        are left out of the result. Unsupported symbols raise ValueError before
+        any upstream work is done.
+        """
+        resolved = [self.resolver.resolve(symbol) for symbol in symbols]
+        unsupported = [symbol for symbol, match in zip(symbols, resolved) if match is None]
+        if unsupported:
+            raise ValueError(f"Unsupported cryptocurrency: {', '.join(unsupported)}")
+        symbols = resolved
+
+        snapshot = self.get_snapshot(max_age=max_age, max_staleness=max_staleness)
+        quotes = {symbol: dict(snapshot.prices[symbol]) for symbol in symbols if symbol in snapshot}
+        missing = [symbol for symbol in symbols if symbol not in quotes]
+        if missing:
+            quotes.update(self._quote_missing(missing))
+        return quotes
+
+    def _quote_missing(self, symbols: List[str]) -> Dict[str, Dict]:
+        """Quote symbols absent from the snapshot through the batching coalescer"""
+        try:
+            data = self.coalescer.get_many([self.supported_coins[symbol] for symbol in symbols], timeout=10)
+        except Exception as e:
+            # Missing quotes are omitted, as they always were
+            logger.warning(f"Could not quote {', '.join(symbols)}: {str(e)}")
+            return {}
+        return {symbol: dict(data[self.supported_coins[symbol]]) for symbol in symbols
+                if self.supported_coins[symbol] in data}
+
+    def _fetch_batch(self, coin_ids: List[str]) -> Dict[str, Dict]:
+        """One upstream call for a coalesced batch, failing fast when the request budget is spent"""
+        return self.provider.get_prices(coin_ids, fail_fast=True)
+
+    def get_price(self, symbol: str, max_age: Optional[float] = None,
+                  max_staleness: Optional[float] = None) -> Tuple[float, float]:
         """Get current price and 24h change for a cryptocurrency"""
         try:
-            # Get coin ID
-            coin_id = self.supported_coins.get(symbol.upper())
-            if not coin_id:
-                raise ValueError(f"Unsupported cryptocurrency: {symbol}")
-
-            # Rate limiting
-            self._rate_limit()
-            
-            # Make API request
-            response = requests.get(
-                f"{self.base_url}/simple/price",
-                headers=self._get_headers(),
-                params={
-                    'ids': coin_id,
-                    'vs_currencies': 'usd',
-                    'include_24hr_change': 'true'
-                }
-            )
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            if coin_id not in data:
+            symbol = self.resolve_symbol(symbol)
+            quote = self.get_prices([symbol], max_age=max_age, max_staleness=max_staleness).get(symbol)
+            if not quote:
                 raise ValueError(f"No price data available for {symbol}")
-            
-            price = data[coin_id]['usd']
-            change_24h = data[coin_id].get('usd_24h_change', 0.0)
-            
-            return price, change_24h
-            
+
+            return quote['price'], quote['change_24h']
+
         except Exception as e:
             logger.error(f"Error getting price for {symbol}: {str(e)}")
             raise
 
+    def get_stats(self) -> Dict:
+        """Cache and rate limiter counters for this worker"""
+        snapshot = self.cache.snapshot
+        return {
+            'cache': dict(self.cache.stats, ttl=self.cache.ttl,
+                          version=snapshot.version if snapshot else None,
+                          age=snapshot.age() if snapshot else None),
+            'provider': dict(self.provider.get_stats(), name=self.provider.name),
+            'rate_limiter': self.coingecko.rate_limiter.get_stats(),
+            'upstream': get_client_stats(),
+            'coins': len(self.registry),
+            'coalescer': self.coalescer.get_stats(),
+            'shared_store': self.shared_store.get_stats() if self.shared_store else None,
+            'shared_table': self.shared_table.get_stats() if self.shared_table else None,
+            'history_cache': self.history_cache.get_stats() if self.history_cache else None
+        }
+
+    def resolve_symbol(self, text: str) -> str:
+        """Canonical symbol for a ticker, id, name or alias; raises ValueError for unknown coins"""
+        symbol = self.resolver.resolve(text)
+        if symbol is None:
+            raise ValueError(f"Unsupported cryptocurrency: {text}")
+        return symbol
+
+    def search_coins(self, query: str, limit: int = 10) -> List[Dict]:
+        """Supported coins matching query by prefix or fuzzy match"""
+        return [{'symbol': coin.symbol, 'id': coin.coin_id, 'name': coin.name}
+                for coin in self.resolver.search(query, limit)]
+
     def get_supported_symbols(self) -> List[str]:
         """Get list of supported cryptocurrency symbols"""
         return list(self.supported_coins.keys())
     
-    def get_historical_prices(self, symbol: str, days: int = 7) -> List[Dict]:
-        """Get historical price data for a cryptocurrency"""
+    def get_history(self, symbol: str, days: int, interval: Optional[str] = None,
+                    background: bool = False) -> List[Tuple[float, float]]:
+        """
+        (timestamp ms, price) points for a cryptocurrency from the price provider.
+
+        Responses are served from the persistent history cache while fresh, so
+        workers on a host backfilling the same range share one upstream call.
+        When the provider fails, a cached response up to the 'chart' staleness
+        bound is served instead. background requests only spend rate budget
+        the quote refreshes leave spare.
+        """
+        symbol = self.resolve_symbol(symbol)
+        coin_id = self.supported_coins[symbol]
+
+        cache = self.history_cache
+        cached = cache.get(coin_id, days, interval) if cache else None
+        if cached and cache.is_fresh(cached[1], interval):
+            return cached[0]
+
         try:
-            # Get coin ID
-            coin_id = self.supported_coins.get(symbol.upper())
-            if not coin_id:
-                raise ValueError(f"Unsupported cryptocurrency: {symbol}")
-    
-            # Rate limiting
-            self._rate_limit()
-            
-            # Make API request
-            response = requests.get(
-                f"{self.base_url}/coins/{coin_id}/market_chart",
-                headers=self._get_headers(),
-                params={
-                    'vs_currency': 'usd',
-                    'days': str(days),
-                    'interval': 'daily'
-                }
-            )
-            
-            # Check if request was successful
-            if response.status_code != 200:
-                logger.error(f"CoinGecko API error: {response.status_code} - {response.text}")
-                raise Exception(f"Failed to fetch price history from CoinGecko (Status: {response.status_code})")
-                
-            data = response.json()
-            
-            if 'prices' not in data:
-                logger.error(f"Unexpected response format: {data}")
-                raise Exception("Invalid response format from CoinGecko")
-    
-            # Format the data for the frontend
-            prices = []
-            for timestamp, price in data['prices']:
-                prices.append({
-                    'timestamp': datetime.fromtimestamp(timestamp/1000).isoformat(),
-                    'price': float(price)  # Ensure price is a float
-                })
-            
-            return prices
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error getting historical prices for {symbol}: {str(e)}")
-            raise Exception(f"Failed to connect to CoinGecko API: {str(e)}")
+            points = self.provider.get_history(coin_id, days, interval, background=background)
         except Exception as e:
+            if cached and time.time() - cached[1] <= self.max_staleness['chart']:
+                cache.stats['stale'] += 1
+                logger.warning(f"Serving cached price history for {symbol}: {str(e)}")
+                return cached[0]
             logger.error(f"Error getting historical prices for {symbol}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+        if cache:
+            cache.put(coin_id, days, interval, points)
+        return points
\ No newline at end of file
@@ -1,58 +1,232 @@
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
+from sqlalchemy import String, and_, column, func, select, true, values
 from app import db
 from app.models.price_history import PriceHistory
+from .candles import upsert_candles
+from .history_store import insert_ticks
+from .partitions import PartitionManager
+from .tick_archive import TickArchive
+from .tick_buffer import TickBuffers
 
 logger = logging.getLogger(__name__)
 
 class PriceUpdater:
-    def __init__(self, price_service):
+    def __init__(self, price_service, partitions=None, buffers=None, archive=None):
         self.price_service = price_service
-        self.supported_symbols = self.price_service.supported_coins.keys()
+        self.partitions = partitions or PartitionManager(PriceHistory.__tablename__)
+        # Recent ticks kept in memory for window queries
+        self.buffers = buffers or TickBuffers()
+        # Compressed per-day blocks that aged ticks move into instead of being lost
+        self.archive = archive or TickArchive()
         self.last_update = {}
         self.history_retention_days = 30  # Keep 30 days of price history
+        self.ingest_stats = {'runs': 0, 'rows': 0, 'skipped': 0, 'repeated_snapshots': 0, 'carried_over': 0,
+                             'seconds': 0.0, 'last_rows_per_sec': None}
+        self._last_snapshot_at = None  # Quote time of the newest snapshot stored
+        # Quotes within dedup_epsilon (relative) of the last stored price are skipped,
+        # but every symbol gets a row at least every heartbeat_seconds
+        self.dedup_epsilon = 0.0
+        self.heartbeat_seconds = 3600
+        self._last_stored = {}  # symbol -> (timestamp, price) of the last row written
+        # Latest stored row per symbol, valid until the next snapshot is stored
+        self._latest = None
+        self._latest_generation = 0
+        self._latest_lock = threading.Lock()
+        # Track quote times from every snapshot the price service publishes
+        self.price_service.cache.add_listener(self._record_snapshot)
+
+    def init_app(self, app):
+        """Read ingest settings from the Flask config"""
+        self.dedup_epsilon = app.config.get('PRICE_DEDUP_EPSILON', self.dedup_epsilon)
+        self.heartbeat_seconds = app.config.get('PRICE_HEARTBEAT_SECONDS', self.heartbeat_seconds)
+
+    @property
+    def supported_symbols(self):
+        """Symbols in the price service's current coin registry"""
+        return self.price_service.supported_coins.keys()
+
+    def _record_snapshot(self, snapshot):
+        """Record when each symbol in a new snapshot was quoted, which for carried-over quotes is earlier"""
+        for symbol, quote in snapshot.prices.items():
+            self.last_update[symbol] = datetime.utcfromtimestamp(quote.get('as_of', snapshot.fetched_at))
 
     def update_prices(self):
         """Update prices for all supported cryptocurrencies"""
         try:
             logger.info("Starting price update...")
-            prices = self.price_service.get_all_prices()
-            
-            for symbol, data in prices.items():
-                try:
-                    # Store in price history
-                    price_history = PriceHistory(
-                        crypto_symbol=symbol,
-                        price=data['price'],
-                        timestamp=datetime.utcnow()
-                    )
-                    db.session.add(price_history)
-                    
-                    # Update last update time
-                    self.last_update[symbol] = datetime.utcnow()
-                    
-                except Exception as e:
-                    logger.error(f"Error updating price for {symbol}: {str(e)}")
-                    continue
-            
-            db.session.commit()
+            snapshot = self.price_service.get_snapshot()
+            timestamp = datetime.utcfromtimestamp(snapshot.fetched_at)
+            if self._last_snapshot_at is not None and timestamp <= self._last_snapshot_at:
+                # A cached or stale snapshot served again: its quotes are already stored
+                self.ingest_stats['repeated_snapshots'] += 1
+                logger.info(f"Snapshot from {timestamp.isoformat()} already stored, skipping")
+                return
+            self.store_snapshot(snapshot.prices, timestamp)
             logger.info("Price update completed successfully")
             
         except Exception as e:
             logger.error(f"Error during price update: {str(e)}")
             db.session.rollback()
 
+    def store_snapshot(self, prices, timestamp):
+        """
+        Write one PriceHistory row per changed quote in a single bulk INSERT.
+
+        Quotes whose price hasn't moved beyond dedup_epsilon since the
+        symbol's last stored row are skipped unless heartbeat_seconds have
+        passed, so flat series such as stablecoins write a row per heartbeat
+        instead of per update. The rows go out as one executemany, which
+        SQLAlchemy sends as multi-row INSERT ... VALUES batches on
+        PostgreSQL. Returns the number of rows written.
+
+        Ticks already stored for the same symbol and time are skipped by
+        insert_ticks. The 1m/5m/1h/1d candles are upserted from every quote,
+        skipped or not, in the same transaction, and committed quotes are
+        appended to the in-memory tick buffers.
+
+        Quotes carried over from an earlier snapshot (as_of before timestamp)
+        were ingested with it and are left out entirely.
+        """
+        quotes = {symbol: quote for symbol, quote in prices.items() if quote.get('price') is not None}
+        # Quotes kept from an earlier snapshot were stored with it; they are not new ticks
+        fresh = {symbol: quote for symbol, quote in quotes.items()
+                 if quote.get('as_of') is None or datetime.utcfromtimestamp(quote['as_of']) >= timestamp}
+        self.ingest_stats['carried_over'] += len(quotes) - len(fresh)
+        quotes = fresh
+        if not quotes:
+            return 0
+        rows = [
+            {
+                'crypto_symbol': symbol,
+                'price_usd': quote['price'],
+                'volume_24h': quote.get('volume_24h'),
+                'market_cap': quote.get('market_cap'),
+                'timestamp': timestamp
+            }
+            for symbol, quote in quotes.items() if self._changed(symbol, quote['price'], timestamp)
+        ]
+
+        start = time.perf_counter()
+        if rows:
+            self.partitions.ensure_partitions(timestamp, timestamp)
+            insert_ticks(rows)
+        upsert_candles(
+            (symbol, timestamp, quote['price'], quote.get('volume_24h')) for symbol, quote in quotes.items()
+        )
+        db.session.commit()
+        for row in rows:
+            self._last_stored[row['crypto_symbol']] = (timestamp, row['price_usd'])
+        if self._last_snapshot_at is None or timestamp > self._last_snapshot_at:
+            self._last_snapshot_at = timestamp
+        if rows:
+            self._invalidate_latest()
+        self.buffers.append_snapshot(quotes, timestamp)
+        elapsed = time.perf_counter() - start
+
+        rows_per_sec = len(rows) / elapsed if elapsed > 0 else None
+        self.ingest_stats['runs'] += 1
+        self.ingest_stats['rows'] += len(rows)
+        self.ingest_stats['skipped'] += len(quotes) - len(rows)
+        self.ingest_stats['seconds'] += elapsed
+        self.ingest_stats['last_rows_per_sec'] = rows_per_sec
+        logger.info(f"Stored {len(rows)} price rows ({len(quotes) - len(rows)} unchanged skipped)"
+                    f" in {elapsed * 1000:.1f}ms ({rows_per_sec or 0:.0f} rows/sec)")
+        return len(rows)
+
+    def _changed(self, symbol, price, timestamp):
+        """Whether a quote needs its own row: a move beyond dedup_epsilon, or the heartbeat is due"""
+        last = self._last_stored.get(symbol)
+        if last is None or timestamp < last[0]:
+            return True
+        last_timestamp, last_price = last
+        if (timestamp - last_timestamp).total_seconds() >= self.heartbeat_seconds:
+            return True
+        return abs(price - last_price) > self.dedup_epsilon * abs(last_price)
+
+    def get_ingest_stats(self):
+        """Rows written and throughput of the price history ingest"""
+        stats = dict(self.ingest_stats)
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else None
+        return stats
+
+    def _invalidate_latest(self):
+        with self._latest_lock:
+            self._latest = None
+            self._latest_generation += 1
+
+    def get_latest_prices(self):
+        """
+        Latest stored price per supported symbol, memoized until the next stored snapshot.
+
+        On PostgreSQL each symbol is a LATERAL ... ORDER BY timestamp DESC
+        LIMIT 1 probe of idx_crypto_timestamp, so the cost grows with the
+        number of symbols, not the table. Other backends join each symbol's
+        MAX(timestamp), which the same index answers.
+        """
+        with self._latest_lock:
+            if self._latest is not None:
+                return self._latest
+            generation = self._latest_generation
+
+        symbols = list(self.supported_symbols)
+        if not symbols:
+            return {}
+        columns = (PriceHistory.crypto_symbol, PriceHistory.price_usd, PriceHistory.volume_24h,
+                   PriceHistory.market_cap, PriceHistory.timestamp)
+        if db.session.get_bind(mapper=PriceHistory).dialect.name == 'postgresql':
+            wanted = values(column('symbol', String), name='wanted').data([(symbol,) for symbol in symbols])
+            latest = select(*columns).where(
+                PriceHistory.crypto_symbol == wanted.c.symbol
+            ).order_by(PriceHistory.timestamp.desc()).limit(1).lateral('latest')
+            query = select(latest).select_from(wanted.join(latest, true()))
+        else:
+            newest = select(
+                PriceHistory.crypto_symbol, func.max(PriceHistory.timestamp).label('timestamp')
+            ).where(PriceHistory.crypto_symbol.in_(symbols)).group_by(PriceHistory.crypto_symbol).subquery()
+            query = select(*columns).join(newest, and_(
+                PriceHistory.crypto_symbol == newest.c.crypto_symbol,
+                PriceHistory.timestamp == newest.c.timestamp
+            ))
+
+        prices = {
+            symbol: {
+                'price': price,
+                'volume_24h': volume_24h,
+                'market_cap': market_cap,
+                'timestamp': timestamp.isoformat()
+            }
+            for symbol, price, volume_24h, market_cap, timestamp in db.session.execute(query)
+        }
+        with self._latest_lock:
+            # A snapshot stored while querying makes this result stale; don't keep it
+            if self._latest_generation == generation:
+                self._latest = prices
+        return prices
+
     def cleanup_old_prices(self):
-        """Clean up price history older than retention period"""
+        """
+        Clean up price history older than retention period.
+
+        Aged ticks are first compressed into the price archive, which history
+        queries still read. Partitioned tables then drop whole day partitions
+        and get the coming days' partitions created; otherwise old rows are
+        deleted in small batches. Nothing is removed if archiving fails.
+        """
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=self.history_retention_days)
+            archived = self.archive.archive_before(cutoff_date)
+            logger.info(f"Archived {archived} price history rows older than {self.history_retention_days} days")
             
-            PriceHistory.query.filter(
-                PriceHistory.timestamp < cutoff_date
-            ).delete()
-            
-            db.session.commit()
-            logger.info(f"Cleaned up price history older than {self.history_retention_days} days")
+            if self.partitions.is_partitioned():
+                self.partitions.ensure_future()
+                dropped = self.partitions.drop_before(cutoff_date)
+                logger.info(f"Dropped {dropped} price history partitions older than {self.history_retention_days} days")
+            else:
+                deleted = self.partitions.delete_before(cutoff_date)
+                logger.info(f"Cleaned up {deleted} price history rows older than {self.history_retention_days} days")
             
         except Exception as e:
             logger.error(f"Error cleaning up price history: {str(e)}")
@@ -60,4 +234,15 @@ class PriceUpdater:
 
     def get_last_update_time(self, symbol):
         """Get last update time for a symbol"""
-        return self.last_update.get(symbol)
\ No newline at end of file
+        return self.last_update.get(symbol)
+
+    def get_freshness(self, symbol):
+        """Get as_of/stale metadata for the latest quote of a symbol"""
+        as_of = self.last_update.get(symbol)
+        if as_of is None:
+            return {'as_of': None, 'stale': True}
+        age = (datetime.utcnow() - as_of).total_seconds()
+        return {
+            'as_of': as_of.isoformat(),
+            'stale': age >= self.price_service.cache.ttl
+        }
\ No newline at end of file
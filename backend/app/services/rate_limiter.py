@@ -0,0 +1,119 @@
+# app/services/rate_limiter.py
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process budget
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class RateLimitExceeded(Exception):
+    """Raised when no token could be taken from the bucket in time"""
+    pass
+
+class TokenBucket:
+    """
+    Token bucket whose state lives in a small file shared by every process on the host.
+
+    The file holds the current token count and the time of the last refill. Each
+    take locks the file with flock, refills according to the elapsed time and
+    writes the new state back, so all gunicorn workers draw from one budget.
+    Nothing here sleeps while holding the lock; callers either fail fast with
+    try_acquire() or wait up to a deadline with acquire(). Low-priority callers
+    pass a reserve: they only take a token while that many more are left, so
+    background work spends spare budget without starving everyone else.
+    """
+    _STATE = struct.Struct('dd')  # tokens, last refill (epoch seconds)
+
+    def __init__(self, rate: float, capacity: float = 1, state_file: Optional[str] = None):
+        self.rate = float(rate)  # tokens added per second
+        self.capacity = float(capacity)
+        self.state_file = state_file or os.path.join(tempfile.gettempdir(), 'cryptomock-ratelimit.bucket')
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        # Used instead of the file when flock is not available
+        self._local_state = (self.capacity, time.time())
+        self.stats = {'acquired': 0, 'rejected': 0, 'waits': 0, 'wait_time': 0.0, 'max_wait': 0.0}
+
+    def _get_fd(self) -> int:
+        # File descriptors are not shared with forked workers; each process opens its own
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def _refill(self, tokens: float, updated_at: float, now: float) -> float:
+        return min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+
+    def _take(self, reserve: float = 0.0) -> float:
+        """Take one token if available beyond reserve; return 0 on success or the seconds until one is"""
+        with self._lock:
+            now = time.time()
+            if fcntl is None:
+                tokens = self._refill(*self._local_state, now)
+                wait = self._consume(tokens, reserve)
+                self._local_state = (tokens - 1 if wait == 0 else tokens, now)
+                return wait
+
+            fd = self._get_fd()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(fd, self._STATE.size, 0)
+                if len(raw) == self._STATE.size:
+                    tokens = self._refill(*self._STATE.unpack(raw), now)
+                else:
+                    tokens = self.capacity
+                wait = self._consume(tokens, reserve)
+                os.pwrite(fd, self._STATE.pack(tokens - 1 if wait == 0 else tokens, now), 0)
+                return wait
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _consume(self, tokens: float, reserve: float = 0.0) -> float:
+        # A reserve the bucket can never refill past would block forever
+        needed = 1 + min(reserve, self.capacity - 1)
+        if tokens >= needed:
+            return 0.0
+        return (needed - tokens) / self.rate
+
+    def try_acquire(self, reserve: float = 0.0) -> bool:
+        """Take a token without waiting"""
+        if self._take(reserve) == 0:
+            self.stats['acquired'] += 1
+            return True
+        self.stats['rejected'] += 1
+        return False
+
+    def acquire(self, timeout: Optional[float] = None, reserve: float = 0.0) -> bool:
+        """Take a token, waiting at most timeout seconds (forever if None)"""
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        slept = False
+        while True:
+            wait = self._take(reserve)
+            now = time.monotonic()
+            if wait == 0:
+                self.stats['acquired'] += 1
+                if slept:
+                    waited = now - start
+                    self.stats['waits'] += 1
+                    self.stats['wait_time'] += waited
+                    self.stats['max_wait'] = max(self.stats['max_wait'], waited)
+                return True
+            if deadline is not None and now + wait > deadline:
+                self.stats['rejected'] += 1
+                return False
+            time.sleep(wait)
+            slept = True
+
+    def get_stats(self) -> Dict:
+        """Counters for this process"""
+        return dict(self.stats, rate=self.rate, capacity=self.capacity)
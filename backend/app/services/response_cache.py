@@ -0,0 +1,58 @@
+# app/services/response_cache.py
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple
+
+class SerializedResponse(NamedTuple):
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+def serialize(data: Any) -> SerializedResponse:
+    """Encode data as compact JSON once, with its gzip form and a content-hash ETag"""
+    body = json.dumps(data, separators=(',', ':'), sort_keys=True).encode()
+    # mtime=0 keeps the gzip bytes identical across workers for the same body
+    return SerializedResponse(body, gzip.compress(body, compresslevel=6, mtime=0),
+                              hashlib.sha1(body).hexdigest()[:20])
+
+class ResponseCache:
+    """
+    Serialized JSON response bodies keyed by the data version they were built from.
+
+    Callers pass a key that changes whenever the underlying data does (for
+    example a snapshot version) and a function building the payload; the
+    payload is only built and encoded on the first request for that key. The
+    ETag is a hash of the body, so every worker hands out the same tag for the
+    same data. The least recently used keys are dropped beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, SerializedResponse]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> SerializedResponse:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry
+
+        # Built outside the lock; concurrent misses for one key just encode it twice
+        entry = serialize(build())
+        with self._lock:
+            self.stats['misses'] += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return entry
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries)
@@ -1,5 +1,6 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,7 +10,7 @@ class SchedulerService:
         self.scheduler = BackgroundScheduler()
         self.is_running = False
 
-    def init_app(self, app, price_updater):
+    def init_app(self, app, price_updater, backfill_job=None):
         """Initialize scheduler with Flask app"""
         self.app = app
         
@@ -31,6 +32,18 @@ class SchedulerService:
             replace_existing=True
         )
         
+        # Add history backfill job - at startup, then daily for newly added coins
+        if backfill_job is not None and app.config.get('BACKFILL_ENABLED', False):
+            self.scheduler.add_job(
+                func=backfill_job.run_in_app,
+                args=[app],
+                trigger=IntervalTrigger(days=1),
+                next_run_time=datetime.now(),
+                id='Backfill price history',
+                name='Backfill price history',
+                replace_existing=True
+            )
+        
         # Start scheduler
         if not self.is_running:
             self.scheduler.start()
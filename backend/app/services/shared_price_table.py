@@ -0,0 +1,165 @@
+# app/services/shared_price_table.py
+import logging
+import math
+import mmap
+import os
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Every row, including the header, is seven float64 cells; as_of is when the quote itself was fetched
+FIELDS = ('price', 'change_24h', 'market_cap', 'volume_24h', 'as_of', 'timestamp')
+ROW_CELLS = len(FIELDS) + 1  # + seqlock version
+VERSION = ROW_CELLS - 1
+TIMESTAMP = FIELDS.index('timestamp')
+MAGIC = 0x43524D50  # "CRMP"
+PUBLISHED = 3  # Header cell holding the fetch time of the latest write
+MAX_READ_RETRIES = 100
+
+class SharedPriceTable:
+    """
+    Fixed-layout price table in a memory-mapped file shared by every worker on a host.
+
+    Row 0 is a header (magic, row count, hash of the symbol list, fetch time of
+    the latest write); row i + 1 holds the quote for the i-th symbol in sorted
+    order as float64 cells. Missing values are stored as NaN. Each row carries a
+    seqlock version: writers make it odd, update the cells and make it even
+    again, and readers retry while it is odd or changed under them. Readers
+    never lock; writers serialize on flock.
+
+    The file name carries the layout hash, so workers with different coin
+    universes or row layouts map different files and a live mapping is never
+    resized or cleared under another worker.
+    """
+
+    def __init__(self, path: str, symbols: Iterable[str]):
+        self.symbols = sorted(symbols)
+        self.index = {symbol: row + 1 for row, symbol in enumerate(self.symbols)}
+        self.layout_hash = float(zlib.crc32(f"{','.join(FIELDS)}|{','.join(self.symbols)}".encode()))
+        self.path = f"{path}.{int(self.layout_hash):08x}"
+        self.size = (len(self.symbols) + 1) * ROW_CELLS * 8
+        self.stats = {'reads': 0, 'read_retries': 0, 'writes': 0}
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock()
+        try:
+            size = os.fstat(self._fd).st_size
+            if size == 0:
+                os.ftruncate(self._fd, self.size)
+            elif size != self.size:
+                raise OSError(f"{self.path} is {size} bytes, expected {self.size}")
+            self._mmap = mmap.mmap(self._fd, self.size)
+            self._cells = memoryview(self._mmap).cast('d')
+            if self._cells[0] == 0:
+                # New file, nobody reads it until the header is set
+                self._cells[1] = len(self.symbols)
+                self._cells[2] = self.layout_hash
+                self._cells[0] = MAGIC
+            elif not self._valid():
+                raise OSError(f"{self.path} has a different layout")
+        except OSError:
+            self._unlock()
+            os.close(self._fd)
+            raise
+        self._unlock()
+
+    @classmethod
+    def open(cls, path: Optional[str], symbols: Iterable[str]) -> Optional['SharedPriceTable']:
+        """Open the table at path, returning None when it is not configured or cannot be mapped"""
+        if not path:
+            return None
+        try:
+            return cls(path, symbols)
+        except OSError as e:
+            logger.warning(f"Shared price table unavailable, using in-process cache: {str(e)}")
+            return None
+
+    def _lock(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _valid(self) -> bool:
+        return list(self._cells[0:3]) == [MAGIC, len(self.symbols), self.layout_hash]
+
+    def read_row(self, symbol: str) -> Optional[Tuple[float, ...]]:
+        """Consistent (price, change_24h, market_cap, volume_24h, as_of, timestamp) for symbol, or None"""
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        base = row * ROW_CELLS
+        cells = self._cells
+        self.stats['reads'] += 1
+        for _ in range(MAX_READ_RETRIES):
+            before = cells[base + VERSION]
+            if before % 2 == 0:
+                values = tuple(cells[base:base + VERSION])
+                if cells[base + VERSION] == before:
+                    return values if before else None
+            self.stats['read_retries'] += 1
+        logger.warning(f"Gave up reading shared price row for {symbol}")
+        return None
+
+    def read_snapshot(self) -> Optional[Tuple[Dict, float]]:
+        """
+        Return (prices, fetched_at) of the latest write.
+
+        Rows the latest write didn't touch, e.g. a coin the upstream stopped
+        quoting, are left out rather than served with their old prices.
+        """
+        if not self._valid():
+            return None
+        published = self._cells[PUBLISHED]
+        if not published:
+            return None
+        prices = {}
+        for symbol in self.symbols:
+            values = self.read_row(symbol)
+            if values is None or values[TIMESTAMP] < published:
+                continue
+            quote = {field: (None if math.isnan(value) else value) for field, value in zip(FIELDS, values)}
+            quote.pop('timestamp')
+            prices[symbol] = quote
+        if not prices:
+            return None
+        return prices, published
+
+    def write(self, prices: Dict, fetched_at: float):
+        """Write every known symbol in prices with the given fetch time, which quotes without an as_of take"""
+        self._lock()
+        try:
+            cells = self._cells
+            for symbol, quote in prices.items():
+                row = self.index.get(symbol)
+                if row is None:
+                    continue
+                base = row * ROW_CELLS
+                version = cells[base + VERSION]
+                cells[base + VERSION] = version + 1
+                for offset, field in enumerate(FIELDS[:TIMESTAMP]):
+                    value = quote.get(field, fetched_at if field == 'as_of' else None)
+                    cells[base + offset] = math.nan if value is None else float(value)
+                cells[base + TIMESTAMP] = fetched_at
+                cells[base + VERSION] = version + 2
+            # Publish after the rows so readers never see the new time with old rows
+            cells[PUBLISHED] = fetched_at
+            self.stats['writes'] += 1
+        finally:
+            self._unlock()
+
+    def close(self):
+        self._cells.release()
+        self._mmap.close()
+        os.close(self._fd)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, path=self.path, rows=len(self.symbols))
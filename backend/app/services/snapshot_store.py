@@ -0,0 +1,136 @@
+# app/services/snapshot_store.py
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Optional: without redis every worker keeps its own snapshot
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Delete the refresh lock only while it still holds our token, in one round trip
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class RedisSnapshotStore:
+    """
+    Price snapshot shared through Redis by every worker on every node.
+
+    The worker that wins the refresh lock fetches from the upstream, writes the
+    snapshot under one key and publishes its fetch time on a channel. Every
+    subscriber then expires its in-process snapshot so its next read picks up
+    the shared one. Redis errors are logged and reported as a miss, so callers
+    degrade to fetching and caching in-process.
+    """
+
+    def __init__(self, client, prefix: str = 'cryptomock:prices', lock_timeout: int = 30):
+        self.client = client
+        self.key = f"{prefix}:snapshot"
+        self.lock_key = f"{prefix}:refresh-lock"
+        self.channel = f"{prefix}:invalidate"
+        self.lock_timeout = lock_timeout
+        self._token = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._listener = None
+        self._release_lock = client.register_script(RELEASE_LOCK_SCRIPT)
+        self.stats = {'reads': 0, 'hits': 0, 'writes': 0, 'invalidations': 0, 'errors': 0}
+
+    @classmethod
+    def from_url(cls, url: Optional[str], **kwargs) -> Optional['RedisSnapshotStore']:
+        """Connect to Redis, returning None when it is not configured or not reachable"""
+        if not url:
+            return None
+        if redis is None:
+            logger.warning("REDIS_URL is set but the redis package is not installed")
+            return None
+        try:
+            client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+            client.ping()
+        except Exception as e:
+            logger.warning(f"Redis unavailable, using in-process price cache: {str(e)}")
+            return None
+        return cls(client, **kwargs)
+
+    def read(self) -> Optional[Tuple[Dict, float]]:
+        """Return the shared (prices, fetched_at) or None"""
+        self.stats['reads'] += 1
+        try:
+            raw = self.client.get(self.key)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Error reading shared price snapshot: {str(e)}")
+            return None
+        if not raw:
+            return None
+        try:
+            data = json.loads(raw)
+            snapshot = data['prices'], float(data['fetched_at'])
+        except (ValueError, KeyError, TypeError) as e:
+            # A corrupt payload is a miss; the next refresh overwrites it
+            self.stats['errors'] += 1
+            logger.error(f"Ignoring malformed shared price snapshot: {str(e)}")
+            return None
+        self.stats['hits'] += 1
+        return snapshot
+
+    def write(self, prices: Dict, fetched_at: float):
+        """Store a snapshot and tell every subscriber to expire older ones"""
+        try:
+            self.client.set(self.key, json.dumps({'prices': prices, 'fetched_at': fetched_at}))
+            self.client.publish(self.channel, repr(fetched_at))
+            self.stats['writes'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Error writing shared price snapshot: {str(e)}")
+
+    def acquire_refresh_lock(self) -> bool:
+        """Try to become the single refresher; True if Redis cannot arbitrate"""
+        try:
+            return bool(self.client.set(self.lock_key, self._token, nx=True, ex=self.lock_timeout))
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Error taking price refresh lock: {str(e)}")
+            return True
+
+    def release_refresh_lock(self):
+        """Release the lock if this store still holds it; an expired lock taken over by another worker is left alone"""
+        try:
+            self._release_lock(keys=[self.lock_key], args=[self._token])
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Error releasing price refresh lock: {str(e)}")
+
+    def subscribe(self, on_invalidate: Callable[[float], None]):
+        """Call on_invalidate(fetched_at) from a background thread for every published snapshot"""
+        def handle(message):
+            self.stats['invalidations'] += 1
+            on_invalidate(float(message['data']))
+
+        def handle_error(error, pubsub, thread):
+            # Keep listening: the pubsub reconnects and resubscribes on the next poll. Invalidations
+            # may have been missed meanwhile, so expire the local snapshot to be safe
+            self.stats['errors'] += 1
+            logger.error(f"Error listening for price snapshot invalidations: {str(error)}")
+            on_invalidate(time.time())
+            time.sleep(1)
+
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: handle})
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=handle_error)
+
+    def close(self):
+        """Stop the subscriber thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
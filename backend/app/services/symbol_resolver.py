@@ -0,0 +1,82 @@
+# app/services/symbol_resolver.py
+import bisect
+import difflib
+from typing import Dict, List, Optional
+from .coin_registry import Coin, CoinRegistry
+
+# Extra spellings users type for the built-in coins, beyond tickers, ids and names
+DEFAULT_ALIASES = {
+    'XBT': 'BTC',
+    'ETHER': 'ETH',
+    'BINANCE': 'BNB'
+}
+
+# Minimum difflib similarity for a fuzzy search hit ('cardona' -> 'cardano' scores 0.71)
+FUZZY_CUTOFF = 0.7
+
+def normalize(text: str) -> str:
+    """Lowercase and drop everything but letters and digits, so 'usd-coin' == 'USD Coin'"""
+    return ''.join(ch for ch in text.lower() if ch.isalnum())
+
+class SymbolResolver:
+    """
+    Maps tickers, provider ids, names and aliases to canonical symbols.
+
+    Built once per coin registry. resolve() is a single dict lookup on the
+    normalized input. Tickers win over aliases, aliases over ids and ids over
+    names, so a coin whose name is another coin's ticker cannot shadow it.
+    search() does a prefix scan over the sorted keys and falls back to fuzzy
+    matching when there are too few prefix hits.
+    """
+
+    def __init__(self, registry: CoinRegistry, aliases: Optional[Dict[str, str]] = None):
+        self.registry = registry
+        self._index: Dict[str, str] = {}
+        for symbol in registry.by_symbol:
+            self._index.setdefault(normalize(symbol), symbol)
+        for alias, symbol in dict(DEFAULT_ALIASES, **(aliases or {})).items():
+            if symbol.upper() in registry:
+                self._index.setdefault(normalize(alias), symbol.upper())
+        for coin_id, coin in registry.by_id.items():
+            self._index.setdefault(normalize(coin_id), coin.symbol)
+        for name, coin in registry.by_name.items():
+            self._index.setdefault(normalize(name), coin.symbol)
+        self._index.pop('', None)
+        self._keys = sorted(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def resolve(self, text: str) -> Optional[str]:
+        """Canonical symbol for text, or None when it names no supported coin"""
+        if not text:
+            return None
+        return self._index.get(normalize(text))
+
+    def search(self, query: str, limit: int = 10) -> List[Coin]:
+        """Coins matching query: exact first, then by prefix, then fuzzy"""
+        key = normalize(query or '')
+        if not key or limit <= 0:
+            return []
+        symbols = []
+        exact = self._index.get(key)
+        if exact:
+            symbols.append(exact)
+
+        start = bisect.bisect_left(self._keys, key)
+        for candidate in self._keys[start:]:
+            if len(symbols) >= limit or not candidate.startswith(key):
+                break
+            symbol = self._index[candidate]
+            if symbol not in symbols:
+                symbols.append(symbol)
+
+        if len(symbols) < limit:
+            for candidate in difflib.get_close_matches(key, self._keys, n=limit * 2, cutoff=FUZZY_CUTOFF):
+                symbol = self._index[candidate]
+                if symbol not in symbols:
+                    symbols.append(symbol)
+                if len(symbols) >= limit:
+                    break
+
+        return [self.registry.by_symbol[symbol] for symbol in symbols[:limit]]
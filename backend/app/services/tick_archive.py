@@ -0,0 +1,279 @@
+# app/services/tick_archive.py
+import logging
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import func
+from app import db
+from app.models.price_archive import PriceArchive
+from app.models.price_history import PriceHistory
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Delta-of-delta ranges with their control bits, value width and offset; anything wider takes '1111' + 64 bits
+DOD_BUCKETS = [
+    (0b10, 2, 7, 63),
+    (0b110, 3, 9, 255),
+    (0b1110, 4, 12, 2047)
+]
+
+class BitWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+        self._bits = 0
+        self._count = 0
+
+    def write(self, value: int, width: int):
+        self._bits = (self._bits << width) | (value & ((1 << width) - 1))
+        self._count += width
+        while self._count >= 8:
+            self._count -= 8
+            self.buffer.append((self._bits >> self._count) & 0xFF)
+        self._bits &= (1 << self._count) - 1
+
+    def getvalue(self) -> bytes:
+        if self._count:
+            return bytes(self.buffer) + bytes([(self._bits << (8 - self._count)) & 0xFF])
+        return bytes(self.buffer)
+
+class BitReader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self._position = 0
+        self._bits = 0
+        self._count = 0
+
+    def read(self, width: int) -> int:
+        while self._count < width:
+            self._bits = (self._bits << 8) | self.data[self._position]
+            self._position += 1
+            self._count += 8
+        self._count -= width
+        value = self._bits >> self._count
+        self._bits &= (1 << self._count) - 1
+        return value
+
+def _write_dod(writer: BitWriter, dod: int):
+    if dod == 0:
+        writer.write(0, 1)
+        return
+    for control, control_width, width, offset in DOD_BUCKETS:
+        if -offset <= dod <= offset + 1:
+            writer.write(control, control_width)
+            writer.write(dod + offset, width)
+            return
+    writer.write(0b1111, 4)
+    writer.write(dod, 64)
+
+def _read_dod(reader: BitReader) -> int:
+    if reader.read(1) == 0:
+        return 0
+    # Each further 1 bit moves to the next wider bucket
+    for _, _, width, offset in DOD_BUCKETS:
+        if reader.read(1) == 0:
+            return reader.read(width) - offset
+    value = reader.read(64)
+    return value - (1 << 64) if value >> 63 else value
+
+class _XorEncoder:
+    """Gorilla float compression: XOR with the previous value, storing only the meaningful bits"""
+
+    def __init__(self, writer: BitWriter):
+        self.writer = writer
+        self.previous = 0
+        self.leading = None
+        self.trailing = None
+
+    def write(self, bits: int):
+        xor = bits ^ self.previous
+        self.previous = bits
+        if xor == 0:
+            self.writer.write(0, 1)
+            return
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if self.leading is not None and leading >= self.leading and trailing >= self.trailing:
+            # Fits the previous window: '10' + the bits inside it
+            self.writer.write(0b10, 2)
+            self.writer.write(xor >> self.trailing, 64 - self.leading - self.trailing)
+            return
+        length = 64 - leading - trailing
+        self.writer.write(0b11, 2)
+        self.writer.write(leading, 5)
+        self.writer.write(length - 1, 6)
+        self.writer.write(xor >> trailing, length)
+        self.leading, self.trailing = leading, trailing
+
+class _XorDecoder:
+    def __init__(self, reader: BitReader):
+        self.reader = reader
+        self.previous = 0
+        self.leading = None
+        self.trailing = None
+
+    def read(self) -> int:
+        if self.reader.read(1) == 0:
+            return self.previous
+        if self.reader.read(1) == 1:
+            self.leading = self.reader.read(5)
+            length = self.reader.read(6) + 1
+            self.trailing = 64 - self.leading - length
+        length = 64 - self.leading - self.trailing
+        self.previous ^= self.reader.read(length) << self.trailing
+        return self.previous
+
+def encode_block(timestamps_ms: List[int], prices: List[float], volumes: List[Optional[float]]) -> bytes:
+    """
+    Compress sorted ticks Gorilla style.
+
+    Timestamps (integer milliseconds) are stored as the first value, then
+    each delta-of-delta in a 1 to 68 bit variable-width code; regular
+    intervals cost one bit per tick. Prices and volumes are XORed with the
+    previous value's IEEE 754 bits and only the meaningful bits are kept.
+    Missing volumes are stored as NaN.
+    """
+    writer = BitWriter()
+    writer.write(len(timestamps_ms), 32)
+    if not timestamps_ms:
+        return writer.getvalue()
+    price_bits = np.asarray(prices, dtype=np.float64).view(np.uint64).tolist()
+    volume_bits = np.array([np.nan if v is None else v for v in volumes],
+                           dtype=np.float64).view(np.uint64).tolist()
+    price_encoder, volume_encoder = _XorEncoder(writer), _XorEncoder(writer)
+
+    writer.write(timestamps_ms[0], 64)
+    price_encoder.write(price_bits[0])
+    volume_encoder.write(volume_bits[0])
+    previous, delta = timestamps_ms[0], 0
+    for i in range(1, len(timestamps_ms)):
+        new_delta = timestamps_ms[i] - previous
+        _write_dod(writer, new_delta - delta)
+        previous, delta = timestamps_ms[i], new_delta
+        price_encoder.write(price_bits[i])
+        volume_encoder.write(volume_bits[i])
+    return writer.getvalue()
+
+def decode_block(data: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(timestamps ms, prices, volumes) arrays from an encoded block; missing volumes are NaN"""
+    reader = BitReader(data)
+    count = reader.read(32)
+    timestamps = np.empty(count, dtype=np.int64)
+    price_bits = np.empty(count, dtype=np.uint64)
+    volume_bits = np.empty(count, dtype=np.uint64)
+    if count:
+        price_decoder, volume_decoder = _XorDecoder(reader), _XorDecoder(reader)
+        timestamp, delta = reader.read(64), 0
+        for i in range(count):
+            if i:
+                delta += _read_dod(reader)
+                timestamp += delta
+            timestamps[i] = timestamp
+            price_bits[i] = price_decoder.read()
+            volume_bits[i] = volume_decoder.read()
+    return timestamps, price_bits.view(np.float64), volume_bits.view(np.float64)
+
+def _to_ms(timestamp: datetime) -> int:
+    return (timestamp - EPOCH) // timedelta(milliseconds=1)
+
+def _from_ms(timestamp_ms: int) -> datetime:
+    return EPOCH + timedelta(milliseconds=int(timestamp_ms))
+
+class TickArchive:
+    """
+    Cold storage for ticks past the price_history retention window.
+
+    Each symbol's ticks for one UTC day are compressed into a single
+    price_archive row (encode_block), around ten bytes per tick for
+    price and volume against well over a hundred for a price_history row
+    and its index entries. Blocks are read back directly by history
+    queries; nothing is rehydrated into price_history.
+    """
+
+    def __init__(self):
+        self.stats = {'blocks': 0, 'ticks': 0, 'encoded_ticks': 0, 'bytes': 0, 'reads': 0}
+
+    def archive_before(self, cutoff: datetime) -> int:
+        """Archive every price_history tick older than cutoff, one day per transaction; returns ticks archived"""
+        oldest = db.session.query(func.min(PriceHistory.timestamp)).filter(
+            PriceHistory.timestamp < cutoff
+        ).scalar()
+        if oldest is None:
+            return 0
+
+        archived = 0
+        day = oldest.date()
+        while day <= cutoff.date():
+            day_start = datetime.combine(day, datetime.min.time())
+            rows = db.session.query(
+                PriceHistory.crypto_symbol, PriceHistory.timestamp, PriceHistory.price_usd, PriceHistory.volume_24h
+            ).filter(
+                PriceHistory.timestamp >= day_start,
+                PriceHistory.timestamp < min(day_start + timedelta(days=1), cutoff)
+            ).order_by(PriceHistory.crypto_symbol, PriceHistory.timestamp).all()
+            for symbol, ticks in groupby(rows, key=lambda row: row[0]):
+                archived += self.store_block(symbol, day, [tuple(tick[1:]) for tick in ticks])
+            db.session.commit()
+            day += timedelta(days=1)
+        logger.info(f"Archived {archived} price ticks older than {cutoff.isoformat()}")
+        return archived
+
+    def store_block(self, symbol: str, day: date, ticks: List[Tuple[datetime, float, Optional[float]]]) -> int:
+        """Merge (timestamp, price, volume) ticks into the symbol's block for day without committing"""
+        merged: Dict[int, Tuple[float, Optional[float]]] = {}
+        block = db.session.get(PriceArchive, (symbol, day))
+        if block is not None:
+            for timestamp, price, volume in zip(*decode_block(block.data)):
+                merged[int(timestamp)] = (float(price), None if np.isnan(volume) else float(volume))
+        for timestamp, price, volume in ticks:
+            # Re-archiving the same tick, e.g. after an interrupted cleanup, keeps one copy
+            merged[_to_ms(timestamp)] = (price, volume)
+
+        timestamps = sorted(merged)
+        data = encode_block(timestamps, [merged[t][0] for t in timestamps], [merged[t][1] for t in timestamps])
+        if block is None:
+            block = PriceArchive(crypto_symbol=symbol, day=day)
+            db.session.add(block)
+        block.count = len(timestamps)
+        block.first_tick = _from_ms(timestamps[0])
+        block.last_tick = _from_ms(timestamps[-1])
+        block.data = data
+
+        self.stats['blocks'] += 1
+        self.stats['ticks'] += len(ticks)
+        self.stats['encoded_ticks'] += len(timestamps)
+        self.stats['bytes'] += len(data)
+        return len(ticks)
+
+    def get_ticks(self, symbol: str, start: datetime, end: datetime,
+                  since: Optional[datetime] = None) -> List[Tuple[datetime, float]]:
+        """Archived (timestamp, price) ticks with start <= timestamp <= end (and after since), oldest first"""
+        blocks = db.session.query(PriceArchive.data).filter(
+            PriceArchive.crypto_symbol == symbol,
+            PriceArchive.day >= start.date(),
+            PriceArchive.day <= end.date()
+        ).order_by(PriceArchive.day).all()
+        lower = max(_to_ms(start), _to_ms(since) + 1) if since else _to_ms(start)
+        upper = _to_ms(end)
+
+        ticks = []
+        for (data,) in blocks:
+            timestamps, prices, _ = decode_block(data)
+            keep = (timestamps >= lower) & (timestamps <= upper)
+            ticks.extend(zip(map(_from_ms, timestamps[keep].tolist()), prices[keep].tolist()))
+        self.stats['reads'] += len(blocks)
+        return ticks
+
+    def earliest(self, symbol: str, after: Optional[datetime] = None) -> Optional[datetime]:
+        """First archived tick for symbol, optionally only among blocks ending at or after `after`"""
+        query = db.session.query(func.min(PriceArchive.first_tick)).filter(PriceArchive.crypto_symbol == symbol)
+        if after is not None:
+            query = query.filter(PriceArchive.last_tick >= after)
+        return query.scalar()
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['bytes_per_tick'] = stats['bytes'] / stats['encoded_ticks'] if stats['encoded_ticks'] else None
+        return stats
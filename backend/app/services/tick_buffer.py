@@ -0,0 +1,197 @@
+# app/services/tick_buffer.py
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from app import db
+from app.models.price_history import PriceHistory
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Ticks kept per symbol: a week of 5-minute updates
+DEFAULT_CAPACITY = 2016
+
+def to_epoch(timestamp: datetime) -> float:
+    """Naive UTC datetime as unix seconds"""
+    return (timestamp - EPOCH).total_seconds()
+
+class RingBuffer:
+    """
+    Fixed-capacity columns of (timestamp, price, volume) for one symbol.
+
+    Ticks are appended in time order, overwriting the oldest once full, so
+    the stored span is at most two sorted runs of the arrays. Time ranges are
+    found with a binary search in each run and returned as copies.
+    Timestamps are unix seconds; missing volumes are NaN.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.volumes = np.full(capacity, np.nan, dtype=np.float64)
+        self._head = 0  # Next slot written, the oldest tick once full
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        return float(self.timestamps[self._head - 1]) if self._size else None
+
+    def append(self, timestamp: float, price: float, volume: Optional[float] = None) -> bool:
+        """Add one tick; ticks not newer than the newest stored one are ignored. Returns whether it was added"""
+        if self._size and timestamp <= self.timestamps[self._head - 1]:
+            return False
+        self.timestamps[self._head] = timestamp
+        self.prices[self._head] = price
+        self.volumes[self._head] = np.nan if volume is None else volume
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        return True
+
+    def extend(self, timestamps, prices, volumes=None) -> int:
+        """Add sorted ticks at once, keeping the newest capacity of them; returns ticks added"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        prices = np.asarray(prices, dtype=np.float64)
+        volumes = (np.full(len(timestamps), np.nan) if volumes is None
+                   else np.array(volumes, dtype=np.float64))
+        last = self.last_timestamp
+        if last is not None:
+            keep = timestamps > last
+            timestamps, prices, volumes = timestamps[keep], prices[keep], volumes[keep]
+        timestamps, prices, volumes = (column[-self.capacity:] for column in (timestamps, prices, volumes))
+
+        count = len(timestamps)
+        slots = (self._head + np.arange(count)) % self.capacity
+        self.timestamps[slots] = timestamps
+        self.prices[slots] = prices
+        self.volumes[slots] = volumes
+        self._head = (self._head + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+        return count
+
+    def _runs(self) -> Iterable[slice]:
+        """Physical slices holding the ticks, oldest first"""
+        if self._size < self.capacity:
+            return (slice(0, self._size),)
+        return (slice(self._head, self.capacity), slice(0, self._head))
+
+    def range(self, start: Optional[float] = None,
+              end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(timestamps, prices, volumes) with start <= timestamp <= end, oldest first"""
+        parts = []
+        for run in self._runs():
+            timestamps = self.timestamps[run]
+            lo = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+            hi = len(timestamps) if end is None else np.searchsorted(timestamps, end, side='right')
+            if lo < hi:
+                parts.append(slice(run.start + lo, run.start + hi))
+        if not parts:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty, empty
+        return tuple(np.concatenate([column[part] for part in parts])
+                     for column in (self.timestamps, self.prices, self.volumes))
+
+    def window_stats(self, start: Optional[float] = None, end: Optional[float] = None) -> Optional[Dict]:
+        """Open/close/high/low/mean/stddev and change over [start, end]; None when no ticks fall in it"""
+        timestamps, prices, volumes = self.range(start, end)
+        if not len(prices):
+            return None
+        first, last = float(prices[0]), float(prices[-1])
+        return {
+            'count': int(len(prices)),
+            'from': float(timestamps[0]),
+            'to': float(timestamps[-1]),
+            'open': first,
+            'close': last,
+            'high': float(prices.max()),
+            'low': float(prices.min()),
+            'mean': float(prices.mean()),
+            'stddev': float(prices.std()),
+            'change': last - first,
+            'change_pct': (last - first) / first * 100 if first else None,
+            'volume': None if np.isnan(volumes[-1]) else float(volumes[-1])
+        }
+
+class TickBuffers:
+    """
+    Recent ticks per symbol kept in memory, so recent-window queries (24h
+    change, sparklines) don't need a database round trip.
+
+    PriceUpdater appends every stored snapshot. A symbol's buffer is loaded
+    with its newest stored ticks from price_history the first time the symbol
+    is used, so a worker only pays for the symbols it is asked about, each
+    one a bounded probe of idx_crypto_timestamp.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._lock = threading.Lock()
+        self.stats = {'appended': 0, 'loaded': 0, 'queries': 0}
+
+    def _buffer(self, symbol: str) -> RingBuffer:
+        """The symbol's buffer, loading it from price_history on first use; call without holding the lock"""
+        buffer = self._buffers.get(symbol)
+        if buffer is not None:
+            return buffer
+        loaded = RingBuffer(self.capacity)
+        try:
+            self.stats['loaded'] += self._load(symbol, loaded)
+        except Exception as e:
+            logger.warning(f"Could not load recent {symbol} ticks: {str(e)}")
+            db.session.rollback()
+        with self._lock:
+            return self._buffers.setdefault(symbol, loaded)
+
+    def _load(self, symbol: str, buffer: RingBuffer) -> int:
+        """Fill buffer with the symbol's newest capacity stored ticks"""
+        rows = db.session.query(
+            PriceHistory.timestamp, PriceHistory.price_usd, PriceHistory.volume_24h
+        ).filter(
+            PriceHistory.crypto_symbol == symbol
+        ).order_by(PriceHistory.timestamp.desc()).limit(buffer.capacity).all()
+        rows.reverse()
+        return buffer.extend(
+            [to_epoch(timestamp) for timestamp, _, _ in rows],
+            [price for _, price, _ in rows],
+            [np.nan if volume is None else volume for _, _, volume in rows]
+        )
+
+    def append_snapshot(self, prices: Dict[str, Dict], timestamp: datetime) -> int:
+        """Append one tick per quoted symbol; returns ticks added"""
+        epoch = to_epoch(timestamp)
+        added = 0
+        for symbol, quote in prices.items():
+            if quote.get('price') is None:
+                continue
+            buffer = self._buffer(symbol)
+            with self._lock:
+                added += buffer.append(epoch, quote['price'], quote.get('volume_24h'))
+        self.stats['appended'] += added
+        return added
+
+    def get_range(self, symbol: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(timestamps, prices, volumes) buffered for symbol between start and end"""
+        self.stats['queries'] += 1
+        buffer = self._buffer(symbol)
+        with self._lock:
+            return buffer.range(start and to_epoch(start), end and to_epoch(end))
+
+    def get_window_stats(self, symbol: str, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> Optional[Dict]:
+        """Window stats for symbol between start and end; None when nothing is buffered there"""
+        self.stats['queries'] += 1
+        buffer = self._buffer(symbol)
+        with self._lock:
+            return buffer.window_stats(start and to_epoch(start), end and to_epoch(end))
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, symbols=len(self._buffers), capacity=self.capacity,
+                    ticks=sum(len(buffer) for buffer in self._buffers.values()))
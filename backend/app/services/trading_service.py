@@ -31,8 +31,13 @@ class TradingService:
             dict: Result of the transaction
         """
         try:
+            symbol = self.price_service.resolve_symbol(symbol)
+
             # Get current price
-            current_price, _ = self.price_service.get_price(symbol)
+            current_price, _ = self.price_service.get_price(
+                symbol,
+                max_staleness=self.price_service.max_staleness['trading']
+            )
             if not current_price:
                 return {'success': False, 'error': f'Could not get price for {symbol}'}
 
@@ -109,6 +114,8 @@ class TradingService:
         Execute a sell order for cryptocurrency
         """
         try:
+            symbol = self.price_service.resolve_symbol(symbol)
+
             # Convert quantities to Decimal for precise comparison
             quantity = Decimal(str(quantity)).quantize(Decimal('0.00000001'), rounding=ROUND_HALF_UP)
             
@@ -129,7 +136,10 @@ class TradingService:
                 return {'success': False, 'error': 'Insufficient crypto balance'}
 
             # Get current price
-            current_price, _ = self.price_service.get_price(symbol)
+            current_price, _ = self.price_service.get_price(
+                symbol,
+                max_staleness=self.price_service.max_staleness['trading']
+            )
             if not current_price:
                 return {'success': False, 'error': f'Could not get price for {symbol}'}
 
@@ -199,10 +209,31 @@ class TradingService:
             
             holdings = []
             total_value = 0.0
+
+            # Quote every holding from a single price snapshot
+            symbols = [p.crypto_symbol for p in portfolios if p.crypto_symbol in self.price_service.supported_coins]
+            max_staleness = self.price_service.max_staleness['portfolio']
+            stale = False
+            try:
+                quotes = self.price_service.get_prices(symbols, max_staleness=max_staleness)
+            except Exception as e:
+                # The snapshot couldn't be refreshed and the cached one is past the portfolio bound;
+                # value holdings at that last snapshot, marked stale, rather than retrying the upstream
+                logger.error(f"Error getting portfolio prices, using the last cached snapshot: {str(e)}")
+                snapshot = self.price_service.cache.snapshot
+                quotes = {symbol: snapshot.prices[symbol] for symbol in symbols
+                          if snapshot is not None and symbol in snapshot}
+                stale = True
             
+            missing = []
             for p in portfolios:
                 try:
-                    current_price, price_change = self.price_service.get_price(p.crypto_symbol)
+                    quote = quotes.get(p.crypto_symbol)
+                    if not quote:
+                        logger.error(f"No price available for {p.crypto_symbol}")
+                        missing.append(p.crypto_symbol)
+                        continue
+                    current_price, price_change = quote['price'], quote['change_24h']
                     if current_price:
                         value = p.quantity * current_price
                         holdings.append({
@@ -217,12 +248,16 @@ class TradingService:
                         total_value += value
                 except Exception as e:
                     logger.error(f"Error getting price for {p.crypto_symbol}: {str(e)}")
+                    missing.append(p.crypto_symbol)
                     continue
 
             return {
                 'user_id': user_id,
                 'holdings': holdings,
-                'total_value': total_value
+                'total_value': total_value,
+                # Holdings left out of total_value, and whether it uses an expired snapshot
+                'missing': missing,
+                'stale': stale
             }
         
     
@@ -0,0 +1,32 @@
+from app import create_app
+from app.services import backfill_job
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+def backfill_history():
+    """Backfill price_history from CoinGecko market_chart data, resuming from checkpoints"""
+    parser = argparse.ArgumentParser(description=backfill_history.__doc__)
+    parser.add_argument('--days', type=int, help='days of history to load (default BACKFILL_DAYS)')
+    parser.add_argument('--symbols', help='comma-separated symbols (default every supported coin)')
+    parser.add_argument('--concurrency', type=int, help='symbols fetched in parallel')
+    parser.add_argument('--restart', action='store_true', help='ignore checkpoints from earlier runs')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        if args.concurrency:
+            backfill_job.concurrency = args.concurrency
+        symbols = [s for s in args.symbols.split(',') if s] if args.symbols else None
+        try:
+            result = backfill_job.run(days=args.days, symbols=symbols, restart=args.restart)
+            print(f"Backfilled {result['rows']} rows for {result['symbols']} symbols "
+                  f"({result['skipped']} already done, {result['errors']} failed)")
+        except Exception as e:
+            logger.error(f"Error backfilling price history: {str(e)}")
+            print(f"Error: {str(e)}")
+
+if __name__ == "__main__":
+    backfill_history()
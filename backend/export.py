@@ -0,0 +1,52 @@
+from app import create_app
+from app.services.export import HistoryExport, format_cursor, parse_cursor
+from datetime import datetime
+import argparse
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def export_history():
+    """Export price history or candles to a Parquet or Arrow IPC file"""
+    parser = argparse.ArgumentParser(description=export_history.__doc__)
+    parser.add_argument('output', help='file to write')
+    parser.add_argument('--dataset', choices=['prices', 'candles'], default='prices')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--symbols', help='comma-separated symbols (default all)')
+    parser.add_argument('--from', dest='start', type=datetime.fromisoformat, help='ISO start time (UTC)')
+    parser.add_argument('--to', dest='end', type=datetime.fromisoformat, help='ISO end time (UTC)')
+    parser.add_argument('--after', help="only rows written after this cursor (a previous export's last_cursor)")
+    parser.add_argument('--state', help='JSON file keeping the last exported cursor for incremental dumps')
+    args = parser.parse_args()
+
+    # Continue after the previous incremental dump unless --after is given
+    after = args.after
+    if after is None and args.state and os.path.exists(args.state):
+        with open(args.state) as f:
+            after = json.load(f)['last_cursor']
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            export = HistoryExport(
+                dataset=args.dataset,
+                format=args.format,
+                symbols=[s for s in args.symbols.split(',') if s] if args.symbols else None,
+                start=args.start,
+                end=args.end,
+                after=parse_cursor(args.dataset, after) if after else None
+            )
+            result = export.write_to(args.output)
+            if args.state and result['last_cursor'] is not None:
+                with open(args.state, 'w') as f:
+                    json.dump({'last_cursor': format_cursor(result['last_cursor'])}, f)
+            print(f"Exported {result['rows']} rows to {args.output}")
+        except Exception as e:
+            logger.error(f"Error exporting price history: {str(e)}")
+            print(f"Error: {str(e)}")
+
+if __name__ == "__main__":
+    export_history()
@@ -0,0 +1,26 @@
+from app import create_app
+from app.services.history_store import rebuild_tick_index, tick_index_is_unique
+import logging
+
+logger = logging.getLogger(__name__)
+
+def migrate_database():
+    """Bring an existing database up to the current schema without dropping data"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            # price_history tables created before ticks were deduplicated have a plain
+            # idx_crypto_timestamp, which ON CONFLICT inserts can't use
+            if tick_index_is_unique():
+                print("idx_crypto_timestamp is already unique, nothing to do")
+                return
+            deleted = rebuild_tick_index()
+            print(f"Removed {deleted} duplicate price ticks and rebuilt idx_crypto_timestamp as unique")
+            
+        except Exception as e:
+            logger.error(f"Error migrating database: {str(e)}")
+            print(f"Error: {str(e)}")
+
+if __name__ == "__main__":
+    migrate_database()
@@ -1,6 +1,7 @@
 import pytest
 from decimal import Decimal
 from pathlib import Path
+from flask import Flask
 from app import create_app, db
 from app.models.user import User
 from app.models.portfolio import Portfolio
@@ -37,6 +38,18 @@ def db_session(app):
         db.session.remove()
         db.drop_all()
 
+@pytest.fixture(scope='function')
+def sqlite_app():
+    """Bare app with an in-memory SQLite database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
 @pytest.fixture(scope='function')
 def test_user(app, db_session):
     """Fixture to create and clean up test user"""
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models.backfill_checkpoint import BackfillCheckpoint
+from app.models.price_history import PriceHistory
+from app.services.backfill import BackfillJob
+from app.services.history_store import HistoryStore
+from app.services.price_providers import PriceProvider
+from app.services.price_service import PriceService
+
+class ChartProvider(PriceProvider):
+    """Stand-in upstream with hourly history for the last five days"""
+    name = 'chart'
+
+    def __init__(self, now, failing=()):
+        self.now = now
+        self.failing = set(failing)
+        self.calls = []
+
+    def get_history(self, coin_id, days, interval='daily', background=False):
+        self.calls.append(coin_id)
+        if coin_id in self.failing:
+            raise Exception(f"{coin_id} unavailable")
+        epoch = datetime(1970, 1, 1)
+        return [((self.now - timedelta(hours=hours) - epoch).total_seconds() * 1000, 100.0 + hours)
+                for hours in range(120, 0, -1)]
+
+@pytest.fixture
+def lock_file(tmp_path):
+    return str(tmp_path / 'backfill.lock')
+
+def make_job(lock_file, failing=()):
+    service = PriceService()
+    service.provider = ChartProvider(datetime.utcnow(), failing)
+    return BackfillJob(service, HistoryStore(service), days=3, concurrency=2, lock_file=lock_file)
+
+def test_backfill_stores_history_and_checkpoints(sqlite_app, lock_file):
+    """Every requested symbol is stored and checkpointed"""
+    job = make_job(lock_file)
+    result = job.run(symbols=['BTC', 'ETH'])
+
+    assert result['symbols'] == 2 and result['errors'] == 0
+    assert result['rows'] == PriceHistory.query.count()
+    assert 70 <= PriceHistory.query.filter_by(crypto_symbol='BTC').count() <= 72
+    assert {c.crypto_symbol for c in BackfillCheckpoint.query} == {'BTC', 'ETH'}
+
+def test_rerun_resumes_after_failures(sqlite_app, lock_file):
+    """Checkpointed symbols are skipped and only the failed ones are fetched again"""
+    job = make_job(lock_file, failing=['ethereum'])
+    first = job.run(symbols=['BTC', 'ETH'])
+    assert (first['symbols'], first['errors']) == (1, 1)
+
+    job.price_service.provider.failing.clear()
+    job.price_service.provider.calls.clear()
+    second = job.run(symbols=['BTC', 'ETH'])
+    assert (second['symbols'], second['skipped']) == (1, 1)
+    assert job.price_service.provider.calls == ['ethereum']
+
+def test_existing_ticks_are_not_duplicated(sqlite_app, lock_file):
+    """Only history older than the earliest stored tick is inserted"""
+    earliest = datetime.utcnow() - timedelta(days=1)
+    db.session.add(PriceHistory(crypto_symbol='BTC', price_usd=1.0, timestamp=earliest))
+    db.session.commit()
+
+    make_job(lock_file).run(symbols=['BTC'])
+    assert PriceHistory.query.filter(PriceHistory.timestamp >= earliest).count() == 1
+
+def test_run_in_another_process_is_skipped(sqlite_app, lock_file):
+    """A worker finding the host lock taken leaves the backfill to its holder"""
+    fcntl = pytest.importorskip('fcntl')
+    job = make_job(lock_file)
+    with open(lock_file, 'w') as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        assert job.run(symbols=['BTC']) == {'symbols': 0, 'rows': 0, 'skipped': 0, 'errors': 0}
+    assert job.price_service.provider.calls == []
+
+    assert job.run(symbols=['BTC'])['symbols'] == 1
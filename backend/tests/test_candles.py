@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models.price_candle import PriceCandle
+from app.services.candles import get_candles, pick_resolution, upsert_candles
+
+def test_ticks_upsert_into_every_resolution(sqlite_app):
+    """Incremental ingests widen high/low and move the close of the current bucket"""
+    start = datetime(2024, 1, 1, 10, 0)
+    upsert_candles([('BTC', start, 100.0, 5.0), ('BTC', start + timedelta(seconds=20), 110.0, 6.0)])
+    db.session.commit()
+    upsert_candles([('BTC', start + timedelta(seconds=40), 90.0, 7.0)])
+    db.session.commit()
+
+    minute = db.session.get(PriceCandle, ('BTC', '1m', start))
+    assert (minute.open, minute.high, minute.low, minute.close, minute.volume_24h) == (100.0, 110.0, 90.0, 90.0, 7.0)
+    assert db.session.get(PriceCandle, ('BTC', '1d', datetime(2024, 1, 1))).close == 90.0
+    assert PriceCandle.query.count() == 4
+
+def test_out_of_order_ticks_keep_open_and_close(sqlite_app):
+    """Older ticks arriving late only move the open, never the close"""
+    start = datetime(2024, 1, 1, 10, 0)
+    upsert_candles([('ETH', start + timedelta(minutes=30), 20.0, None)])
+    upsert_candles([('ETH', start, 10.0, None)])
+    db.session.commit()
+    hour = db.session.get(PriceCandle, ('ETH', '1h', start))
+    assert (hour.open, hour.close, hour.low, hour.high) == (10.0, 20.0, 10.0, 20.0)
+
+def test_gaps_carry_forward_last_close(sqlite_app):
+    """Empty buckets repeat the previous close with no 24h volume"""
+    start = datetime(2024, 1, 1, 0, 0)
+    upsert_candles([('BTC', start, 1.0, 1.0), ('BTC', start + timedelta(hours=3), 4.0, 1.0)])
+    db.session.commit()
+    candles = get_candles('BTC', '1h', start, start + timedelta(hours=3))
+    assert [candle['close'] for candle in candles] == [1.0, 1.0, 1.0, 4.0]
+    assert candles[1]['volume_24h'] is None
+
+def test_pick_resolution_is_coarsest_meeting_points():
+    """The widest bucket that still yields enough points wins"""
+    start = datetime(2024, 1, 1)
+    assert pick_resolution(start, start + timedelta(days=7), 150) == '1h'
+    assert pick_resolution(start, start + timedelta(days=365), 300) == '1d'
+    assert pick_resolution(start, start + timedelta(hours=1), 500) == '1m'
@@ -0,0 +1,93 @@
+import threading
+import time
+import pytest
+from app.services.coalescer import BatchCoalescer
+from app.services.price_service import PriceService
+
+def test_concurrent_lookups_share_one_batch():
+    """Lookups arriving inside the window go out as a single batched call"""
+    batches = []
+
+    def fetch(keys):
+        batches.append(sorted(keys))
+        return {key: key.upper() for key in keys}
+
+    coalescer = BatchCoalescer(fetch, window=0.05)
+    results = {}
+    barrier = threading.Barrier(5)
+
+    def lookup(key):
+        barrier.wait()
+        results[key] = coalescer.get(key, timeout=5)
+
+    threads = [threading.Thread(target=lookup, args=(key,)) for key in 'abcde']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {key: key.upper() for key in 'abcde'}
+    assert batches == [list('abcde')]
+    stats = coalescer.get_stats()
+    assert stats['batch_size']['count'] == 1
+    assert stats['wait_time']['count'] == 5
+
+def test_max_batch_splits_and_errors_propagate():
+    """Batches are capped at max_batch and a failed batch fails its waiters"""
+    batches = []
+
+    def fetch(keys):
+        batches.append(len(keys))
+        if 'bad' in keys:
+            raise RuntimeError('upstream down')
+        return {key: 1 for key in keys if key != 'gone'}
+
+    coalescer = BatchCoalescer(fetch, window=0.0, max_batch=3)
+    assert coalescer.get_many(['a', 'b', 'c', 'd', 'gone']) == {'a': 1, 'b': 1, 'c': 1, 'd': 1}
+    assert batches == [3, 2]
+    with pytest.raises(RuntimeError):
+        coalescer.get('bad')
+    assert coalescer.stats['errors'] == 1
+
+def test_leader_hands_off_after_its_own_window():
+    """Keys queued while the leader fetches are flushed by another caller, not the leader"""
+    fetching = threading.Event()
+    release = threading.Event()
+    fetched_by = {}
+
+    def fetch(keys):
+        for key in keys:
+            fetched_by[key] = threading.current_thread().name
+        if 'a' in keys:
+            fetching.set()
+            release.wait(5)
+        return {key: key.upper() for key in keys}
+
+    coalescer = BatchCoalescer(fetch, window=0.0)
+    first = threading.Thread(target=coalescer.get, args=('a',), name='first')
+    first.start()
+    assert fetching.wait(5)
+
+    # The first leader is still inside its fetch; this caller leads its own batch
+    assert coalescer.get('b', timeout=5) == 'B'
+    release.set()
+    first.join()
+    assert fetched_by == {'a': 'first', 'b': threading.current_thread().name}
+
+def test_symbols_missing_from_snapshot_are_coalesced():
+    """get_prices quotes symbols the snapshot lacks through the coalescer"""
+    service = PriceService()
+    calls = []
+
+    def fetch(coin_ids):
+        calls.append(coin_ids)
+        return {coin_id: {'price': 2.0, 'change_24h': 0.0, 'market_cap': None, 'volume_24h': None}
+                for coin_id in coin_ids}
+
+    service.coalescer.fetch_batch = fetch
+    service.cache.publish({'BTC': {'price': 1.0, 'change_24h': 0.0}}, fetched_at=time.time())
+
+    prices = service.get_prices(['BTC', 'ETH'])
+    assert prices['BTC']['price'] == 1.0
+    assert prices['ETH']['price'] == 2.0
+    assert calls == [['ethereum']]
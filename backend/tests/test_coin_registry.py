@@ -0,0 +1,147 @@
+import json
+import threading
+import pytest
+from app.services.coin_registry import CoinRegistry, chunk_ids
+from app.services.price_providers import PriceProvider
+from app.services.rate_limiter import RateLimitExceeded
+from app.services.price_service import PriceService
+from app.services.symbol_resolver import SymbolResolver
+
+class ListingProvider(PriceProvider):
+    """Stand-in upstream that records the ids requested per call"""
+    name = 'listing'
+
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get_prices(self, coin_ids, fail_fast=False):
+        with self._lock:
+            self.requests.append(list(coin_ids))
+        return {coin_id: {'price': 1.0, 'change_24h': 0.0, 'market_cap': None, 'volume_24h': None}
+                for coin_id in coin_ids}
+
+def test_registry_indexes_symbols_ids_and_names():
+    """Default coins are reachable by symbol, provider id and name"""
+    registry = CoinRegistry.default()
+    assert len(registry) == 10
+    assert 'BTC' in registry and 'XYZ' not in registry
+    assert registry.get('eth').coin_id == 'ethereum'
+    assert registry.by_id['ripple'].symbol == 'XRP'
+    assert registry.by_name['dogecoin'].symbol == 'DOGE'
+    assert registry.symbol_to_id['SOL'] == 'solana'
+
+def test_coins_list_respects_priority_and_symbol_length(tmp_path):
+    """Curated coins keep their tickers and over-long symbols are skipped"""
+    entries = [
+        {'id': 'bitcoin-wannabe', 'symbol': 'btc', 'name': 'Bitcoin Wannabe'},
+        {'id': 'pepe', 'symbol': 'pepe', 'name': 'Pepe'},
+        {'id': 'long-one', 'symbol': 'averyverylongticker', 'name': 'Long'}
+    ]
+    registry = CoinRegistry.from_coins_list(entries, priority=CoinRegistry.default())
+    assert registry.get('BTC').coin_id == 'bitcoin'
+    assert registry.get('PEPE').coin_id == 'pepe'
+    assert 'bitcoin-wannabe' not in registry.by_id
+    assert 'AVERYVERYLONGTICKER' not in registry
+
+    path = tmp_path / 'coins.json'
+    path.write_text(json.dumps(entries))
+    assert CoinRegistry.from_file(str(path)).get('BTC').coin_id == 'bitcoin-wannabe'
+
+def test_chunk_ids_stays_under_length():
+    """Every chunk's encoded ids list fits the limit and no id is lost"""
+    ids = [f"coin-{i:04d}" for i in range(500)]
+    chunks = chunk_ids(ids, max_length=200)
+    assert len(chunks) > 1
+    assert [coin_id for chunk in chunks for coin_id in chunk] == ids
+    assert all(len('%2C'.join(chunk)) <= 200 for chunk in chunks)
+    assert chunk_ids(['bitcoin', 'ethereum']) == [['bitcoin', 'ethereum']]
+
+def test_large_universe_is_fetched_in_chunks():
+    """PriceService splits a large coin universe across concurrent requests"""
+    service = PriceService()
+    service.registry = CoinRegistry.from_coins_list(
+        [{'id': f"coin-{i:04d}", 'symbol': f"C{i:04d}", 'name': f"Coin {i}"} for i in range(300)]
+    )
+    service.supported_coins = service.registry.symbol_to_id
+    service.provider = ListingProvider()
+    service.max_ids_length = 500
+
+    prices, _ = service._fetch_all_prices()
+    assert len(prices) == 300
+    assert len(service.provider.requests) > 1
+    assert all(len('%2C'.join(chunk)) <= 500 for chunk in service.provider.requests)
+
+class BudgetProvider(ListingProvider):
+    """Listing upstream whose fail-fast calls get `budget` tokens per refresh"""
+
+    def __init__(self, budget, price):
+        super().__init__()
+        self.budget = budget
+        self.price = price
+
+    def get_prices(self, coin_ids, fail_fast=False):
+        with self._lock:
+            if fail_fast and self.budget <= 0:
+                raise RateLimitExceeded("budget exhausted")
+            self.budget -= 1
+            self.requests.append(list(coin_ids))
+        return {coin_id: {'price': self.price, 'change_24h': 0.0, 'market_cap': None, 'volume_24h': None}
+                for coin_id in coin_ids}
+
+def test_refresh_with_more_chunks_than_the_burst_still_progresses():
+    """Chunks that get a token are refreshed, the rest keep cached quotes and go first next time"""
+    service = PriceService()
+    service.registry = CoinRegistry.from_coins_list(
+        [{'id': f"coin-{i:04d}", 'symbol': f"C{i:04d}", 'name': f"Coin {i}"} for i in range(300)]
+    )
+    service.supported_coins = service.registry.symbol_to_id
+    service.max_ids_length = 500
+    service.fetch_concurrency = 1
+    service.provider = BudgetProvider(budget=100, price=1.0)
+    first = service.get_snapshot()
+    chunks = len(service.provider.requests)
+    assert chunks > 5 and all(quote['price'] == 1.0 for quote in first.prices.values())
+
+    refreshed = set()
+    for _ in range(chunks // 5 + 1):
+        service.provider.budget, service.provider.price = 5, 2.0
+        service.provider.requests = []
+        snapshot = service.get_snapshot(max_age=0)
+        assert len(snapshot) == 300 and snapshot.version > first.version
+        # Quotes kept from the cached snapshot keep the time they were fetched
+        assert all(first.fetched_at < quote['as_of'] <= snapshot.fetched_at if quote['price'] == 2.0
+                   else quote['as_of'] == first.fetched_at for quote in snapshot.prices.values())
+        refreshed.update(coin_id for chunk in service.provider.requests for coin_id in chunk)
+    assert len(refreshed) == 300
+    assert all(quote['price'] == 2.0 for quote in service.cache.snapshot.prices.values())
+
+def test_resolver_maps_ids_names_and_aliases():
+    """Tickers, ids, names and aliases all resolve to the canonical symbol"""
+    resolver = SymbolResolver(CoinRegistry.default(), {'sats': 'BTC'})
+    assert resolver.resolve('btc') == 'BTC'
+    assert resolver.resolve('bitcoin') == 'BTC'
+    assert resolver.resolve('XBT') == 'BTC'
+    assert resolver.resolve('sats') == 'BTC'
+    assert resolver.resolve('USD Coin') == 'USDC'
+    assert resolver.resolve('binancecoin') == 'BNB'
+    assert resolver.resolve('nope') is None
+    assert resolver.resolve('') is None
+
+def test_resolver_search_prefix_then_fuzzy():
+    """Search ranks exact and prefix hits first and tolerates typos"""
+    resolver = SymbolResolver(CoinRegistry.default())
+    assert [coin.symbol for coin in resolver.search('bit')] == ['BTC']
+    assert resolver.search('eth')[0].symbol == 'ETH'
+    assert resolver.search('cardona')[0].symbol == 'ADA'
+    assert resolver.search('') == []
+    assert len(resolver.search('t', limit=2)) == 2
+
+def test_price_service_rejects_unknown_symbols_before_fetching():
+    """Unknown symbols raise ValueError without touching the provider"""
+    service = PriceService()
+    service.provider = ListingProvider()
+    with pytest.raises(ValueError):
+        service.get_prices(['BTC', 'NOTACOIN'])
+    assert service.provider.requests == []
+    assert service.resolve_symbol('ethereum') == 'ETH'
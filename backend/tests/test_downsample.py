@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+import numpy as np
+from app.services.downsample import SeriesCache, downsample, lttb_indices
+
+def test_lttb_keeps_endpoints_and_peaks():
+    """The first, last and extreme points survive downsampling"""
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[321] = 50.0
+    y[700] = -50.0
+    indices = lttb_indices(x, y, 20)
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 321 in indices and 700 in indices
+    assert np.all(np.diff(indices) > 0)
+
+def test_short_series_are_returned_unchanged():
+    """Series already within max_points are not touched"""
+    points = [{'timestamp': '2024-01-01T00:00:00', 'price': 1.0}]
+    assert downsample(points, 10) is points
+    assert list(lttb_indices(np.arange(5.0), np.arange(5.0), 2)) == [0, 4]
+
+def test_downsample_chart_points():
+    """Chart points are reduced to max_points, oldest first"""
+    start = datetime(2024, 1, 1)
+    points = [{'timestamp': (start + timedelta(minutes=i)).isoformat(), 'price': float(i % 17)}
+              for i in range(2000)]
+    reduced = downsample(points, 100)
+    assert len(reduced) == 100
+    assert reduced[0] is points[0] and reduced[-1] is points[-1]
+    assert [point['timestamp'] for point in reduced] == sorted(point['timestamp'] for point in reduced)
+
+def test_series_cache_evicts_least_recent():
+    """The cache keeps max_entries series"""
+    cache = SeriesCache(max_entries=1)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') is None
+    assert cache.get('b') == [2]
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models.price_history import PriceHistory
+from app.services.candles import upsert_candles
+from app.services.export import HistoryExport
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+START = datetime(2024, 1, 1)
+
+def add_ticks(count=25):
+    for symbol in ('BTC', 'ETH'):
+        for i in range(count):
+            db.session.add(PriceHistory(crypto_symbol=symbol, price_usd=float(i),
+                                        timestamp=START + timedelta(minutes=5 * i)))
+    db.session.commit()
+
+def test_parquet_export_writes_row_groups_per_batch(sqlite_app, tmp_path):
+    """Each cursor batch becomes one row group and the range filters apply"""
+    add_ticks()
+    export = HistoryExport(symbols=['BTC'], start=START + timedelta(minutes=10), batch_size=10)
+    result = export.write_to(str(tmp_path / 'btc.parquet'))
+
+    parquet = pq.ParquetFile(str(tmp_path / 'btc.parquet'))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.num_rows == result['rows'] == 23
+    assert set(table.column('crypto_symbol').to_pylist()) == {'BTC'}
+    assert result['last_cursor'] == max(table.column('id').to_pylist())
+
+def test_arrow_export_resumes_after_last_cursor(sqlite_app):
+    """An incremental export contains the rows written since the previous one, backfilled ones included"""
+    add_ticks(10)
+    first = HistoryExport(format='arrow')
+    body = b''.join(first.stream())
+    assert pa.ipc.open_stream(body).read_all().num_rows == 20
+
+    db.session.add(PriceHistory(crypto_symbol='BTC', price_usd=99.0, timestamp=START + timedelta(hours=2)))
+    # Backfilled before the previous export's newest tick
+    db.session.add(PriceHistory(crypto_symbol='BTC', price_usd=98.0, timestamp=START - timedelta(hours=1)))
+    db.session.commit()
+    second = HistoryExport(format='arrow', after=first.last_cursor)
+    table = pa.ipc.open_stream(b''.join(second.stream())).read_all()
+    assert table.column('price_usd').to_pylist() == [98.0, 99.0]
+
+def test_candle_cursor_follows_updates(sqlite_app):
+    """A candle rewritten after an export is exported again, however old its bucket"""
+    upsert_candles([('BTC', START, 1.0, None)])
+    db.session.commit()
+    first = HistoryExport('candles', 'arrow')
+    b''.join(first.stream())
+
+    upsert_candles([('ETH', START + timedelta(days=1), 5.0, None), ('BTC', START + timedelta(seconds=10), 2.0, None)])
+    db.session.commit()
+    second = HistoryExport('candles', 'arrow', after=first.last_cursor)
+    table = pa.ipc.open_stream(b''.join(second.stream())).read_all()
+    assert {(row['crypto_symbol'], row['resolution']) for row in table.to_pylist()} == {
+        (symbol, resolution) for symbol in ('BTC', 'ETH') for resolution in ('1m', '5m', '1h', '1d')
+    }
+
+def test_candle_export(sqlite_app):
+    """Candles export with their OHLC columns"""
+    upsert_candles([('BTC', START, 1.0, None), ('BTC', START + timedelta(seconds=30), 3.0, None)])
+    db.session.commit()
+    table = pa.ipc.open_stream(b''.join(HistoryExport('candles', 'arrow').stream())).read_all()
+    minute = [row for row in table.to_pylist() if row['resolution'] == '1m']
+    assert [dict(row, updated_at=None) for row in minute] == [
+        {'crypto_symbol': 'BTC', 'resolution': '1m', 'bucket': START, 'open': 1.0, 'high': 3.0,
+         'low': 1.0, 'close': 3.0, 'volume_24h': None, 'last_tick': START + timedelta(seconds=30),
+         'updated_at': None}
+    ]
+
+def test_empty_export_is_a_valid_file(sqlite_app, tmp_path):
+    """No matching rows still gives a readable file with the schema"""
+    HistoryExport(symbols=['BTC']).write_to(str(tmp_path / 'empty.parquet'))
+    table = pq.read_table(str(tmp_path / 'empty.parquet'))
+    assert table.num_rows == 0 and 'price_usd' in table.column_names
+
+def test_export_route_requires_auth_and_caps_the_range(sqlite_app):
+    """Anonymous exports are refused and HTTP exports cover at most EXPORT_MAX_DAYS"""
+    from flask_jwt_extended import JWTManager, create_access_token
+    from app.routes.market_routes import market_bp
+
+    sqlite_app.config['JWT_SECRET_KEY'] = 'test-secret-key-long-enough-for-hs256'
+    sqlite_app.config['EXPORT_MAX_DAYS'] = 7
+    JWTManager(sqlite_app)
+    sqlite_app.register_blueprint(market_bp)
+    client = sqlite_app.test_client()
+    add_ticks(10)
+
+    assert client.get('/api/market/export').status_code == 401
+    headers = {'Authorization': f"Bearer {create_access_token(identity='1')}"}
+    too_long = client.get(f"/api/market/export?from={START.isoformat()}&to={(START + timedelta(days=8)).isoformat()}",
+                          headers=headers)
+    assert too_long.status_code == 400
+
+    response = client.get(f"/api/market/export?format=arrow&from={START.isoformat()}"
+                          f"&to={(START + timedelta(days=1)).isoformat()}", headers=headers)
+    assert response.status_code == 200
+    assert pa.ipc.open_stream(response.data).read_all().num_rows == 20
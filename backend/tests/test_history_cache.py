@@ -0,0 +1,79 @@
+import time
+import pytest
+from app.services.history_cache import HistoryCache
+from app.services.price_providers import PriceProvider
+from app.services.price_service import PriceService
+
+HISTORY = [{'timestamp': '2024-01-01T00:00:00', 'price': 42000.0}]
+# (timestamp ms, price) points as the provider returns them, lists once read back from JSON
+POINTS = [[1704067200000, 42000.0], [1704070800000, 42100.0]]
+
+def test_entries_survive_reopening(tmp_path):
+    """A new cache instance (e.g. a recycled worker) sees earlier entries"""
+    path = str(tmp_path / 'history.sqlite3')
+    HistoryCache(path).put('bitcoin', 7, 'daily', HISTORY)
+
+    history, fetched_at = HistoryCache(path).get('bitcoin', 7, 'daily')
+    assert history == HISTORY
+    assert time.time() - fetched_at < 5
+
+def test_ttl_depends_on_interval(tmp_path):
+    """Daily data stays fresh longer than automatic-granularity data"""
+    cache = HistoryCache(str(tmp_path / 'history.sqlite3'), ttls={'daily': 3600, None: 1})
+    fetched_at = time.time() - 10
+
+    assert cache.is_fresh(fetched_at, 'daily')
+    assert not cache.is_fresh(fetched_at, None)
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    """Only max_entries entries are kept, dropping the least recently read"""
+    cache = HistoryCache(str(tmp_path / 'history.sqlite3'), max_entries=2)
+    cache.put('bitcoin', 7, 'daily', HISTORY)
+    time.sleep(0.01)
+    cache.put('ethereum', 7, 'daily', HISTORY)
+    time.sleep(0.01)
+    cache.get('bitcoin', 7, 'daily')
+    time.sleep(0.01)
+    cache.put('solana', 7, 'daily', HISTORY)
+
+    assert cache.get('bitcoin', 7, 'daily') is not None
+    assert cache.get('ethereum', 7, 'daily') is None
+    assert cache.stats['evictions'] == 1
+
+class HistoryProvider(PriceProvider):
+    """Stand-in upstream counting history calls, failing when told to"""
+    name = 'history'
+
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+
+    def get_history(self, coin_id, days, interval='daily', background=False):
+        self.calls.append((coin_id, background))
+        if self.failing:
+            raise Exception("CoinGecko unavailable")
+        return POINTS
+
+def test_price_service_serves_history_from_cache(tmp_path):
+    """Repeat history requests, e.g. backfills of the same range by other workers, do not touch the network"""
+    service = PriceService()
+    service.provider = HistoryProvider()
+    service.history_cache = HistoryCache(str(tmp_path / 'history.sqlite3'))
+
+    assert service.get_history('BTC', 7, 'daily', background=True) == POINTS
+    assert service.get_history('btc', 7, 'daily') == POINTS
+    assert service.provider.calls == [('bitcoin', True)]
+
+def test_price_service_serves_stale_history_on_failure(tmp_path):
+    """Expired history is served when CoinGecko fails, within the chart staleness bound"""
+    service = PriceService()
+    service.provider = HistoryProvider()
+    service.provider.failing = True
+    service.history_cache = HistoryCache(str(tmp_path / 'history.sqlite3'), ttls={'daily': 0})
+    service.history_cache.put('bitcoin', 7, 'daily', POINTS)
+
+    assert service.get_history('BTC', 7, 'daily') == POINTS
+
+    service.max_staleness['chart'] = -1
+    with pytest.raises(Exception):
+        service.get_history('BTC', 7, 'daily')
@@ -0,0 +1,181 @@
+import importlib
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import text
+from app import db
+from app.models.price_history import PriceHistory
+from app.services.history_store import HistoryStore, insert_ticks, rebuild_tick_index, tick_index_is_unique
+from app.services.price_providers import PriceProvider
+from app.services.price_service import PriceService
+
+class HistoryProvider(PriceProvider):
+    """Stand-in upstream with hourly history for the last ten days"""
+    name = 'history'
+
+    def __init__(self, now):
+        self.now = now
+        self.calls = 0
+
+    def get_history(self, coin_id, days, interval='daily', background=False):
+        self.calls += 1
+        epoch = datetime(1970, 1, 1)
+        return [((self.now - timedelta(hours=hours) - epoch).total_seconds() * 1000, 100.0 - hours)
+                for hours in range(240, 0, -1)]
+
+def add_ticks(symbol, start, count, step=timedelta(minutes=5)):
+    for i in range(count):
+        db.session.add(PriceHistory(crypto_symbol=symbol, price_usd=float(i), timestamp=start + i * step))
+    db.session.commit()
+
+def test_range_is_served_from_stored_ticks(sqlite_app):
+    """A covered range is read from the table and bucketed by resolution"""
+    service = PriceService()
+    service.provider = HistoryProvider(datetime.utcnow())
+    store = HistoryStore(service)
+    start = datetime(2024, 1, 1)
+    add_ticks('BTC', start, 24)  # two hours of 5-minute ticks
+
+    raw = store.get_history('bitcoin', start, start + timedelta(hours=2))
+    assert len(raw) == 24
+    fifteen = store.get_history('BTC', start, start + timedelta(hours=2), resolution='15m')
+    assert [point['price'] for point in fifteen] == [2.0, 5.0, 8.0, 11.0, 14.0, 17.0, 20.0, 23.0]
+    # Ticks stored before candles existed are rolled up on first read
+    hourly = store.get_history('BTC', start, start + timedelta(hours=1), resolution='1h')
+    assert [(point['timestamp'], point['open'], point['close']) for point in hourly] == [
+        ('2024-01-01T00:00:00', 0.0, 11.0), ('2024-01-01T01:00:00', 12.0, 23.0)
+    ]
+    assert service.provider.calls == 0
+
+def test_since_returns_only_new_points(sqlite_app):
+    """Incremental queries skip everything up to and including since"""
+    store = HistoryStore(PriceService())
+    start = datetime(2024, 1, 1)
+    add_ticks('ETH', start, 10)
+    points = store.get_history('ETH', start, start + timedelta(hours=1), since=start + timedelta(minutes=35))
+    assert [point['price'] for point in points] == [8.0, 9.0]
+
+def test_missing_older_range_is_backfilled_once(sqlite_app):
+    """Ranges older than the stored ticks are fetched upstream once and persisted"""
+    now = datetime.utcnow().replace(microsecond=0)
+    service = PriceService()
+    service.provider = HistoryProvider(now)
+    store = HistoryStore(service)
+    add_ticks('BTC', now - timedelta(hours=1), 12)
+
+    # The request is answered from what is stored while the backfill runs in the background
+    store.get_history('BTC', now - timedelta(days=7), now, resolution='1h')
+    store.wait_for_backfills(timeout=10)
+    assert service.provider.calls == 1
+    stored = PriceHistory.query.filter(PriceHistory.timestamp < now - timedelta(hours=1)).count()
+    assert stored == store.stats['backfilled_rows'] > 0
+
+    points = store.get_history('BTC', now - timedelta(days=7), now, resolution='1h')
+    store.wait_for_backfills(timeout=10)
+    assert len(points) >= 7 * 24 - 1
+    assert service.provider.calls == 1
+
+def test_interior_gap_is_backfilled_without_duplicates(sqlite_app):
+    """Downtime in the middle of stored history is filled, and ticks already stored are kept once"""
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    service = PriceService()
+    service.provider = HistoryProvider(now)
+    store = HistoryStore(service)
+    add_ticks('BTC', now - timedelta(days=3), 24, step=timedelta(hours=1))
+    add_ticks('BTC', now - timedelta(days=1), 24, step=timedelta(hours=1))
+
+    gaps = store.find_gaps('BTC', now - timedelta(days=3), now - timedelta(hours=1))
+    assert gaps == [(now - timedelta(days=2, hours=1), now - timedelta(days=1))]
+
+    assert store.backfill_gaps('BTC', now - timedelta(days=3), now - timedelta(hours=1)) > 0
+    assert store.find_gaps('BTC', now - timedelta(days=3), now - timedelta(hours=1)) == []
+    assert PriceHistory.query.filter_by(crypto_symbol='BTC').count() == 72
+    # Re-storing the whole upstream range keeps a single row per tick
+    store.store_history('BTC', service.provider.get_history('bitcoin', 3), now - timedelta(days=3), now)
+    assert PriceHistory.query.filter_by(crypto_symbol='BTC').count() == 72
+
+def test_first_load_of_an_empty_range_waits_for_its_backfill(sqlite_app):
+    """With nothing stored for the range, e.g. a new coin, the request is answered from the backfill"""
+    now = datetime.utcnow().replace(microsecond=0)
+    service = PriceService()
+    service.provider = HistoryProvider(now)
+    store = HistoryStore(service)
+
+    points = store.get_history('BTC', now - timedelta(days=3), now, resolution='1h')
+    assert service.provider.calls == 1
+    assert len(points) >= 3 * 24 - 1
+
+def test_history_route_asks_to_retry_while_first_backfill_runs(sqlite_app, monkeypatch):
+    """A range still being backfilled past the wait is answered 202 with Retry-After, then served"""
+    from app.routes.market_routes import market_bp
+    from app.services import history_store, price_service
+    # The package's history_store attribute is the service instance, not this module
+    history_store_module = importlib.import_module('app.services.history_store')
+
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    release = threading.Event()
+
+    class SlowProvider(HistoryProvider):
+        def get_history(self, coin_id, days, interval='daily', background=False):
+            release.wait(10)
+            return super().get_history(coin_id, days, interval, background)
+
+    monkeypatch.setattr(price_service, 'provider', SlowProvider(now))
+    monkeypatch.setattr(history_store, '_backfilled', {})
+    monkeypatch.setattr(history_store_module, 'FIRST_BACKFILL_WAIT', 0.05)
+    sqlite_app.register_blueprint(market_bp)
+    client = sqlite_app.test_client()
+    url = f"/api/market/history/ETH?resolution=raw&from={(now - timedelta(days=2)).isoformat()}&to={now.isoformat()}"
+
+    response = client.get(url)
+    assert response.status_code == 202
+    assert response.headers['Retry-After'] == '5'
+
+    release.set()
+    history_store.wait_for_backfills(timeout=10)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert len(response.get_json()['history']) >= 2 * 24 - 1
+
+def test_invalid_resolution_rejected(sqlite_app):
+    """Unknown resolutions raise ValueError"""
+    store = HistoryStore(PriceService())
+    with pytest.raises(ValueError):
+        store.get_history('BTC', datetime(2024, 1, 1), datetime(2024, 1, 2), resolution='7m')
+
+def test_history_route_cache_follows_stored_ticks(sqlite_app):
+    """Repeated chart requests are served from cache until a newer tick is stored"""
+    from app.routes.market_routes import market_bp, series_cache
+
+    sqlite_app.register_blueprint(market_bp)
+    client = sqlite_app.test_client()
+    start = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=1)
+    add_ticks('BTC', start, 10)
+    url = f"/api/market/history/BTC?resolution=raw&from={start.isoformat()}&to={(start + timedelta(hours=1)).isoformat()}"
+
+    first = client.get(url)
+    hits = series_cache.stats['hits']
+    assert client.get(url).get_json() == first.get_json()
+    assert series_cache.stats['hits'] == hits + 1
+    assert len(first.get_json()['history']) == 10
+
+    add_ticks('BTC', start + timedelta(minutes=50), 1)
+    assert len(client.get(url).get_json()['history']) == 11
+
+def test_plain_tick_index_is_deduplicated_and_rebuilt(sqlite_app):
+    """A database from before the unique index is detected, and the rebuild keeps the first tick of each time"""
+    db.session.execute(text('DROP INDEX idx_crypto_timestamp'))
+    db.session.execute(text('CREATE INDEX idx_crypto_timestamp ON price_history (crypto_symbol, "timestamp")'))
+    start = datetime(2024, 1, 1)
+    add_ticks('BTC', start, 3)
+    add_ticks('BTC', start, 2)
+    add_ticks('ETH', start, 2)
+    assert not tick_index_is_unique()
+
+    assert rebuild_tick_index() == 2
+    assert tick_index_is_unique()
+    btc = PriceHistory.query.filter_by(crypto_symbol='BTC').order_by(PriceHistory.id).all()
+    assert [row.price_usd for row in btc] == [0.0, 1.0, 2.0]
+    insert_ticks([{'crypto_symbol': 'BTC', 'price_usd': 9.0, 'timestamp': start}])
+    db.session.commit()
+    assert PriceHistory.query.count() == 5
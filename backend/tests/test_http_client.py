@@ -0,0 +1,96 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+import requests
+from app.services.http_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+from app.services.metrics import Histogram
+
+def test_breaker_opens_after_threshold():
+    """The breaker rejects calls once failures reach the threshold"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.get_stats()['rejected'] == 1
+
+def test_breaker_half_open_trial():
+    """After the reset timeout one trial call decides whether the breaker closes"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+def test_client_trips_breaker_on_connection_errors():
+    """Connection failures count against the breaker and then short-circuit"""
+    client = UpstreamClient(
+        'test-unreachable',
+        'http://127.0.0.1:9',
+        timeout=(0.2, 0.2),
+        max_retries=0,
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    )
+
+    for _ in range(2):
+        with pytest.raises(requests.RequestException):
+            client.get('/ping')
+
+    with pytest.raises(CircuitOpenError):
+        client.get('/ping')
+
+    stats = client.get_stats()
+    assert stats['requests'] == 2
+    assert stats['errors'] == 2
+    assert stats['breaker']['state'] == CircuitBreaker.OPEN
+    assert stats['latency']['count'] == 2
+
+class TooManyRequests(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        TooManyRequests.requests += 1
+        self.send_response(429)
+        self.send_header('Retry-After', '30')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def test_rate_limited_responses_are_not_slept_on():
+    """A 429 with a long Retry-After comes back at once and counts against the breaker"""
+    server = HTTPServer(('127.0.0.1', 0), TooManyRequests)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = UpstreamClient('test-429', f"http://127.0.0.1:{server.server_port}", max_retries=2)
+        start = time.monotonic()
+        response = client.get('/ping')
+        assert time.monotonic() - start < 2
+    finally:
+        server.shutdown()
+
+    assert response.status_code == 429
+    assert TooManyRequests.requests == 1
+    assert client.get_stats()['breaker']['failures'] == 1
+
+def test_histogram_percentiles():
+    """Percentiles report the bucket holding the requested rank"""
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for _ in range(95):
+        histogram.observe(0.005)
+    for _ in range(5):
+        histogram.observe(0.5)
+
+    assert histogram.percentile(50) == 0.01
+    assert histogram.percentile(99) == 0.5
+    assert histogram.summary()['count'] == 100
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from app import db
+from app.models.price_history import PriceHistory
+from app.services import partitions
+from app.services.partitions import PartitionManager
+from app.services.price_service import PriceService
+from app.services.price_updater import PriceUpdater
+
+def test_postgres_table_is_range_partitioned():
+    """PostgreSQL DDL partitions by timestamp and keys on (id, timestamp)"""
+    ddl = str(CreateTable(PriceHistory.__table__).compile(dialect=postgresql.dialect()))
+    assert 'PARTITION BY RANGE (timestamp)' in ddl
+    assert 'PRIMARY KEY (id, timestamp)' in ddl
+
+def test_partition_names_are_daily():
+    """Partitions are named after the day they hold"""
+    assert PartitionManager().partition_name(datetime(2024, 3, 9).date()) == 'price_history_p20240309'
+
+def test_cleanup_falls_back_to_batched_delete(sqlite_app, monkeypatch):
+    """Without native partitions old rows are deleted in batches"""
+    monkeypatch.setattr(partitions, 'DELETE_BATCH_SIZE', 3)
+    now = datetime.utcnow()
+    for days in (40, 39, 38, 35, 31, 1):
+        for symbol in ('BTC', 'ETH'):
+            db.session.add(PriceHistory(crypto_symbol=symbol, price_usd=1.0, timestamp=now - timedelta(days=days)))
+    db.session.commit()
+
+    updater = PriceUpdater(PriceService())
+    assert not updater.partitions.is_partitioned()
+    updater.cleanup_old_prices()
+
+    assert PriceHistory.query.count() == 2
+    assert updater.partitions.stats['deleted_rows'] == 10
+
+def test_partition_ddl_runs_outside_an_open_read(sqlite_app, monkeypatch):
+    """A read transaction on the session ends before the DDL, which would otherwise wait on its lock"""
+    manager = PartitionManager()
+    manager._partitioned = True
+    executed = []
+
+    def execute_ddl(statement):
+        assert not db.session().in_transaction()
+        executed.append(statement)
+
+    monkeypatch.setattr(manager, '_execute_ddl', execute_ddl)
+    PriceHistory.query.count()
+    assert db.session().in_transaction()
+
+    day = datetime(2024, 3, 9)
+    assert manager.ensure_partitions(day, day) == 2
+    assert executed[0].endswith('PARTITION OF price_history DEFAULT')
+    assert 'price_history_p20240309' in executed[1]
+    # Known partitions issue nothing and leave the session alone
+    PriceHistory.query.count()
+    assert manager.ensure_partitions(day, day) == 0
+    assert db.session().in_transaction() and len(executed) == 2
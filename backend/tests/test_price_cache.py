@@ -0,0 +1,84 @@
+import threading
+import time
+import pytest
+from app.services.price_cache import PriceSnapshot, SnapshotCache
+
+SAMPLE_PRICES = {
+    'BTC': {'price': 50000.0, 'change_24h': 1.5, 'market_cap': None, 'volume_24h': None},
+    'ETH': {'price': 3000.0, 'change_24h': -0.5, 'market_cap': None, 'volume_24h': None}
+}
+
+def test_snapshot_is_immutable():
+    """Snapshots cannot be modified once published"""
+    snapshot = PriceSnapshot(SAMPLE_PRICES, version=1)
+
+    with pytest.raises(AttributeError):
+        snapshot.version = 2
+    with pytest.raises(TypeError):
+        snapshot.prices['BTC']['price'] = 1.0
+
+    # to_dict hands out a copy callers are free to change
+    prices = snapshot.to_dict()
+    prices['BTC']['price'] = 1.0
+    assert snapshot.prices['BTC']['price'] == 50000.0
+
+def test_cache_serves_fresh_snapshot_without_reloading():
+    """Reads within the TTL never call the loader"""
+    cache = SnapshotCache(ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return SAMPLE_PRICES
+
+    first = cache.get(loader)
+    second = cache.get(loader)
+
+    assert first is second
+    assert len(calls) == 1
+    assert cache.stats['hits'] == 1
+
+def test_cache_reloads_after_ttl():
+    """Expired snapshots are replaced with a newer version"""
+    cache = SnapshotCache(ttl=0.01)
+    first = cache.get(lambda: SAMPLE_PRICES)
+    time.sleep(0.02)
+    second = cache.get(lambda: SAMPLE_PRICES)
+
+    assert second.version > first.version
+
+def test_concurrent_misses_share_one_load():
+    """Concurrent callers wait on a single in-flight load"""
+    cache = SnapshotCache(ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(1)
+        return SAMPLE_PRICES
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(result is results[0] for result in results)
+
+def test_failed_load_is_raised_to_every_waiter():
+    """A failing load propagates and leaves no snapshot behind"""
+    cache = SnapshotCache(ttl=60)
+
+    def loader():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get(loader)
+    assert cache.snapshot is None
+    assert cache.stats['load_errors'] == 1
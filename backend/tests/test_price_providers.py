@@ -0,0 +1,145 @@
+import time
+import pytest
+from app.services.price_providers import FailoverProvider, PriceProvider, RecordingProvider, ReplayProvider, create_provider
+from app.services.price_service import PriceService
+
+class StaticProvider(PriceProvider):
+    """Stand-in upstream returning a new price on every call"""
+    name = 'static'
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_prices(self, coin_ids, fail_fast=False):
+        self.calls += 1
+        return {coin_id: {'price': float(self.calls), 'change_24h': 0.0, 'market_cap': None, 'volume_24h': None}
+                for coin_id in coin_ids}
+
+    def get_history(self, coin_id, days, interval='daily', background=False):
+        return [(1700000000000, 1.0), (1700086400000, 2.0)]
+
+def test_recorded_responses_replay_in_order(tmp_path):
+    """Replay serves recorded responses in sequence and then wraps around"""
+    recorder = RecordingProvider(StaticProvider(), str(tmp_path))
+    recorder.get_prices(['bitcoin', 'ethereum'])
+    recorder.get_prices(['ethereum', 'bitcoin'])
+
+    replay = ReplayProvider(str(tmp_path))
+    prices = [replay.get_prices(['bitcoin', 'ethereum'])['bitcoin']['price'] for _ in range(3)]
+    assert prices == [1.0, 2.0, 1.0]
+
+def test_replay_history_and_missing_recordings(tmp_path):
+    """History round-trips as (timestamp, price) pairs; unknown requests raise"""
+    RecordingProvider(StaticProvider(), str(tmp_path)).get_history('bitcoin', 7)
+    replay = ReplayProvider(str(tmp_path))
+
+    assert replay.get_history('bitcoin', 7) == [(1700000000000, 1.0), (1700086400000, 2.0)]
+    with pytest.raises(LookupError):
+        replay.get_history('ethereum', 7)
+    assert replay.get_stats()['misses'] == 1
+
+def test_replay_latency(tmp_path):
+    """Replay waits the configured latency on every call"""
+    RecordingProvider(StaticProvider(), str(tmp_path)).get_prices(['bitcoin'])
+    replay = ReplayProvider(str(tmp_path), latency=0.05)
+
+    start = time.monotonic()
+    replay.get_prices(['bitcoin'])
+    assert time.monotonic() - start >= 0.05
+
+def test_price_service_uses_configured_provider(tmp_path):
+    """PriceService quotes and history come from whichever provider it is given"""
+    service = PriceService()
+    service.provider = StaticProvider()
+
+    assert service.get_price('BTC') == (1.0, 0.0)
+    history = service.get_history('ETH', 7)
+    assert [price for _, price in history] == [1.0, 2.0]
+
+def test_create_provider_requires_recordings_dir():
+    """Record and replay modes need somewhere to keep responses"""
+    coingecko = object()
+    assert create_provider({}, coingecko) is coingecko
+    with pytest.raises(ValueError):
+        create_provider({'PRICE_PROVIDER': 'replay'}, coingecko)
+
+class SlowProvider(PriceProvider):
+    """Stand-in upstream answering after a fixed delay, or failing"""
+
+    def __init__(self, name, delay=0.0, price=1.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.price = price
+        self.fail = fail
+
+    def get_prices(self, coin_ids, fail_fast=False):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        return {coin_id: {'price': self.price} for coin_id in coin_ids}
+
+def test_hedged_request_takes_faster_provider():
+    """A slow primary is hedged after the delay and the secondary's answer wins"""
+    provider = FailoverProvider(
+        [SlowProvider('slow', delay=1.0, price=1.0), SlowProvider('fast', price=2.0)],
+        hedge_delay=0.05
+    )
+    start = time.monotonic()
+    assert provider.get_prices(['bitcoin'])['bitcoin']['price'] == 2.0
+    assert time.monotonic() - start < 0.5
+    assert provider.stats['hedged'] == 1
+
+def test_failing_provider_is_demoted():
+    """Failures lower a provider's rank and consecutive ones demote it"""
+    provider = FailoverProvider(
+        [SlowProvider('broken', fail=True), SlowProvider('backup', price=3.0)],
+        hedge=False, demote_after=2
+    )
+    assert provider.get_prices(['bitcoin'])['bitcoin']['price'] == 3.0
+    broken = provider.health[0]
+    # One failure already ranks it below the backup by score
+    assert provider._ranked()[0].provider.name == 'backup'
+    assert not broken.is_demoted()
+
+    broken.record_failure()
+    assert broken.is_demoted()
+    assert provider.get_stats()['providers'][0]['demotions'] == 1
+
+def test_all_providers_failing_raises():
+    """The primary's error is raised when every provider fails"""
+    provider = FailoverProvider([SlowProvider('a', fail=True), SlowProvider('b', fail=True)])
+    with pytest.raises(RuntimeError, match='a down'):
+        provider.get_prices(['bitcoin'])
+
+def test_price_providers_setting_builds_failover(tmp_path):
+    """Several names in PRICE_PROVIDERS combine into a FailoverProvider"""
+    config = {'PRICE_PROVIDERS': 'coingecko, replay', 'PRICE_RECORDINGS_DIR': str(tmp_path), 'TESTING': True}
+    provider = create_provider(config, coingecko=StaticProvider())
+    assert isinstance(provider, FailoverProvider)
+    assert [health.provider.name for health in provider.health] == ['static', 'replay']
+
+def test_replay_is_not_a_live_failover_target(tmp_path):
+    """Outside tests, recorded prices never stand in for a live provider"""
+    config = {'PRICE_PROVIDERS': 'coingecko,replay', 'PRICE_RECORDINGS_DIR': str(tmp_path)}
+    with pytest.raises(ValueError, match='replay'):
+        create_provider(config, coingecko=StaticProvider())
+
+def test_providers_on_one_upstream_are_not_hedged(tmp_path):
+    """Recording CoinGecko is still CoinGecko, so a slow call is waited out rather than sent twice"""
+    static = StaticProvider()
+    provider = FailoverProvider([static, RecordingProvider(static, str(tmp_path))], hedge_delay=0.01)
+    assert not provider.hedge
+    assert provider.get_prices(['bitcoin'])['bitcoin']['price'] == 1.0
+    assert static.calls == 1 and provider.stats['hedged'] == 0
+
+def test_hedge_skips_providers_on_the_primary_upstream(tmp_path):
+    """The hedge goes to the best provider on another upstream"""
+    slow = SlowProvider('slow', delay=1.0, price=1.0)
+    provider = FailoverProvider(
+        [slow, RecordingProvider(slow, str(tmp_path)), SlowProvider('fast', price=2.0)],
+        hedge_delay=0.05
+    )
+    start = time.monotonic()
+    assert provider.get_prices(['bitcoin'])['bitcoin']['price'] == 2.0
+    assert time.monotonic() - start < 0.5
+    assert provider.health[1].stats['calls'] == 0
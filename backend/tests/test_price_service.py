@@ -1,5 +1,7 @@
 import os
+import pytest
 import sys
+import time
 from pathlib import Path
 
 # Add the backend directory to Python path
@@ -24,5 +26,71 @@ def test_price_service():
         btc_price, btc_change = price_service.get_price('BTC')
         print(f"\nBitcoin price: ${btc_price:,.2f} ({btc_change:.2f}%)")
 
+def test_quotes_come_from_one_snapshot(monkeypatch):
+    """Single and batch quotes are derived from one bulk fetch"""
+    from app.services.price_service import PriceService
+
+    service = PriceService()
+    calls = []
+
+    def fake_fetch(fail_fast=False):
+        calls.append(1)
+        return {
+            'BTC': {'price': 50000.0, 'change_24h': 1.0, 'market_cap': None, 'volume_24h': None},
+            'ETH': {'price': 3000.0, 'change_24h': 2.0, 'market_cap': None, 'volume_24h': None}
+        }, time.time()
+
+    monkeypatch.setattr(service, '_fetch_all_prices', fake_fetch)
+    # Symbols missing from the snapshot are looked up through the coalescer; keep that offline too
+    batches = []
+
+    def fetch_batch(coin_ids):
+        batches.append(list(coin_ids))
+        return {}
+
+    monkeypatch.setattr(service.coalescer, 'fetch_batch', fetch_batch)
+
+    assert service.get_price('btc') == (50000.0, 1.0)
+    quotes = service.get_prices(['BTC', 'ETH', 'SOL'])
+    assert set(quotes) == {'BTC', 'ETH'}
+    assert quotes['ETH']['price'] == 3000.0
+    assert len(calls) == 1
+    assert batches == [['solana']]
+
+    with pytest.raises(ValueError):
+        service.get_prices(['NOPE'])
+    with pytest.raises(ValueError):
+        service.get_price('SOL')
+
+def test_stale_snapshot_served_while_revalidating(monkeypatch):
+    """Expired snapshots within max_staleness are served at once and refreshed in the background"""
+    import threading
+    from app.services.price_service import PriceService
+
+    service = PriceService()
+    service.cache.ttl = 0
+    release = threading.Event()
+    versions = []
+
+    def slow_fetch(fail_fast=False):
+        if versions:
+            release.wait(1)
+        versions.append(len(versions) + 1)
+        return {'BTC': {'price': float(len(versions)), 'change_24h': 0.0}}, time.time()
+
+    monkeypatch.setattr(service, '_fetch_all_prices', slow_fetch)
+
+    first = service.get_snapshot()
+    stale = service.get_snapshot(max_staleness=60)
+    assert stale is first
+    assert service.cache.stats['stale_served'] == 1
+
+    release.set()
+    for _ in range(100):
+        if service.cache.snapshot is not first:
+            break
+        threading.Event().wait(0.01)
+    assert service.cache.snapshot.prices['BTC']['price'] == 2.0
+
 if __name__ == "__main__":
     test_price_service()
\ No newline at end of file
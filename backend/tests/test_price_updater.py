@@ -0,0 +1,92 @@
+import time
+from datetime import datetime, timedelta
+from app.models.price_candle import PriceCandle
+from app.models.price_history import PriceHistory
+from app.services.price_service import PriceService
+from app.services.price_updater import PriceUpdater
+
+def test_snapshot_is_stored_with_all_fields(sqlite_app):
+    """Every quote becomes one PriceHistory row with price, volume and market cap"""
+    updater = PriceUpdater(PriceService())
+    timestamp = datetime(2024, 1, 1, 12, 0)
+    written = updater.store_snapshot({
+        'BTC': {'price': 42000.0, 'change_24h': 1.0, 'market_cap': 8e11, 'volume_24h': 2e10},
+        'ETH': {'price': 2200.0, 'change_24h': -1.0, 'market_cap': None, 'volume_24h': None},
+        'XRP': {'price': None}
+    }, timestamp)
+
+    assert written == 2
+    btc = PriceHistory.query.filter_by(crypto_symbol='BTC').one()
+    assert (btc.price_usd, btc.market_cap, btc.volume_24h, btc.timestamp) == (42000.0, 8e11, 2e10, timestamp)
+    stats = updater.get_ingest_stats()
+    assert stats['rows'] == 2 and stats['runs'] == 1
+    assert stats['rows_per_sec'] > 0
+
+def test_latest_prices_are_memoized_until_next_snapshot(sqlite_app):
+    """One row per symbol from the newest tick, recomputed only after a new snapshot"""
+    updater = PriceUpdater(PriceService())
+    first, second = datetime(2024, 1, 1, 12, 0), datetime(2024, 1, 1, 12, 5)
+    updater.store_snapshot({'BTC': {'price': 42000.0}, 'ETH': {'price': 2200.0}}, first)
+    updater.store_snapshot({'BTC': {'price': 42100.0}}, second)
+
+    latest = updater.get_latest_prices()
+    assert latest['BTC'] == {'price': 42100.0, 'volume_24h': None, 'market_cap': None,
+                             'timestamp': second.isoformat()}
+    assert latest['ETH']['price'] == 2200.0
+    assert updater.get_latest_prices() is latest
+
+    updater.store_snapshot({'ETH': {'price': 2300.0}}, datetime(2024, 1, 1, 12, 10))
+    assert updater.get_latest_prices()['ETH']['price'] == 2300.0
+
+def test_unchanged_quotes_are_skipped_until_heartbeat(sqlite_app):
+    """Flat prices write a row only per heartbeat; moves beyond epsilon always do"""
+    updater = PriceUpdater(PriceService())
+    updater.dedup_epsilon = 0.001
+    updater.heartbeat_seconds = 900
+    start = datetime(2024, 1, 1, 12, 0)
+    usdt = [1.0, 1.0005, 1.0, 1.0, 1.002]
+    for i, price in enumerate(usdt):
+        updater.store_snapshot({'USDT': {'price': price}, 'BTC': {'price': 42000.0 + 100 * i}},
+                               start + timedelta(minutes=5 * i))
+
+    stored = [row.price_usd for row in PriceHistory.query.filter_by(crypto_symbol='USDT')
+              .order_by(PriceHistory.timestamp)]
+    # 12:00 first tick, 12:15 heartbeat, 12:20 moved 0.2%
+    assert stored == [1.0, 1.0, 1.002]
+    assert PriceHistory.query.filter_by(crypto_symbol='BTC').count() == 5
+    assert updater.get_ingest_stats()['skipped'] == 2
+    # Candles still see every quote
+    candle = PriceCandle.query.filter_by(crypto_symbol='USDT', resolution='1h').one()
+    assert candle.high == 1.002 and candle.last_tick == start + timedelta(minutes=20)
+
+def test_repeated_snapshot_is_not_ingested_twice(sqlite_app):
+    """A snapshot served again from cache adds no rows, candles or buffered ticks"""
+    service = PriceService()
+    updater = PriceUpdater(service)
+    service.cache.publish({'BTC': {'price': 42000.0}}, fetched_at=time.time())
+
+    updater.update_prices()
+    updater.update_prices()
+
+    assert PriceHistory.query.count() == 1
+    assert updater.get_ingest_stats()['repeated_snapshots'] == 1
+    assert len(updater.buffers.get_range('BTC')[0]) == 1
+
+def test_carried_over_quotes_keep_their_time_and_are_not_ingested(sqlite_app):
+    """Quotes a partial refresh kept from the previous snapshot aren't stamped fresh or stored as new ticks"""
+    service = PriceService()
+    updater = PriceUpdater(service)
+    now = time.time()
+    service.cache.publish({
+        'BTC': {'price': 42000.0, 'as_of': now},
+        'ETH': {'price': 2200.0, 'as_of': now - 300}
+    }, fetched_at=now)
+
+    updater.update_prices()
+
+    assert [row.crypto_symbol for row in PriceHistory.query.all()] == ['BTC']
+    assert updater.get_ingest_stats()['carried_over'] == 1
+    assert len(updater.buffers.get_range('ETH')[0]) == 0
+    assert not updater.get_freshness('BTC')['stale']
+    assert updater.get_freshness('ETH')['as_of'] == datetime.utcfromtimestamp(now - 300).isoformat()
+    assert updater.get_freshness('ETH')['stale']
@@ -0,0 +1,53 @@
+import time
+from app.services.rate_limiter import TokenBucket
+
+def test_burst_then_reject(tmp_path):
+    """The bucket allows a burst up to its capacity and then fails fast"""
+    bucket = TokenBucket(rate=0.1, capacity=3, state_file=str(tmp_path / 'bucket'))
+
+    assert all(bucket.try_acquire() for _ in range(3))
+    assert not bucket.try_acquire()
+    assert bucket.stats['acquired'] == 3
+    assert bucket.stats['rejected'] == 1
+
+def test_budget_is_shared_through_state_file(tmp_path):
+    """Buckets opened on the same file draw from one budget"""
+    state_file = str(tmp_path / 'bucket')
+    first = TokenBucket(rate=0.1, capacity=2, state_file=state_file)
+    second = TokenBucket(rate=0.1, capacity=2, state_file=state_file)
+
+    assert first.try_acquire()
+    assert second.try_acquire()
+    assert not first.try_acquire()
+    assert not second.try_acquire()
+
+def test_acquire_waits_for_refill(tmp_path):
+    """acquire() sleeps until a token is available and records the wait"""
+    bucket = TokenBucket(rate=20, capacity=1, state_file=str(tmp_path / 'bucket'))
+    assert bucket.try_acquire()
+
+    start = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert time.monotonic() - start >= 0.03
+    assert bucket.stats['waits'] == 1
+    assert bucket.stats['wait_time'] > 0
+
+def test_acquire_gives_up_at_deadline(tmp_path):
+    """acquire() returns False instead of waiting past its timeout"""
+    bucket = TokenBucket(rate=0.1, capacity=1, state_file=str(tmp_path / 'bucket'))
+    assert bucket.try_acquire()
+
+    start = time.monotonic()
+    assert not bucket.acquire(timeout=0.05)
+    assert time.monotonic() - start < 0.05
+    assert bucket.stats['rejected'] == 1
+
+def test_reserve_is_left_for_other_callers(tmp_path):
+    """Low-priority takes stop while only the reserve is left; normal takes still get it"""
+    bucket = TokenBucket(rate=0.001, capacity=3, state_file=str(tmp_path / 'bucket'))
+    assert bucket.try_acquire(reserve=2)
+    assert not bucket.try_acquire(reserve=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    # A reserve beyond the capacity still lets the last token be taken
+    assert TokenBucket(rate=0.001, capacity=1, state_file=str(tmp_path / 'small')).try_acquire(reserve=5)
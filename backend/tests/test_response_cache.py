@@ -0,0 +1,60 @@
+import gzip
+import json
+import time
+from flask import Flask
+from app.services.response_cache import ResponseCache
+
+def test_body_is_built_once_per_key():
+    """Each key is serialized once; later requests reuse the same bytes"""
+    cache = ResponseCache(max_entries=2)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {'BTC': {'price': 1.0}}
+
+    first = cache.get(('prices', 1), build)
+    second = cache.get(('prices', 1), build)
+    assert first is second
+    assert len(builds) == 1
+    assert json.loads(first.body) == {'BTC': {'price': 1.0}}
+    assert gzip.decompress(first.gzipped) == first.body
+
+    cache.get(('prices', 2), lambda: {'BTC': {'price': 2.0}})
+    cache.get(('prices', 3), lambda: {'BTC': {'price': 3.0}})
+    assert cache.get_stats()['evictions'] == 1
+
+def test_etag_depends_only_on_content():
+    """Equal bodies get equal ETags whatever key they were built under"""
+    cache = ResponseCache()
+    assert cache.get('a', lambda: {'x': 1}).etag == cache.get('b', lambda: {'x': 1}).etag
+    assert cache.get('c', lambda: {'x': 2}).etag != cache.get('a', lambda: {'x': 1}).etag
+
+def test_prices_endpoint_answers_304_for_matching_etag():
+    """Polling /prices with the last ETag returns 304 until the snapshot changes"""
+    from app.routes.market_routes import market_bp
+    from app.services import price_service
+
+    app = Flask(__name__)
+    app.register_blueprint(market_bp)
+    client = app.test_client()
+    price_service.cache.publish({'BTC': {'price': 1.0, 'change_24h': 0.0}}, fetched_at=time.time())
+
+    first = client.get('/api/market/prices', headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(first.data))['BTC']['price'] == 1.0
+    etag = first.headers['ETag']
+
+    gzip_headers = {'If-None-Match': etag, 'Accept-Encoding': 'gzip'}
+    assert client.get('/api/market/prices', headers=gzip_headers).status_code == 304
+    # The identity body is a different representation with its own tag
+    identity = client.get('/api/market/prices', headers={'If-None-Match': etag})
+    assert identity.status_code == 200
+    assert identity.headers['ETag'] != etag
+    assert identity.headers['Vary'] == 'Accept-Encoding'
+
+    price_service.cache.publish({'BTC': {'price': 2.0, 'change_24h': 0.0}}, fetched_at=time.time())
+    changed = client.get('/api/market/prices', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()['BTC']['price'] == 2.0
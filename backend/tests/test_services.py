@@ -11,6 +11,41 @@ def test_services():
     assert hasattr(trading_service, 'execute_buy')
     assert hasattr(trading_service, 'execute_sell')
 
+def test_portfolio_summary_falls_back_to_the_last_snapshot(sqlite_app):
+    """When the upstream is down, holdings are valued once at the last cached snapshot and marked"""
+    import time
+    import requests
+    from app import db
+    from app.models.portfolio import Portfolio
+    from app.services.price_providers import PriceProvider
+    from app.services.price_service import PriceService
+    from app.services.trading_service import TradingService
+
+    class DownProvider(PriceProvider):
+        name = 'down'
+        calls = 0
+
+        def get_prices(self, coin_ids, fail_fast=False):
+            DownProvider.calls += 1
+            raise requests.exceptions.ConnectionError("CoinGecko unavailable")
+
+    service = PriceService()
+    service.provider = DownProvider()
+    # Cached an hour ago, past the portfolio staleness bound, and without ETH
+    service.cache.publish({'BTC': {'price': 100.0, 'change_24h': 1.0}}, fetched_at=time.time() - 3600)
+    db.session.add_all([
+        Portfolio(user_id=1, crypto_symbol='BTC', quantity=2.0, average_buy_price=50.0),
+        Portfolio(user_id=1, crypto_symbol='ETH', quantity=1.0, average_buy_price=50.0)
+    ])
+    db.session.commit()
+
+    summary = TradingService(service).get_portfolio_summary(1)
+
+    assert [holding['symbol'] for holding in summary['holdings']] == ['BTC']
+    assert summary['total_value'] == 200.0
+    assert summary['missing'] == ['ETH'] and summary['stale']
+    assert DownProvider.calls == 1
+
 if __name__ == "__main__":
     from app import create_app
     
@@ -0,0 +1,79 @@
+import multiprocessing
+import time
+from app.services.shared_price_table import SharedPriceTable
+
+SYMBOLS = ['BTC', 'ETH', 'SOL']
+
+def test_write_and_read_round_trip(tmp_path):
+    """Rows written by one mapping are visible to another"""
+    path = str(tmp_path / 'prices')
+    writer = SharedPriceTable(path, SYMBOLS)
+    reader = SharedPriceTable(path, SYMBOLS)
+
+    assert reader.read_snapshot() is None
+    writer.write({
+        'BTC': {'price': 50000.0, 'change_24h': 1.0, 'market_cap': None, 'volume_24h': 10.0},
+        'DOGE': {'price': 0.1}
+    }, fetched_at=1000.0)
+
+    prices, fetched_at = reader.read_snapshot()
+    assert fetched_at == 1000.0
+    assert set(prices) == {'BTC'}
+    assert prices['BTC'] == {'price': 50000.0, 'change_24h': 1.0, 'market_cap': None, 'volume_24h': 10.0,
+                             'as_of': 1000.0}
+    assert reader.read_row('ETH') is None
+
+def test_layout_change_uses_another_file(tmp_path):
+    """A different symbol list maps its own file and never touches a live one"""
+    path = str(tmp_path / 'prices')
+    table = SharedPriceTable(path, SYMBOLS)
+    table.write({'BTC': {'price': 1.0}}, fetched_at=1.0)
+
+    other = SharedPriceTable(path, SYMBOLS + ['ADA'])
+    assert other.path != table.path
+    assert other.read_snapshot() is None
+    assert table.read_snapshot() == ({'BTC': {'price': 1.0, 'change_24h': None, 'market_cap': None,
+                                              'volume_24h': None, 'as_of': 1.0}}, 1.0)
+
+def test_rows_missing_from_latest_write_are_skipped(tmp_path):
+    """A symbol the upstream stopped quoting doesn't make the whole table look stale"""
+    table = SharedPriceTable(str(tmp_path / 'prices'), SYMBOLS)
+    table.write({'BTC': {'price': 1.0}, 'ETH': {'price': 2.0}}, fetched_at=100.0)
+    table.write({'BTC': {'price': 1.5}}, fetched_at=200.0)
+
+    prices, fetched_at = table.read_snapshot()
+    assert fetched_at == 200.0
+    assert set(prices) == {'BTC'} and prices['BTC']['price'] == 1.5
+
+def _hammer(path, rounds):
+    table = SharedPriceTable(path, SYMBOLS)
+    for i in range(1, rounds + 1):
+        value = float(i)
+        table.write({'BTC': {'price': value, 'change_24h': value, 'market_cap': value, 'volume_24h': value}}, value)
+
+def test_reads_are_never_torn(tmp_path):
+    """Readers racing a writer in another process always see whole rows"""
+    path = str(tmp_path / 'prices')
+    table = SharedPriceTable(path, SYMBOLS)
+    writer = multiprocessing.get_context('fork').Process(target=_hammer, args=(path, 20000))
+    writer.start()
+
+    deadline = time.time() + 10
+    reads = 0
+    while writer.is_alive() and time.time() < deadline:
+        row = table.read_row('BTC')
+        if row is not None:
+            assert len(set(row)) == 1
+            reads += 1
+    writer.join()
+
+    assert table.read_row('BTC') == (20000.0,) * 6
+    assert reads > 0
+
+def test_quotes_keep_their_own_fetch_time(tmp_path):
+    """A quote carried over from an earlier fetch reads back with its original as_of"""
+    table = SharedPriceTable(str(tmp_path / 'prices'), SYMBOLS)
+    table.write({'BTC': {'price': 1.0, 'as_of': 150.0}, 'ETH': {'price': 2.0}}, fetched_at=200.0)
+
+    prices, _ = table.read_snapshot()
+    assert prices['BTC']['as_of'] == 150.0 and prices['ETH']['as_of'] == 200.0
@@ -0,0 +1,89 @@
+import time
+import pytest
+from app.services.price_service import PriceService
+from app.services.snapshot_store import RedisSnapshotStore
+
+fakeredis = pytest.importorskip('fakeredis')
+
+PRICES = {'BTC': {'price': 50000.0, 'change_24h': 1.0, 'market_cap': None, 'volume_24h': None}}
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+def make_service(redis_server, monkeypatch, calls):
+    service = PriceService()
+    service.shared_store = RedisSnapshotStore(fakeredis.FakeRedis(server=redis_server))
+
+    def fake_fetch(fail_fast=False):
+        calls.append(1)
+        return PRICES, time.time()
+
+    monkeypatch.setattr(service, '_fetch_all_prices', fake_fetch)
+    return service
+
+def test_store_is_optional():
+    """Without a Redis URL the service keeps caching in-process"""
+    assert RedisSnapshotStore.from_url(None) is None
+
+def test_workers_share_one_upstream_fetch(redis_server, monkeypatch):
+    """A second worker reads the snapshot written by the first instead of fetching"""
+    calls = []
+    first = make_service(redis_server, monkeypatch, calls)
+    second = make_service(redis_server, monkeypatch, calls)
+
+    assert first.get_price('BTC') == (50000.0, 1.0)
+    assert second.get_price('BTC') == (50000.0, 1.0)
+    assert len(calls) == 1
+    assert second.cache.snapshot.fetched_at == first.cache.snapshot.fetched_at
+
+def test_refresh_lock_is_exclusive(redis_server):
+    """Only one store can hold the refresh lock at a time"""
+    first = RedisSnapshotStore(fakeredis.FakeRedis(server=redis_server))
+    second = RedisSnapshotStore(fakeredis.FakeRedis(server=redis_server))
+
+    assert first.acquire_refresh_lock()
+    assert not second.acquire_refresh_lock()
+    first.release_refresh_lock()
+    assert second.acquire_refresh_lock()
+
+def test_publish_expires_local_snapshots(redis_server, monkeypatch):
+    """Writing a snapshot tells subscribed caches that theirs is out of date"""
+    calls = []
+    service = make_service(redis_server, monkeypatch, calls)
+    service.get_snapshot()
+    assert service.cache.is_fresh(service.cache.snapshot)
+
+    service.shared_store.subscribe(service.cache.expire)
+    try:
+        writer = RedisSnapshotStore(fakeredis.FakeRedis(server=redis_server))
+        writer.write(PRICES, time.time() + 1)
+        for _ in range(100):
+            if not service.cache.is_fresh(service.cache.snapshot):
+                break
+            time.sleep(0.05)
+    finally:
+        service.shared_store.close()
+
+    assert not service.cache.is_fresh(service.cache.snapshot)
+    # The stale snapshot is kept as a fallback
+    assert service.cache.snapshot is not None
+
+def test_release_keeps_a_lock_taken_over_by_another_worker(redis_server):
+    """A lock that expired and was re-acquired elsewhere is not deleted by its old holder"""
+    first = RedisSnapshotStore(fakeredis.FakeRedis(server=redis_server))
+    second = RedisSnapshotStore(fakeredis.FakeRedis(server=redis_server))
+
+    assert first.acquire_refresh_lock()
+    first.client.delete(first.lock_key)  # Expired
+    assert second.acquire_refresh_lock()
+    first.release_refresh_lock()
+    assert not first.acquire_refresh_lock()
+
+def test_malformed_snapshot_is_a_miss(redis_server):
+    """A corrupt payload is reported as a miss instead of raising"""
+    store = RedisSnapshotStore(fakeredis.FakeRedis(server=redis_server))
+    for payload in (b'{not json', b'{"prices": {}}', b'[]'):
+        store.client.set(store.key, payload)
+        assert store.read() is None
+    assert store.stats['errors'] == 3
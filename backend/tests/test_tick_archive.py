@@ -0,0 +1,85 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+from app import db
+from app.models.price_archive import PriceArchive
+from app.models.price_history import PriceHistory
+from app.services.history_store import HistoryStore
+from app.services.price_providers import PriceProvider
+from app.services.price_service import PriceService
+from app.services.price_updater import PriceUpdater
+from app.services.tick_archive import TickArchive, decode_block, encode_block
+
+class NoHistoryProvider(PriceProvider):
+    """Upstream that must not be asked for history"""
+    name = 'none'
+
+    def get_history(self, coin_id, days, interval='daily', background=False):
+        raise AssertionError("archived history should not be backfilled")
+
+def test_block_round_trip():
+    """Irregular timestamps, repeated and special floats and missing volumes decode exactly"""
+    timestamps = [1700000000000, 1700000300000, 1700000600000, 1700000600001, 1700000900450, 1800000000000]
+    prices = [42000.12, 42000.12, 41999.5, -1.0, float('inf'), 1e-9]
+    volumes = [2.1e10, None, 2.1e10, 0.0, None, 5.5]
+    decoded_timestamps, decoded_prices, decoded_volumes = decode_block(encode_block(timestamps, prices, volumes))
+    assert decoded_timestamps.tolist() == timestamps
+    assert decoded_prices.tolist() == prices
+    assert [None if np.isnan(v) else v for v in decoded_volumes.tolist()] == volumes
+    assert decode_block(encode_block([], [], []))[0].size == 0
+
+def test_regular_ticks_compress_well():
+    """Evenly spaced ticks cost a bit for the timestamp and little for unchanged values"""
+    timestamps = [1700000000000 + 300000 * i for i in range(288)]
+    data = encode_block(timestamps, [42000.0 + (i % 3) for i in range(288)], [2e10] * 288)
+    assert len(data) < 288 * 4
+
+def make_ticks(start, days, step=timedelta(hours=1)):
+    timestamp = start
+    while timestamp < start + timedelta(days=days):
+        db.session.add(PriceHistory(crypto_symbol='BTC', price_usd=100.0 + timestamp.hour, timestamp=timestamp))
+        timestamp += step
+    db.session.commit()
+
+def test_cleanup_archives_before_deleting(sqlite_app):
+    """Aged ticks move into one block per symbol per day and remain readable"""
+    archive = TickArchive()
+    updater = PriceUpdater(PriceService(), archive=archive)
+    updater.history_retention_days = 2
+    start = datetime.combine(date.today() - timedelta(days=5), datetime.min.time())
+    make_ticks(start, 5)
+
+    updater.cleanup_old_prices()
+    cutoff = datetime.utcnow() - timedelta(days=2)
+    assert PriceHistory.query.filter(PriceHistory.timestamp < cutoff).count() == 0
+    archived = archive.get_ticks('BTC', start, cutoff)
+    assert len(archived) == PriceArchive.query.with_entities(db.func.sum(PriceArchive.count)).scalar()
+    assert archived[0] == (start, 100.0)
+    assert PriceArchive.query.count() == 4
+
+    # Archiving the same day again keeps one copy of each tick
+    db.session.add(PriceHistory(crypto_symbol='BTC', price_usd=1.0, timestamp=start))
+    db.session.commit()
+    archive.archive_before(start + timedelta(hours=1))
+    assert db.session.get(PriceArchive, ('BTC', start.date())).count == 24
+    assert archive.get_ticks('BTC', start, start)[0] == (start, 1.0)
+
+def test_history_reads_archived_ticks(sqlite_app):
+    """Raw history spanning the archive and the table comes back in order without a backfill"""
+    service = PriceService()
+    service.provider = NoHistoryProvider()
+    archive = TickArchive()
+    store = HistoryStore(service, archive=archive)
+    start = datetime.combine(date.today() - timedelta(days=4), datetime.min.time())
+    make_ticks(start, 4)
+    archive.archive_before(start + timedelta(days=2))
+    PriceHistory.query.filter(PriceHistory.timestamp < start + timedelta(days=2)).delete()
+    db.session.commit()
+
+    points = store.get_history('BTC', start, start + timedelta(days=3))
+    timestamps = [point['timestamp'] for point in points]
+    assert len(points) == 72 + 1
+    assert timestamps == sorted(timestamps)
+    assert timestamps[0] == start.isoformat()
+
+    newer = store.get_history('BTC', start, start + timedelta(days=3), since=start + timedelta(days=1, hours=22))
+    assert len(newer) == 1 + 24 + 1
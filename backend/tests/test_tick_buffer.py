@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import numpy as np
+from app import db
+from app.models.price_history import PriceHistory
+from app.services.tick_buffer import RingBuffer, TickBuffers, to_epoch
+
+def test_ring_buffer_wraps_and_slices_in_order():
+    """Once full the oldest ticks are overwritten and ranges stay in time order"""
+    buffer = RingBuffer(capacity=5)
+    for i in range(8):
+        assert buffer.append(float(i), 100.0 + i)
+    assert len(buffer) == 5
+
+    timestamps, prices, volumes = buffer.range()
+    assert list(timestamps) == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert list(buffer.range(4.0, 6.0)[1]) == [104.0, 105.0, 106.0]
+    assert np.isnan(volumes).all()
+    assert len(buffer.range(20.0)[0]) == 0
+
+def test_out_of_order_ticks_are_ignored():
+    """Ticks not newer than the newest one would break the sorted runs or repeat it"""
+    buffer = RingBuffer(capacity=4)
+    buffer.append(10.0, 1.0)
+    assert not buffer.append(5.0, 2.0)
+    assert not buffer.append(10.0, 2.0)
+    assert buffer.extend([8.0, 10.0, 11.0, 12.0], [1.0, 1.0, 2.0, 3.0]) == 2
+    assert list(buffer.range()[0]) == [10.0, 11.0, 12.0]
+
+def test_extend_keeps_the_newest_ticks():
+    """Bulk loads larger than the capacity keep only the newest ticks"""
+    buffer = RingBuffer(capacity=3)
+    buffer.append(0.0, 1.0)
+    buffer.extend(np.arange(1.0, 10.0), np.arange(1.0, 10.0) * 2)
+    assert list(buffer.range()[0]) == [7.0, 8.0, 9.0]
+
+def test_window_stats():
+    """Stats cover only the ticks inside the window"""
+    buffer = RingBuffer(capacity=10)
+    buffer.extend([0.0, 1.0, 2.0, 3.0], [100.0, 120.0, 90.0, 110.0], [1.0, 2.0, 3.0, 4.0])
+    stats = buffer.window_stats(1.0)
+    assert stats['count'] == 3
+    assert (stats['open'], stats['close'], stats['high'], stats['low']) == (120.0, 110.0, 120.0, 90.0)
+    assert stats['change'] == -10.0 and stats['volume'] == 4.0
+    assert buffer.window_stats(10.0) is None
+
+def test_buffers_load_from_price_history_on_first_use(sqlite_app):
+    """A symbol's newest stored ticks are loaded when it is first used and new snapshots append after them"""
+    now = datetime.utcnow().replace(microsecond=0)
+    db.session.add_all([
+        PriceHistory(crypto_symbol='BTC', price_usd=40000.0 + i, timestamp=now - timedelta(minutes=5 * (3 - i)))
+        for i in range(3)
+    ])
+    db.session.commit()
+
+    buffers = TickBuffers(capacity=2)
+    assert buffers.append_snapshot({'BTC': {'price': 41000.0, 'volume_24h': 5.0}, 'ETH': {'price': None}}, now) == 1
+    # Only the newest capacity ticks are read
+    assert buffers.stats['loaded'] == 2
+
+    timestamps, prices, _ = buffers.get_range('BTC', now - timedelta(minutes=10))
+    assert list(prices) == [40002.0, 41000.0]
+    assert timestamps[-1] == to_epoch(now)
+    assert buffers.get_window_stats('ETH') is None
+    assert buffers.get_stats()['ticks'] == 2
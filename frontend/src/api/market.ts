@@ -3,8 +3,8 @@ import axios from './axios';
 import { MarketPrice, PriceHistory } from '../types/api';
 
 export const getMarketPrices = async (): Promise<Record<string, MarketPrice>> => {
-  // Add timestamp to prevent caching
-  const response = await axios.get(`/market/prices?_t=${Date.now()}`);
+  // The server answers unchanged polls with 304 via ETag, so let the browser cache revalidate
+  const response = await axios.get('/market/prices');
   return response.data;
 };
 
@@ -13,7 +13,15 @@ export const getCryptoPrice = async (symbol: string): Promise<MarketPrice> => {
   return response.data;
 };
 
-export const getPriceHistory = async (symbol: string): Promise<PriceHistory> => {
-  const response = await axios.get(`/market/history/${symbol}`);
+export interface PriceHistoryQuery {
+  from?: string;
+  to?: string;
+  resolution?: string;
+  since?: string;
+  max_points?: number;
+}
+
+export const getPriceHistory = async (symbol: string, query: PriceHistoryQuery = {}): Promise<PriceHistory> => {
+  const response = await axios.get(`/market/history/${symbol}`, { params: query });
   return response.data;
 };
\ No newline at end of file
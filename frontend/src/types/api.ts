@@ -22,10 +22,13 @@ export interface MarketPrice {
     symbol: string;
     price: number;
     change_24h: number;
+    as_of?: string | null;
+    stale?: boolean;
 }
 
 export interface PriceHistory {
     symbol: string;
+    resolution?: string;
     history: {
         timestamp: string;
         price: number;